@@ -0,0 +1,115 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: benchmarkBinMask.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+benchmark the interval index cworld.zoom.build_bin_mask against the original linear scan
+(every bin of a chromosome tested with is_overlap, per zoom coordinate / BED element).
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+# user defined modules
+from cworld.zoom import build_bin_mask,is_overlap
+
+def main():
+
+    parser=argparse.ArgumentParser(description='benchmark bin mask building (interval index vs linear scan)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-n', dest='nbins', type=int, default=300000, help='number of bins (spread over the chromosomes)')
+    parser.add_argument('-c', dest='nchrs', type=int, default=20, help='number of chromosomes')
+    parser.add_argument('-e', dest='nelements', type=int, default=2000, help='number of BED elements')
+    parser.add_argument('--binsize', dest='bin_size', type=int, default=10000, help='bin size (bp)')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3, help='number of timed repeats (best is reported)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    nbins=args.nbins
+    nchrs=args.nchrs
+    nelements=args.nelements
+    bin_size=args.bin_size
+    repeat=args.repeat
+
+    chrs,chr_dict,chr_bin_range,bin_positions,zoom_dict=random_selection(nbins,nchrs,nelements,bin_size)
+    nbins=len(bin_positions)
+    print("bins",nbins,"chrs",nchrs,"elements",nelements)
+    print("")
+
+    results={}
+    for name,mask_func in [("linear",build_bin_mask_linear),("index",build_bin_mask)]:
+        best=None
+        for r in range(repeat):
+            t0=time.time()
+            bin_mask=mask_func(nbins,chrs,zoom_dict,chr_dict,chr_bin_range,bin_positions)
+            elapsed=time.time()-t0
+            if best == None or elapsed < best:
+                best=elapsed
+        results[name]=bin_mask
+        print(name,"\t","{:.3f}".format(best),"s\t",np.sum(bin_mask)," bins",sep="")
+
+    print("")
+    print("identical output",np.array_equal(results["linear"],results["index"]))
+
+def random_selection(nbins,nchrs,nelements,bin_size):
+    """equal sized chromosomes of bin_size bins, and random BED elements (up to 10 bins long) on them
+    """
+
+    chr_nbins=nbins//nchrs
+    chrs=['chr'+str(c+1) for c in range(nchrs)]
+    chr_dict=dict((c,i) for i,c in enumerate(chrs))
+
+    bin_chrs=np.repeat(np.arange(nchrs),chr_nbins)
+    bin_starts=(np.tile(np.arange(chr_nbins),nchrs)*bin_size)+1
+    bin_positions=np.c_[bin_chrs,bin_starts,bin_starts+bin_size-1]
+    chr_bin_range=np.array([(c*chr_nbins,((c+1)*chr_nbins)-1) for c in range(nchrs)])
+
+    zoom_dict=collections.defaultdict(list)
+    for e in range(nelements):
+        c=chrs[np.random.randint(nchrs)]
+        start=np.random.randint(chr_nbins*bin_size)
+        end=start+np.random.randint(bin_size*10)
+        zoom_dict[c].append([c,start,end])
+
+    return chrs,chr_dict,chr_bin_range,bin_positions,zoom_dict
+
+def build_bin_mask_linear(n,chrs,zoom_dict,chr_dict,chr_bin_range,bin_positions,axis=None):
+    """the original linear scan build_bin_mask, kept here as the benchmark reference
+    """
+
+    bin_mask=np.zeros(n,dtype=bool)
+
+    # build bin mask based on user chr/zoom selection
+    for c in chrs:
+        c_ind=chr_dict[c]
+        r=chr_bin_range[chr_dict[c]]
+        if c in zoom_dict:
+            zoom_coord_arr=zoom_dict[c]
+            for zoom_coord in zoom_coord_arr:
+                tmp_bin_positions=bin_positions[r[0]:r[1]+1]
+                for i,b in enumerate(tmp_bin_positions):
+                    if b[2] < zoom_coord[1]: continue
+                    if b[1] > zoom_coord[2]: break
+                    overlap=is_overlap([zoom_coord[1],zoom_coord[2]], [b[1],b[2]])
+                    if(overlap > 0):
+                        bin_mask[r[0]+i]=True
+        else:
+            bin_mask[r[0]:r[1]+1]=True
+
+    return(bin_mask)
+
+if __name__=="__main__":
+    main()
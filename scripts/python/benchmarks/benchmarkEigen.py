@@ -0,0 +1,122 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: benchmarkEigen.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+benchmark the truncated top-k eigensolver (cworld.eigen, matrix2EigenVectors.py --eigen topk)
+and the implicit correlation operator (--eigen implicit) against the original sklearn PCA fit,
+on the correlation matrix matrix2EigenVectors.py builds.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn import decomposition
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+# user defined modules
+from cworld.matrix import load_matrix
+from cworld.eigen import truncated_pca,correlation_pca
+
+def main():
+
+    parser=argparse.ArgumentParser(description='benchmark compartment eigenvectors (top-k eigensolver / implicit corrcoef vs sklearn PCA)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, default=None, help='interaction matrix (my5C) file, a random compartment matrix is generated if not supplied')
+    parser.add_argument('-n', dest='nbins', type=int, default=3000, help='number of bins of the generated matrix')
+    parser.add_argument('--npc', dest='num_pcs', type=int, default=3, help='number of principal components compared')
+    parser.add_argument('--tol', dest='eigen_tol', type=float, default=0, help='relative tolerance of the top-k/implicit eigensolver')
+    parser.add_argument('--seed', dest='eigen_seed', type=int, default=0, help='seed of the top-k/implicit start vector')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3, help='number of timed repeats (best is reported)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    nbins=args.nbins
+    num_pcs=args.num_pcs
+    eigen_tol=args.eigen_tol
+    eigen_seed=args.eigen_seed
+    repeat=args.repeat
+
+    if inputMatrix == None:
+        matrix=random_compartment_matrix(nbins)
+    else:
+        if not os.path.isfile(inputMatrix):
+            sys.exit('invalid input file! (non-existant)')
+        matrix,header_rows,header_cols=load_matrix(inputMatrix,hrows=1,hcols=1)
+        print("inputMatrix",inputMatrix)
+
+    # as matrix2EigenVectors.py - drop nan rows/cols, nan -> 0, row correlation
+    nan_rowcols=np.sum(np.isnan(matrix),0)==matrix.shape[0]
+    matrix=np.nan_to_num(matrix[~nan_rowcols,:][:,~nan_rowcols])
+    t0=time.time()
+    corrMatrix=np.corrcoef(matrix)
+    corrcoef_time=time.time()-t0
+
+    print("bins",corrMatrix.shape[0],"principal components",num_pcs)
+    print("")
+    # sklearn PCA / top-k run on the correlation matrix, implicit on the matrix itself
+    print("corrcoef","\t","{:.3f}".format(corrcoef_time),"s",sep="")
+
+    results={}
+    solvers=[("sklearn PCA",lambda k: calculate_eigen_pca(corrMatrix,k)),
+             ("top-k",lambda k: truncated_pca(corrMatrix,k,tol=eigen_tol,seed=eigen_seed)),
+             ("implicit",lambda k: correlation_pca(matrix,k,tol=eigen_tol,seed=eigen_seed))]
+    for name,eigen_func in solvers:
+        best=None
+        for r in range(repeat):
+            t0=time.time()
+            pca_score,pca_v=eigen_func(num_pcs)
+            elapsed=time.time()-t0
+            if best == None or elapsed < best:
+                best=elapsed
+        results[name]=(pca_score[0:num_pcs],pca_v[0:num_pcs])
+        print(name,"\t","{:.3f}".format(best),"s",sep="")
+
+    old_score,old_v=results["sklearn PCA"]
+    for name in ["top-k","implicit"]:
+        new_score,new_v=results[name]
+        print("")
+        print("pc\tevr (sklearn)\tevr ("+name+")\t|cos|\tsame sign")
+        for i in range(num_pcs):
+            cos=np.dot(old_v[i],new_v[i])/(np.linalg.norm(old_v[i])*np.linalg.norm(new_v[i]))
+            print(i+1,old_score[i],new_score[i],"{:.12f}".format(abs(cos)),cos > 0,sep="\t")
+
+def random_compartment_matrix(nbins):
+    """random symmetrical matrix of two compartments (runs of bins) with a decaying diagonal signal
+    """
+
+    compartments=np.cumsum(np.random.random(nbins) < 0.02) % 2
+    compartments=np.where(compartments,1,-1)
+
+    distance=np.abs(np.arange(nbins)[:,None]-np.arange(nbins)[None,:])+1
+    signal=np.exp(0.5*compartments[:,None]*compartments[None,:])*(100/distance)
+    matrix=np.random.poisson(signal).astype(np.float64)
+    matrix=np.triu(matrix)+np.triu(matrix,1).T
+
+    return matrix
+
+def calculate_eigen_pca(A,numPCs=3):
+    """the original matrix2EigenVectors.py calculate_eigen (sklearn PCA), kept here as the benchmark reference
+    """
+
+    ncomp=min(100,A.shape[0])
+    pca = decomposition.PCA(n_components=ncomp)
+    pca.fit(A)
+    pca_score=pca.explained_variance_ratio_
+    pca_v = pca.components_[0:3]
+
+    return(pca_score,pca_v)
+
+if __name__=="__main__":
+    main()
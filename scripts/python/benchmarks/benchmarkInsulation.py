@@ -0,0 +1,156 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: benchmarkInsulation.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+benchmark the cumulative sum insulation engine (cworld.insulation) against the original
+matrix2insulation-lite.py per-bin box loop.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+# user defined modules
+from cworld.matrix import load_matrix
+from cworld.insulation import InsulationBand
+
+def main():
+
+    parser=argparse.ArgumentParser(description='benchmark insulation scores (cumulative sums vs per-bin box loop)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, default=None, help='interaction matrix (my5C) file, a random matrix is generated if not supplied')
+    parser.add_argument('-n', dest='nbins', type=int, default=5000, help='number of bins of the generated matrix')
+    parser.add_argument('--nan', dest='nan_fraction', type=float, default=0.05, help='fraction of NA rows/cols in the generated matrix')
+    parser.add_argument('--is', dest='insulation_square_size_binsize', type=int, default=10, help='insulation square size (# of bins)')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3, help='number of timed repeats (best is reported)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    nbins=args.nbins
+    nan_fraction=args.nan_fraction
+    k=args.insulation_square_size_binsize
+    repeat=args.repeat
+
+    if inputMatrix == None:
+        matrix=random_matrix(nbins,nan_fraction)
+    else:
+        if not os.path.isfile(inputMatrix):
+            sys.exit('invalid input file! (non-existant)')
+        matrix,header_rows,header_cols=load_matrix(inputMatrix,hrows=1,hcols=1)
+        print("inputMatrix",inputMatrix)
+
+    print("bins",matrix.shape[0],"insulation square (bins)",k)
+    print("")
+
+    results={}
+    for name,insulation_func in [("box loop",insulation_box_loop),("cumulative sums",insulation_cumulative_sums)]:
+        best=None
+        for r in range(repeat):
+            t0=time.time()
+            scores=insulation_func(matrix,k)
+            elapsed=time.time()-t0
+            if best == None or elapsed < best:
+                best=elapsed
+        results[name]=scores
+        print(name,"\t","{:.3f}".format(best),"s",sep="")
+
+    old_scores=results["box loop"]
+    new_scores=results["cumulative sums"]
+    identical=np.array_equal(np.isnan(old_scores),np.isnan(new_scores)) and np.array_equal(old_scores[~np.isnan(old_scores)],new_scores[~np.isnan(new_scores)])
+    print("")
+    print("identical output",identical)
+
+def random_matrix(nbins,nan_fraction):
+    """random symmetrical float32 matrix with nan rows/cols and a decaying diagonal signal
+    """
+
+    distance=np.abs(np.arange(nbins)[:,None]-np.arange(nbins)[None,:])+1
+    matrix=np.random.poisson(1000/distance).astype(np.float32)*np.random.random((nbins,nbins)).astype(np.float32)
+    matrix=np.triu(matrix)+np.triu(matrix,1).T
+
+    nan_bins=np.random.random(nbins) < nan_fraction
+    matrix[nan_bins,:]=np.nan
+    matrix[:,nan_bins]=np.nan
+
+    return matrix
+
+def insulation_cumulative_sums(matrix,k):
+    return InsulationBand(matrix,k).scores(k)
+
+def insulation_box_loop(matrix,insulation_square_size_binsize):
+    """the original matrix2insulation-lite.py box loop, kept here as the benchmark reference
+    """
+
+    num_headers=matrix.shape[0]
+    insulation=np.zeros(num_headers)
+
+    box_rows=insulation_square_size_binsize
+    box_cols=insulation_square_size_binsize
+    box=np.zeros([box_rows,box_cols])
+    box.fill(np.nan)
+
+    for y in range(0,num_headers,1):
+
+        startY=(y-insulation_square_size_binsize)
+        endY=y
+
+        startX=y+1
+        endX=(y+insulation_square_size_binsize)+1
+
+        if(endY <= 0) or (startX >= num_headers):
+            insulation[y]=np.nan
+            continue
+
+        y2=endY-1
+        x2=endX-1
+
+        startY=max(startY,0)
+        endY=min(endY,num_headers)
+        startX=max(startX,0)
+        endX=min(endX,num_headers)
+
+        # adjust previous box
+        tmp_box=np.zeros([box_rows,box_cols])
+        tmp_box.fill(np.nan)
+
+        row=np.zeros(box_rows)
+        row.fill(np.nan)
+        col=np.zeros(box_cols)
+        col.fill(np.nan)
+
+        tmp_box[0:-1,0:-1]=box[1:,1:]
+
+        row[0:endX-startX]=matrix[y2,startX:endX]
+        tmp_box[-1,:]=row
+
+        if(x2 < num_headers):
+            col[box_rows-(endY-startY):box_rows]=matrix[startY:endY,x2]
+            tmp_box[:,-1]=col
+
+        box=tmp_box
+
+        insulation_value=np.nan
+        num_nan=np.sum(np.isnan(box))
+        expected=box_rows*box_cols
+
+        if(num_nan != expected):
+            insulation_value=np.nanmean(box)
+        insulation[y]=insulation_value
+
+    return insulation
+
+if __name__=="__main__":
+    main()
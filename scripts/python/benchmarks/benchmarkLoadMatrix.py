@@ -0,0 +1,201 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: benchmarkLoadMatrix.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+benchmark the block parsing cworld.matrix.load_matrix against the original per-line loader.
+throughput is reported as MB/s of uncompressed matrix text.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import argparse
+import os
+import sys
+import gzip
+import itertools
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+# user defined modules
+from cworld.matrix import load_matrix
+
+def main():
+
+    parser=argparse.ArgumentParser(description='benchmark my5C matrix loading (block parser vs per-line parser)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, default=None, help='interaction matrix (my5C) file, a random matrix is generated if not supplied')
+    parser.add_argument('-n', dest='nbins', type=int, default=2000, help='number of bins of the generated matrix')
+    parser.add_argument('--nan', dest='nan_fraction', type=float, default=0.05, help='fraction of NA rows/cols in the generated matrix')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=3, help='number of timed repeats (best is reported)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    nbins=args.nbins
+    nan_fraction=args.nan_fraction
+    repeat=args.repeat
+
+    tmp_file=None
+    if inputMatrix == None:
+        tmp_fh,tmp_file=tempfile.mkstemp(suffix='.matrix.gz')
+        os.close(tmp_fh)
+        print("writing random ",nbins,"x",nbins," matrix ... ",sep="",end="")
+        sys.stdout.flush()
+        write_random_matrix(tmp_file,nbins,nan_fraction)
+        print("done")
+        inputMatrix=tmp_file
+
+    if not os.path.isfile(inputMatrix):
+        sys.exit('invalid input file! (non-existant)')
+
+    text_mb=matrix_text_size(inputMatrix)/1000/1000
+    print("inputMatrix",inputMatrix)
+    print("uncompressed size (MB)","{:.2f}".format(text_mb))
+    print("")
+
+    results={}
+    for name,loader in [("per-line",load_matrix_per_line),("block",load_matrix)]:
+        best=None
+        for r in range(repeat):
+            infh=input_wrapper(inputMatrix)
+            t0=time.time()
+            matrix,header_rows,header_cols=loader((l for l in infh if not l.startswith('#')), hrows=1, hcols=1)
+            elapsed=time.time()-t0
+            infh.close()
+            if best == None or elapsed < best:
+                best=elapsed
+        results[name]=(matrix,header_rows,header_cols)
+        print(name,"\t","{:.3f}".format(best),"s\t","{:.2f}".format(text_mb/best)," MB/s",sep="")
+
+    old_matrix,old_header_rows,old_header_cols=results["per-line"]
+    new_matrix,new_header_rows,new_header_cols=results["block"]
+    identical=(old_header_rows == new_header_rows) and (old_header_cols == new_header_cols) and np.array_equal(np.isnan(old_matrix),np.isnan(new_matrix)) and np.array_equal(np.nan_to_num(old_matrix),np.nan_to_num(new_matrix))
+    print("")
+    print("identical output",identical)
+
+    if tmp_file != None:
+        os.remove(tmp_file)
+
+def write_random_matrix(matrixFile,nbins,nan_fraction,bin_size=40000):
+    """write a random symmetrical my5C matrix with NA rows/cols and a decaying diagonal signal
+    """
+
+    headers=[str(i)+'|hg19|chr1:'+str((i*bin_size)+1)+'-'+str((i+1)*bin_size) for i in range(nbins)]
+    nan_bins=np.random.random(nbins) < nan_fraction
+    distance=np.abs(np.arange(nbins)[:,None]-np.arange(nbins)[None,:])+1
+
+    out_fh=gzip.open(matrixFile,'wb')
+    print(str(nbins)+"x"+str(nbins)+"\t"+"\t".join(headers),file=out_fh)
+    for i in range(nbins):
+        row=np.random.poisson(1000/distance[i]).astype(float)
+        row_str=["{:0.4f}".format(v) for v in row]
+        for j in np.nonzero(nan_bins)[0]:
+            row_str[j]="NA"
+        if nan_bins[i]:
+            row_str=["NA"]*nbins
+        print(headers[i]+"\t"+"\t".join(row_str),file=out_fh)
+    out_fh.close()
+
+def matrix_text_size(matrixFile):
+    size=0
+    infh=input_wrapper(matrixFile)
+    for l in infh:
+        size += len(l)
+    infh.close()
+    return size
+
+def input_wrapper(infile):
+    if infile.endswith('.gz'):
+        fh=gzip.open(infile,'r')
+    else:
+        fh=open(infile,'r')
+
+    return fh
+
+def load_matrix_per_line(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None):
+    """
+    the original per-line load_matrix, kept here as the benchmark reference
+    """
+
+    firstline=next(fh)
+
+    fh=itertools.chain([firstline],fh)
+
+    cols=len(firstline.rstrip("\n").split("\t"))
+    rows=row_block_size
+
+    if(hcols):
+        cols-=hcols
+
+    data=np.zeros((rows,cols),dtype=np_dtype)
+
+    header_rows=[[] for i in range(hrows)]
+
+    for i in range(hrows):
+        header_rows[i]=next(fh).rstrip("\n").split("\t")[hcols:]
+
+    header_cols=[[] for i in range(hcols)]
+
+    prev_cols=-1
+
+    r=0
+
+    for i in fh:
+        line=i.rstrip("\n").split("\t")
+
+        cols=len(line)-hcols
+
+        if(prev_cols>-1 and cols!=prev_cols):
+            if(pad and cols<prev_cols):
+                line=line+['']*(prev_cols-cols)
+                cols=len(line)-hcols
+            else:
+                sys.exit('inconsistent number of columns in input line '+str(r))
+
+        prev_cols=cols
+
+        not_allowed = ['','NA']
+        try: # if np_dtype does not except ''or 'NA' as a value
+            np.dtype(np_dtype).type(not_allowed)
+        except ValueError:
+            try:
+                np.dtype(np_dtype).type('nan')
+                line=[('nan' if i in not_allowed else i) for i in line] # '' or 'NA' are replaced with 'nan'
+            except ValueError:
+                pass
+
+        for j in range(hcols):
+            header_cols[j].append(line[j])
+
+        data[r,:]=line[hcols:]
+
+        # enlarge data if needed
+        if(r==(data.shape[0]-1)):
+            data=np.resize(data,(data.shape[0]+row_block_size,cols))
+            rows=data.shape[0]
+
+        r+=1
+
+    rows=r
+
+    data=np.resize(data,(rows,cols))
+
+    if (hcols==1):
+        header_cols=header_cols[0]
+
+    if (hrows==1):
+        header_rows=header_rows[0]
+
+    return data,header_rows,header_cols
+
+if __name__=="__main__":
+    main()
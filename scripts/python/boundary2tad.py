@@ -39,6 +39,9 @@ from math import cos,log,sin,sqrt
 # deprecated from scipy and unusde in the script:
 # from scipy import weave 
 
+# user defined modules
+from cworld.matrix import writeMatrix
+
 verboseprint=lambda *a, **k: None
 __version__ = "1.0"
 debug = None
@@ -515,29 +518,5 @@ def get_date():
 def get_compute_resource():
     return(socket.gethostname())
 
-def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4):
-    """
-    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
-    """
-    
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    
-    # interaction matrix output
-    out_fh=gzip.open(matrixFile,"wb")
-    
-    # write matrix col headers
-    header=[str(i) for i in header_cols]
-    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
-
-    format_func=("{:0."+str(precision)+"f}").format
-    
-    k=0
-    
-    for i in xrange(nrows):
-        print(header_rows[i]+"\t"+"\t".join(map(format_func,matrix[i,:])),file=out_fh)
-    
-    out_fh.close()
-
 if __name__=="__main__":
       main()
@@ -0,0 +1,14 @@
+"""
+***********************************************
+- PACKAGE: cworld
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+shared python library for the cworld-dekker python scripts (the python
+counterpart of lib/cworld/dekker.pm).  the scripts in scripts/python import it
+directly, e.g.
+
+    from cworld.matrix import load_matrix
+"""
+
+__version__ = "1.0"
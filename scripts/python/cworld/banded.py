@@ -0,0 +1,121 @@
+"""
+banded storage for symmetric matrices, for distance-limited (cis) analyses.
+
+only the diagonals 0..k of an n x n symmetric matrix are kept, as an n x (k+1) array:
+
+    data[i,d] = matrix[i,i+d]   (d = 0..k, cells past the end of the matrix are nan)
+
+memory is O(n*k) instead of O(n^2).  indexing (matrix[rows,cols] with ints and slices)
+returns dense np arrays with every cell further than k from the diagonal set to nan,
+so code reading rows, columns or sub-blocks near the diagonal runs unchanged.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from cworld.storage import StoredMatrix,square_size,copy_row_blocks
+
+class BandedMatrix(StoredMatrix):
+    """symmetric n x n matrix stored as its diagonals 0..k
+    """
+
+    storage='banded'
+
+    def __init__(self,n,k,dtype='float32',data=None,fill=np.nan):
+
+        self.n=int(n)
+        self.k=int(k)
+        self.shape=(self.n,self.n)
+        self.ndim=2
+
+        if self.k < 0:
+            raise ValueError('band must be >= 0')
+
+        if data is None:
+            data=np.empty((self.n,self.k+1),dtype=dtype)
+            data.fill(fill)
+        elif data.shape != (self.n,self.k+1):
+            raise ValueError('banded data does not match a '+str(self.n)+'x'+str(self.n)+' matrix with band '+str(self.k))
+
+        self.data=data
+        self.dtype=data.dtype
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __getitem__(self,key):
+        (rows,squeeze_rows),(cols,squeeze_cols)=self._keys(key)
+
+        rows=np.asarray(rows,dtype=np.int64).reshape(-1,1)
+        cols=np.asarray(cols,dtype=np.int64).reshape(1,-1)
+        lo=np.minimum(rows,cols)
+        d=np.abs(cols-rows)
+        in_band=d <= self.k
+
+        values=np.empty(in_band.shape,dtype=self.dtype)
+        values.fill(np.nan)
+        values[in_band]=self.data[lo[in_band],d[in_band]]
+
+        return self._squeeze(values,squeeze_rows,squeeze_cols)
+
+    def __setitem__(self,key,values):
+        """assign whole rows (matrix[r,:] or matrix[r0:r1,:]), only the diagonals 0..k are kept
+        """
+
+        rows=self._row_keys(key)
+
+        values=np.asarray(values,dtype=self.dtype).reshape(len(rows),self.n)
+        for j,i in enumerate(rows):
+            end=min(i+self.k+1,self.n)
+            self.data[i,0:end-i]=values[j,i:end]
+
+    def diagonal(self,k=0):
+        """k-th diagonal (the -k-th diagonal is the same), as a copy
+        """
+
+        k=abs(k)
+        if k > self.k:
+            raise IndexError('diagonal '+str(k)+' is outside of the band ('+str(self.k)+')')
+        return self.data[0:self.n-k,k].copy()
+
+    def set_diagonal(self,k,value):
+        """set the k-th (and -k-th) diagonal to value
+        """
+
+        k=abs(k)
+        if k <= self.k:
+            self.data[0:self.n-k,k]=value
+
+    def mask_rowcols(self,mask,value=np.nan):
+        """set the rows and columns in the boolean mask to value
+        """
+
+        mask=np.asarray(mask,dtype=bool)
+        self.data[mask,:]=value
+        for d in range(1,self.k+1):
+            self.data[0:self.n-d,d][mask[d:]]=value
+
+    def nan_rowcols(self):
+        """rows (= cols) whose band is entirely nan
+        """
+
+        nan_values=np.isnan(self.data)
+        nan_rows=np.all(nan_values,axis=1)
+        for d in range(1,self.k+1):
+            nan_rows[d:] &= nan_values[0:self.n-d,d]
+
+        return nan_rows
+
+    @classmethod
+    def from_dense(cls,matrix,k,row_block_size=1000,dtype=None):
+        """keep the diagonals 0..k of a square (np array or np.memmap) matrix, a row block at a time
+        """
+
+        n=square_size(matrix,'banded')
+
+        if dtype == None:
+            dtype=matrix.dtype
+        return copy_row_blocks(cls(n,k,dtype=dtype),matrix,row_block_size)
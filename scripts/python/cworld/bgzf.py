@@ -0,0 +1,212 @@
+"""
+block gzip (BGZF-style) output for the cworld python scripts.
+
+the output is a series of independent gzip members, each holding at most
+BGZF_BLOCK_SIZE bytes of uncompressed text and tagged with its compressed size
+in a 'BC' extra field (the layout used by bgzip/tabix), followed by the empty
+BGZF end-of-file block.  concatenated gzip members are plain gzip, so the files
+are read by gzip/zcat/gzip.open as before.
+
+since blocks are independent they are compressed on a thread pool (zlib
+releases the GIL while deflating), threads blocks at a time, and written in order.
+
+the writer keeps the (compressed offset, uncompressed offset) of every block it
+writes and tell() returns the uncompressed position, so callers can build a
+random-access index of what they wrote (see cworld.index).
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import zlib
+import struct
+
+from multiprocessing.pool import ThreadPool
+
+BGZF_BLOCK_SIZE = 0xff00  # max uncompressed bytes per block, keeps the compressed block under 64KB
+BGZF_EOF = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+DEFAULT_COMPRESSION_LEVEL = 6
+
+_header_struct = struct.Struct('<4BI2BH2BHH')
+_trailer_struct = struct.Struct('<II')
+
+def compress_block(data,compresslevel=DEFAULT_COMPRESSION_LEVEL):
+    """compress one block of uncompressed bytes into a BGZF gzip member
+    """
+
+    compressor=zlib.compressobj(compresslevel,zlib.DEFLATED,-15)
+    deflated=compressor.compress(data)+compressor.flush()
+
+    block_size=_header_struct.size+len(deflated)+_trailer_struct.size
+    header=_header_struct.pack(0x1f,0x8b,8,4,0,0,0xff,6,ord('B'),ord('C'),2,block_size-1)
+    trailer=_trailer_struct.pack(zlib.crc32(data) & 0xffffffff,len(data))
+
+    return header+deflated+trailer
+
+class BgzfWriter(object):
+    """write-only file object producing BGZF output, blocks are compressed on threads workers
+    """
+
+    def __init__(self,filename,mode='wb',compresslevel=DEFAULT_COMPRESSION_LEVEL,threads=1):
+
+        if 'a' in mode:
+            mode='ab'
+        else:
+            mode='wb'
+
+        self.name=filename
+        self.compresslevel=compresslevel
+        self.threads=max(1,threads)
+        self.closed=False
+
+        self._fh=open(filename,mode)
+        self._compressed_offset=0
+        if mode=='ab':
+            self._compressed_offset=os.path.getsize(filename)
+        self._uncompressed_offset=0
+        self._block_offset=0
+        self.block_offsets=[]
+
+        self._buffer=[]
+        self._buffer_size=0
+        self._blocks=[]
+        self._pool=None
+        if self.threads > 1:
+            self._pool=ThreadPool(self.threads)
+
+    def write(self,data):
+        if not isinstance(data,bytes):
+            data=data.encode('utf-8')
+
+        self._buffer.append(data)
+        self._buffer_size+=len(data)
+        self._uncompressed_offset+=len(data)
+
+        if self._buffer_size >= BGZF_BLOCK_SIZE:
+            data=b''.join(self._buffer)
+            n_full=len(data)//BGZF_BLOCK_SIZE
+            for i in range(n_full):
+                self._blocks.append(data[i*BGZF_BLOCK_SIZE:(i+1)*BGZF_BLOCK_SIZE])
+            rest=data[n_full*BGZF_BLOCK_SIZE:]
+            self._buffer=[rest]
+            self._buffer_size=len(rest)
+
+            # compress threads*4 blocks per round, so every worker stays busy
+            if len(self._blocks) >= self.threads*4:
+                self._flush_blocks()
+
+    def tell(self):
+        """uncompressed position, i.e. the number of bytes written so far
+        """
+
+        return self._uncompressed_offset
+
+    def writelines(self,lines):
+        for l in lines:
+            self.write(l)
+
+    def flush(self):
+        self._flush_blocks()
+        self._fh.flush()
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self._buffer_size:
+            self._blocks.append(b''.join(self._buffer))
+        self._buffer=[]
+        self._buffer_size=0
+
+        self._flush_blocks()
+        self._fh.write(BGZF_EOF)
+        self._fh.close()
+
+        if self._pool != None:
+            self._pool.close()
+            self._pool.join()
+
+        self.closed=True
+
+    def _flush_blocks(self):
+        if not self._blocks:
+            return
+
+        compresslevel=self.compresslevel
+        if self._pool != None and len(self._blocks) > 1:
+            compressed=self._pool.map(lambda b: compress_block(b,compresslevel),self._blocks)
+        else:
+            compressed=[compress_block(b,compresslevel) for b in self._blocks]
+
+        for b,c in zip(self._blocks,compressed):
+            self.block_offsets.append((self._compressed_offset,self._block_offset))
+            self._fh.write(c)
+            self._compressed_offset+=len(c)
+            self._block_offset+=len(b)
+        self._blocks=[]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+def bgzf_open(filename,mode='wb',compresslevel=DEFAULT_COMPRESSION_LEVEL,threads=1):
+    """open a BGZF file for writing (drop-in for gzip.open(filename,'wb') on the output side)
+    """
+
+    return BgzfWriter(filename,mode=mode,compresslevel=compresslevel,threads=threads)
+
+def is_bgzf(filename):
+    """true if filename starts with a BGZF block (gzip member carrying the BC extra field)
+    """
+
+    try:
+        with open(filename,'rb') as fh:
+            header=fh.read(_header_struct.size)
+    except IOError:
+        return False
+
+    if len(header) != _header_struct.size:
+        return False
+
+    id1,id2,cm,flg,mtime,xfl,os_id,xlen,si1,si2,slen,bsize=_header_struct.unpack(header)
+    return id1==0x1f and id2==0x8b and (flg & 4) and xlen==6 and si1==ord('B') and si2==ord('C') and slen==2
+
+def read_bgzf_block(fh):
+    """read the BGZF block at the current position of fh - returns (compressed size, uncompressed bytes), None at end of file
+    """
+
+    header=fh.read(_header_struct.size)
+    if len(header) == 0:
+        return None
+    if len(header) != _header_struct.size:
+        raise IOError('truncated BGZF block ('+str(fh.name)+')')
+
+    id1,id2,cm,flg,mtime,xfl,os_id,xlen,si1,si2,slen,bsize=_header_struct.unpack(header)
+    if not (id1==0x1f and id2==0x8b and xlen==6 and si1==ord('B') and si2==ord('C')):
+        raise IOError('not a BGZF block ('+str(fh.name)+')')
+
+    block_size=bsize+1
+    rest=fh.read(block_size-_header_struct.size)
+    if len(rest) != block_size-_header_struct.size:
+        raise IOError('truncated BGZF block ('+str(fh.name)+')')
+
+    data=zlib.decompress(rest[:-_trailer_struct.size],-15)
+
+    return block_size,data
+
+def bgzf_blocks(filename,compressed_offset=0):
+    """iterate over (compressed offset, uncompressed bytes) of the BGZF blocks of filename, starting at compressed_offset
+    """
+
+    with open(filename,'rb') as fh:
+        fh.seek(compressed_offset)
+        while True:
+            block=read_bgzf_block(fh)
+            if block == None:
+                return
+            block_size,data=block
+            yield compressed_offset,data
+            compressed_offset+=block_size
@@ -0,0 +1,162 @@
+"""
+cworld binary matrix format - a memory-mappable alternative to the gzipped my5C text matrix.
+
+layout (all integers little-endian):
+
+    [0:8]       magic 'CWMATRIX'
+    [8:40]      uint64 version, data_offset, meta_offset, meta_length
+    [4096:]     raw row-major float32 matrix (nrows x ncols), page aligned
+    [meta:]     JSON header table - nrows, ncols, dtype, row/col headers, chrs and the
+                bin coordinates (chr index, start, end) of every row/col, -1 for non-genomic headers
+
+the header table is written after the data, so a matrix can be streamed in row blocks
+without knowing the number of rows up front.  readers open the data block with np.memmap,
+so only the rows a tool actually touches are read from disk.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import re
+import json
+import struct
+
+import numpy as np
+
+BINARY_MATRIX_MAGIC = b'CWMATRIX'
+BINARY_MATRIX_VERSION = 1
+BINARY_MATRIX_EXTENSION = '.bin'
+BINARY_MATRIX_DTYPE = '<f4'
+BINARY_MATRIX_DATA_OFFSET = 4096
+
+_prefix_struct = struct.Struct('<8sQQQQ')
+
+def is_binary_matrix(matrixFile):
+    """true if matrixFile is a cworld binary matrix (checks the magic, not the extension)
+    """
+
+    try:
+        with open(matrixFile,'rb') as fh:
+            return fh.read(len(BINARY_MATRIX_MAGIC)) == BINARY_MATRIX_MAGIC
+    except IOError:
+        return False
+
+def is_binary_matrix_name(matrixFile):
+    """true if matrixFile should be written as a binary matrix (by extension)
+    """
+
+    return matrixFile.endswith(BINARY_MATRIX_EXTENSION)
+
+def header2bin(header,chr_dict):
+    """header -> [chr index, start, end], [-1,-1,-1] if the header carries no coordinates
+    """
+
+    m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
+    if m==None:
+        return [-1,-1,-1]
+
+    bin_id,genome,chr_id,bin_start,bin_end=m.groups()
+    if chr_id not in chr_dict:
+        chr_dict[chr_id]=len(chr_dict)
+
+    return [chr_dict[chr_id],int(bin_start),int(bin_end)]
+
+def write_binary_matrix(header_rows,header_cols,matrix,matrixFile,row_block_size=1000):
+    """write a np matrix with row/col headers into the binary matrix format
+    header_rows label the rows, header_cols the columns (same convention as writeMatrix)
+    """
+
+    nrows=len(header_rows)
+
+    def row_blocks():
+        for i in range(0,nrows,row_block_size):
+            yield header_rows[i:i+row_block_size],matrix[i:i+row_block_size,:]
+
+    write_binary_matrix_blocks(header_cols,row_blocks(),matrixFile)
+
+def write_binary_matrix_blocks(header_cols,row_blocks,matrixFile):
+    """stream (row headers, row values) blocks into a binary matrix
+    memory is bounded by one block - the header table is appended once all rows are written
+    """
+
+    header_cols=[str(h) for h in header_cols]
+    ncols=len(header_cols)
+
+    header_rows=[]
+    out_fh=open(matrixFile,'wb')
+    out_fh.write(_prefix_struct.pack(BINARY_MATRIX_MAGIC,BINARY_MATRIX_VERSION,BINARY_MATRIX_DATA_OFFSET,0,0))
+    out_fh.seek(BINARY_MATRIX_DATA_OFFSET)
+
+    for block_headers,block_values in row_blocks:
+        block_values=np.asarray(block_values)
+        if block_values.ndim != 2 or block_values.shape[1] != ncols:
+            out_fh.close()
+            raise ValueError('binary matrix block does not match the number of columns ('+str(ncols)+')')
+        header_rows.extend([str(h) for h in block_headers])
+        np.ascontiguousarray(block_values,dtype=BINARY_MATRIX_DTYPE).tofile(out_fh)
+
+    nrows=len(header_rows)
+
+    chr_dict={}
+    row_bins=[header2bin(h,chr_dict) for h in header_rows]
+    col_bins=[header2bin(h,chr_dict) for h in header_cols]
+    chrs=sorted(chr_dict,key=chr_dict.get)
+
+    meta={
+        'nrows':nrows,
+        'ncols':ncols,
+        'dtype':BINARY_MATRIX_DTYPE,
+        'header_rows':header_rows,
+        'header_cols':header_cols,
+        'chrs':chrs,
+        'row_bins':row_bins,
+        'col_bins':col_bins
+    }
+    meta_json=json.dumps(meta,separators=(',',':')).encode('utf-8')
+
+    meta_offset=BINARY_MATRIX_DATA_OFFSET+(nrows*ncols*np.dtype(BINARY_MATRIX_DTYPE).itemsize)
+    out_fh.seek(meta_offset)
+    out_fh.write(meta_json)
+
+    out_fh.seek(0)
+    out_fh.write(_prefix_struct.pack(BINARY_MATRIX_MAGIC,BINARY_MATRIX_VERSION,BINARY_MATRIX_DATA_OFFSET,meta_offset,len(meta_json)))
+    out_fh.close()
+
+def load_binary_matrix_info(matrixFile):
+    """read the header table (JSON meta) of a binary matrix, plus the data offset
+    """
+
+    with open(matrixFile,'rb') as fh:
+        magic,version,data_offset,meta_offset,meta_length=_prefix_struct.unpack(fh.read(_prefix_struct.size))
+        if magic != BINARY_MATRIX_MAGIC:
+            raise ValueError('not a cworld binary matrix ('+matrixFile+')')
+        if version > BINARY_MATRIX_VERSION:
+            raise ValueError('unsupported binary matrix version '+str(version)+' ('+matrixFile+')')
+        if meta_offset == 0:
+            raise ValueError('incomplete binary matrix, no header table ('+matrixFile+')')
+        fh.seek(meta_offset)
+        meta=json.loads(fh.read(meta_length).decode('utf-8'))
+
+    meta['data_offset']=data_offset
+    meta['header_rows']=[str(h) for h in meta['header_rows']]
+    meta['header_cols']=[str(h) for h in meta['header_cols']]
+    meta['chrs']=[str(c) for c in meta['chrs']]
+    meta['row_bins']=np.array(meta['row_bins'],dtype=np.int64).reshape(-1,3)
+    meta['col_bins']=np.array(meta['col_bins'],dtype=np.int64).reshape(-1,3)
+
+    return meta
+
+def load_binary_matrix(matrixFile,mode='c'):
+    """open a binary matrix as np.memmap - returns (data,header_rows,header_cols,meta)
+    mode 'c' (copy-on-write) lets tools edit the matrix in memory without touching the file
+    """
+
+    meta=load_binary_matrix_info(matrixFile)
+    nrows,ncols=meta['nrows'],meta['ncols']
+
+    if nrows == 0 or ncols == 0:
+        data=np.zeros((nrows,ncols),dtype=meta['dtype'])
+    else:
+        data=np.memmap(matrixFile,dtype=meta['dtype'],mode=mode,offset=meta['data_offset'],shape=(nrows,ncols))
+
+    return data,meta['header_rows'],meta['header_cols'],meta
@@ -0,0 +1,162 @@
+"""
+content-addressed binary cache of parsed my5C matrices.
+
+a parsed matrix is stored in the cache directory as two sidecar files named by
+the sha1 of the input file content (plus the loader options):
+
+    <key>.npy       the float32 matrix, memory-mapped (copy-on-write) on later loads
+    <key>.npz       the header lists
+
+a small <stat>.key file maps the input path, size and mtime to the content key,
+so an unchanged input is found without re-hashing it.  files are written to a
+temporary name and renamed into place, so several jobs can share one cache
+directory.  the cache is bounded by size - least recently used entries are
+evicted after each store.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import hashlib
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_SIZE = 10*1000  # MB
+
+def matrix_cache_key(cache_dir,matrixFile,options):
+    """get the content key of matrixFile (loaded with options), using the size/mtime pointer when possible
+    """
+
+    matrixFile=os.path.realpath(matrixFile)
+    st=os.stat(matrixFile)
+
+    option_tag="-".join([str(o) for o in options])
+    stat_tag=matrixFile+"|"+str(st.st_size)+"|"+repr(st.st_mtime)+"|"+option_tag
+    stat_key=hashlib.sha1(stat_tag.encode('utf-8')).hexdigest()
+    pointer_file=os.path.join(cache_dir,stat_key+".key")
+
+    if os.path.isfile(pointer_file):
+        with open(pointer_file,'r') as fh:
+            key=fh.read().strip()
+        if key:
+            return key
+
+    content_hash=hashlib.sha1()
+    with open(matrixFile,'rb') as fh:
+        for chunk in iter(lambda: fh.read(4*1024*1024), b''):
+            content_hash.update(chunk)
+    key=content_hash.hexdigest()+"-"+str(st.st_size)+"-"+option_tag
+
+    _atomic_write(cache_dir,pointer_file,lambda fh: fh.write(key.encode('utf-8')))
+
+    return key
+
+def fetch_cached_matrix(cache_dir,key):
+    """return (data,header_rows,header_cols) for a cached key, or None on a cache miss
+    data is memory-mapped copy-on-write, so in-place edits never reach the cache
+    """
+
+    data_file=os.path.join(cache_dir,key+".npy")
+    header_file=os.path.join(cache_dir,key+".npz")
+
+    if not (os.path.isfile(data_file) and os.path.isfile(header_file)):
+        return None
+
+    try:
+        data=np.load(data_file,mmap_mode='c')
+        with np.load(header_file) as headers:
+            header_rows=headers['header_rows'].tolist()
+            header_cols=headers['header_cols'].tolist()
+    except (IOError,ValueError):
+        return None
+
+    # mark as recently used (eviction is by mtime, atime is often disabled on scratch)
+    for f in (data_file,header_file):
+        try:
+            os.utime(f,None)
+        except OSError:
+            pass
+
+    return data,header_rows,header_cols
+
+def store_cached_matrix(cache_dir,key,data,header_rows,header_cols,cache_size=DEFAULT_CACHE_SIZE):
+    """write a parsed matrix into the cache, then evict down to cache_size (MB)
+    """
+
+    data_file=os.path.join(cache_dir,key+".npy")
+    header_file=os.path.join(cache_dir,key+".npz")
+
+    _atomic_write(cache_dir,data_file,lambda fh: np.save(fh,np.ascontiguousarray(data)))
+    _atomic_write(cache_dir,header_file,lambda fh: np.savez(fh,header_rows=np.array(header_rows),header_cols=np.array(header_cols)))
+
+    evict_matrix_cache(cache_dir,cache_size,keep=key)
+
+def evict_matrix_cache(cache_dir,cache_size=DEFAULT_CACHE_SIZE,keep=None):
+    """remove least recently used entries until the cache holds at most cache_size (MB)
+    """
+
+    entries={}
+    for f in os.listdir(cache_dir):
+        key,ext=os.path.splitext(f)
+        if ext not in ('.npy','.npz'):
+            continue
+        path=os.path.join(cache_dir,f)
+        try:
+            st=os.stat(path)
+        except OSError:
+            continue
+        size,last_used=entries.get(key,(0,0))
+        entries[key]=(size+st.st_size,max(last_used,st.st_mtime))
+
+    max_bytes=cache_size*1000*1000
+    total_bytes=sum(size for size,last_used in entries.values())
+
+    for key in sorted(entries,key=lambda k: entries[k][1]):
+        if total_bytes <= max_bytes:
+            break
+        if key == keep:
+            continue
+        for ext in ('.npy','.npz'):
+            try:
+                os.remove(os.path.join(cache_dir,key+ext))
+            except OSError:
+                pass
+        total_bytes -= entries[key][0]
+
+    # drop size/mtime pointers to evicted entries
+    for f in os.listdir(cache_dir):
+        if not f.endswith('.key'):
+            continue
+        path=os.path.join(cache_dir,f)
+        try:
+            with open(path,'r') as fh:
+                key=fh.read().strip()
+            if not os.path.isfile(os.path.join(cache_dir,key+".npy")):
+                os.remove(path)
+        except (IOError,OSError):
+            pass
+
+def _atomic_write(cache_dir,path,write_func):
+    """write through write_func into a temporary file, then rename it into place
+    """
+
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):
+                raise
+
+    tmp_fd,tmp_path=tempfile.mkstemp(dir=cache_dir,suffix='.tmp')
+    try:
+        # mkstemp creates 0600 files - entries must be readable by everyone sharing the cache
+        os.chmod(tmp_path,0o644)
+        with os.fdopen(tmp_fd,'wb') as fh:
+            write_func(fh)
+        os.rename(tmp_path,path)
+    except:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
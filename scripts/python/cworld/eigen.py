@@ -0,0 +1,248 @@
+"""
+leading principal components of a (correlation) matrix, without a full PCA.
+
+matrix2EigenVectors.py fits sklearn PCA (100 components) on the rows of the n x n
+correlation matrix A, and only uses the first 3.  the principal components are the
+leading eigenvectors of X'X, X = A - 1*mu' (mu = column means), so
+
+    X'X v = A'(Av - (mu.v)*1) - mu*sum(Av - (mu.v)*1)
+
+gives them from ARPACK (scipy.sparse.linalg.eigsh) with a few matrix-vector products
+per iteration - X and X'X are never formed.  the explained variance ratio of a component
+is its eigenvalue over the trace of X'X (the total variance, ||X||_F^2), as sklearn
+reports it.  components are signed like sklearn's (svd_flip: the largest absolute
+value of Xv is positive).
+
+CorrelationOperator applies the row correlation matrix R = np.corrcoef(M) of a dense or
+sparse matrix M the same way, R = ZZ' with Z the rows of M centered and scaled to unit
+norm, so Rv = Z(Z'v) costs two products with M and R is never formed either (peak memory
+is about one copy of M).  the total variance ||R||_F^2 is summed over row blocks of R, and
+row slices R[i:j] are computed on demand, so writeMatrix can write R block by block.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
+from cworld.sparse import SparseMatrix
+
+def truncated_pca(A,k=3,tol=0,seed=0,row_block_size=1000):
+    """(explained variance ratios, components) of the k leading principal components of the rows of A
+    components[0] is the first PC - the k largest of sklearn PCA(A) explained_variance_ratio_/components_
+    tol is the ARPACK relative tolerance (0 = machine precision), seed the seed of the start vector
+    """
+
+    n=A.shape[0]
+    column_means=np.zeros(A.shape[1])
+    for i in range(0,n,row_block_size):
+        column_means += np.sum(A[i:i+row_block_size],axis=0)
+    column_means /= n
+
+    total_variance=0
+    for i in range(0,n,row_block_size):
+        total_variance += np.sum(np.square(A[i:i+row_block_size]-column_means))
+
+    return centered_pca(A.dot,A.T.dot,A.shape,column_means,total_variance,k=k,tol=tol,seed=seed)
+
+def centered_pca(matvec,rmatvec,shape,column_means,total_variance,k=3,tol=0,seed=0):
+    """(explained variance ratios, components) of the k leading principal components of the rows of
+    the matrix A given as matvec(v) = Av and rmatvec(v) = A'v (see truncated_pca)
+    """
+
+    n,m=shape
+    if k >= m:
+        sys.exit('too few rows/cols for '+str(k)+' principal components!')
+
+    def centered_matvec(v):
+        return matvec(v)-np.dot(column_means,v)
+
+    def covariance_matvec(v):
+        x=centered_matvec(np.ravel(v))
+        return rmatvec(x)-(column_means*np.sum(x))
+
+    covariance=scipy.sparse.linalg.LinearOperator((m,m),matvec=covariance_matvec,dtype=np.float64)
+    v0=np.random.RandomState(seed).uniform(-1,1,m)
+
+    eigenvalues,eigenvectors=scipy.sparse.linalg.eigsh(covariance,k=k,which='LA',tol=tol,v0=v0)
+
+    order=np.argsort(eigenvalues)[::-1]
+    eigenvalues=eigenvalues[order]
+    components=eigenvectors[:,order].T
+
+    for i in range(k):
+        x=centered_matvec(components[i])
+        if x[np.argmax(np.abs(x))] < 0:
+            components[i] *= -1
+
+    explained_variance_ratio=np.maximum(eigenvalues,0)/total_variance
+
+    return explained_variance_ratio,components
+
+def correlation_pca(matrix,k=3,tol=0,seed=0,row_block_size=1000):
+    """(explained variance ratios, components) of the k leading principal components of the rows of
+    np.corrcoef(matrix), without forming the correlation matrix (see CorrelationOperator, truncated_pca)
+    matrix can be a CorrelationOperator
+    """
+
+    R=matrix
+    if not isinstance(R,CorrelationOperator):
+        R=CorrelationOperator(matrix,row_block_size=row_block_size)
+
+    n=R.shape[0]
+    column_means=R.matvec(np.ones(n))/n
+    total_variance=R.frobenius_norm2()-(n*np.dot(column_means,column_means))
+
+    return centered_pca(R.matvec,R.matvec,R.shape,column_means,total_variance,k=k,tol=tol,seed=seed)
+
+class CorrelationOperator(object):
+    """row correlation matrix R = np.corrcoef(matrix) of a dense, CSR or SparseMatrix matrix, as products with the matrix
+    dense matrices are multiplied in float64 row blocks (no float64 copy of a float32 matrix), constant rows correlate 0
+    R[i:j] (or R[i:j,:]) returns the dense rows i..j-1
+    """
+
+    def __init__(self,matrix,row_block_size=1000):
+
+        if isinstance(matrix,SparseMatrix):
+            matrix=matrix.data
+        self.sparse=scipy.sparse.issparse(matrix)
+        if self.sparse:
+            matrix=scipy.sparse.csr_matrix(matrix,dtype=np.float64)
+
+        self.matrix=matrix
+        self.row_block_size=row_block_size
+
+        n,m=matrix.shape
+        self.shape=(n,n)
+        self.ndim=2
+        self.dtype=np.dtype(np.float64)
+
+        self.row_means=self._dot(np.ones(m))/m
+        if self.sparse:
+            row_norms=np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel()-(m*np.square(self.row_means))
+            row_norms=np.sqrt(np.maximum(row_norms,0))
+        else:
+            row_norms=np.zeros(n)
+            for i in range(0,n,row_block_size):
+                row_norms[i:i+row_block_size]=np.sqrt(np.sum(np.square(self._rows(i)-self.row_means[i:i+row_block_size,None]),axis=1))
+
+        self.row_scales=np.zeros(n)
+        nonzero=row_norms > 0
+        self.row_scales[nonzero]=1/row_norms[nonzero]
+
+    def matvec(self,v):
+        """Rv"""
+
+        w=self.row_scales*np.ravel(v)
+        x=self._tdot(w)-np.dot(self.row_means,w)
+        return self.row_scales*(self._dot(x)-(self.row_means*np.sum(x)))
+
+    def frobenius_norm2(self):
+        """sum of the squared values of R"""
+
+        n=self.shape[0]
+        b=self.row_block_size
+
+        total=0
+        for i in range(0,n,b):
+            if self.sparse:
+                total += np.sum(np.square(self.rows(i,i+b)))
+                continue
+            # dense - the blocks ZiZj' of the upper triangle (R is symmetric)
+            Zi=self._z_rows(i,i+b)
+            total += np.sum(np.square(Zi.dot(Zi.T)))
+            for j in range(i+b,n,b):
+                total += 2*np.sum(np.square(Zi.dot(self._z_rows(j,j+b).T)))
+
+        return total
+
+    def rows(self,i,j):
+        """dense rows i..j-1 of R"""
+
+        # rows i.. of R = Z(M' - mu 1')diag(scales)
+        Z=self._z_rows(i,j)
+        return (self._dot(Z.T).T*self.row_scales)-np.outer(np.sum(Z,axis=1),self.row_scales*self.row_means)
+
+    def _z_rows(self,i,j):
+        """rows i..j-1 of Z"""
+
+        return (self._rows(i,j)-self.row_means[i:j,None])*self.row_scales[i:j,None]
+
+    def __getitem__(self,key):
+        rows=key[0] if isinstance(key,tuple) else key
+        if isinstance(key,tuple) and key[1] != slice(None):
+            raise IndexError('only row slices of the correlation matrix can be read')
+        i,j,step=rows.indices(self.shape[0])
+        if step != 1:
+            raise IndexError('only row slices of the correlation matrix can be read')
+
+        return self.rows(i,max(i,j))
+
+    def _rows(self,i,j=None):
+        if j == None:
+            j=i+self.row_block_size
+        rows=self.matrix[i:j]
+        if self.sparse:
+            return rows.toarray()
+        return rows.astype(np.float64,copy=False)
+
+    def _dot(self,V):
+        """MV"""
+
+        if self.sparse:
+            return self.matrix.dot(V)
+
+        n=self.matrix.shape[0]
+        out=np.empty((n,)+V.shape[1:])
+        for i in range(0,n,self.row_block_size):
+            out[i:i+self.row_block_size]=self._rows(i).dot(V)
+        return out
+
+    def _tdot(self,W):
+        """M'W"""
+
+        if self.sparse:
+            return self.matrix.T.dot(W)
+
+        out=np.zeros((self.matrix.shape[1],)+W.shape[1:])
+        for i in range(0,self.matrix.shape[0],self.row_block_size):
+            out += self._rows(i).T.dot(W[i:i+self.row_block_size])
+        return out
+
+class ExpandedMatrix(object):
+    """matrix with nan rows/cols inserted where valid_rows/valid_cols are False, read by row slices
+    (e.g. by writeMatrix) - only the rows of a slice are expanded
+    """
+
+    def __init__(self,matrix,valid_rows,valid_cols):
+
+        self.matrix=matrix
+        self.valid_rows=np.asarray(valid_rows,dtype=bool)
+        self.valid_cols=np.asarray(valid_cols,dtype=bool)
+        self.shape=(len(self.valid_rows),len(self.valid_cols))
+        self.ndim=2
+        self.dtype=np.dtype(np.float64)
+
+        # row of matrix of every (expanded) row
+        self._matrix_rows=np.r_[0,np.cumsum(self.valid_rows)]
+
+    def __getitem__(self,key):
+        rows=key[0] if isinstance(key,tuple) else key
+        if isinstance(key,tuple) and key[1] != slice(None):
+            raise IndexError('only row slices of an expanded matrix can be read')
+        i,j,step=rows.indices(self.shape[0])
+        if step != 1:
+            raise IndexError('only row slices of an expanded matrix can be read')
+        j=max(i,j)
+
+        block=np.empty((j-i,self.shape[1]))
+        block.fill(np.nan)
+        valid=np.nonzero(self.valid_rows[i:j])[0]
+        if len(valid):
+            block[np.ix_(valid,np.nonzero(self.valid_cols)[0])]=self.matrix[self._matrix_rows[i]:self._matrix_rows[j],:]
+
+        return block
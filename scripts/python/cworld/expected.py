@@ -0,0 +1,111 @@
+"""
+distance normalization (observed/expected) of contact matrices.
+
+the expected value of a cell is the mean of its distance band - the lower triangle
+diagonals (offset = row-col) start..end-1 of a band, log-spaced by default (logbins).
+diagonals are strided views of the flat matrix (step N+1), so the per-diagonal sums
+and the division run in place, one diagonal at a time, with no N x N temporaries.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+from math import log
+
+import numpy as np
+
+from cworld.sparse import SparseMatrix
+
+def logbins(a, b, pace, N_in=0):
+    "create log-spaced bins"
+    a = int(a)
+    b = int(b)
+    beg = log(a)
+    end = log(b - 1)
+    pace = log(pace)
+    N = int((end - beg) / pace)
+
+    if N > 0.8 * (b-a):
+        return np.arange(a,b+1)
+
+    if N_in != 0: N = N_in
+    pace = (end - beg) / N
+    mas = np.arange(beg, end + 0.000000001, pace)
+    ret = np.exp(mas)
+    ret = np.array([int(i) for i in ret])
+    ret[-1] = b
+    for i in range(len(ret) - 1):
+        if ret[i + 1] <= ret[i]:
+            ret[i + 1: - 1] += 1
+    return [int(i) for i in ret]
+
+def expected_bins(N,pace=1.2):
+    """[start,end) offset bands of an N x N matrix - the main diagonal, then log-spaced bands (logbins) up to N
+    """
+
+    bins=logbins(1,N,pace)
+    bins=[(0,1)]+[(bins[i],bins[i+1]) for i in range(len(bins)-1)]
+
+    return np.array(bins,dtype=np.int64).reshape(-1,2)
+
+def _diagonal(flat,N,offset,upper=False):
+    """view of the diagonal at offset (lower triangle, or upper) of the flat N x N matrix"""
+
+    if upper:
+        return flat[offset::N+1][0:N-offset]
+    return flat[offset*N::N+1]
+
+def diagonal_sums(matrix):
+    """(sums, cell counts) of the lower triangle diagonals, offsets 0..N-1, of a dense matrix
+    """
+
+    data=np.ascontiguousarray(matrix)
+    N=data.shape[0]
+    flat=data.reshape(-1)
+
+    sums=np.array([np.sum(_diagonal(flat,N,offset),dtype=np.float64) for offset in range(N)])
+    counts=N-np.arange(N)
+
+    return sums,counts
+
+def expected(matrix,bins):
+    """mean of every [start,end) offset band (bins) of the lower triangle of a dense matrix
+    """
+
+    sums,counts=diagonal_sums(matrix)
+    bins=np.asarray(bins,dtype=np.int64).reshape(-1,2)
+
+    band_sums=np.array([np.sum(sums[start:end]) for start,end in bins])
+    band_counts=np.array([np.sum(counts[start:end]) for start,end in bins])
+
+    return band_sums/band_counts
+
+def observed_over_expected(matrix,bins=None):
+    """divide every value by the mean of its distance band (see expected), bands with a 0 mean are left as is
+    bins default to expected_bins(N).  a C ordered float64 matrix is divided in place (other dense
+    matrices are converted first), SparseMatrix input is normalized by SparseMatrix.observed_over_expected
+    """
+
+    if bins is None:
+        bins=expected_bins(matrix.shape[0])
+    bins=np.asarray(bins,dtype=np.int64).reshape(-1,2)
+
+    if isinstance(matrix,SparseMatrix):
+        return matrix.observed_over_expected(bins)
+
+    data=np.asarray(matrix,dtype=np.float64,order="C")
+    N=data.shape[0]
+    flat=data.reshape(-1)
+
+    means=expected(data,bins)
+    for (start,end),mean in zip(bins,means):
+        if mean == 0:
+            continue
+        for offset in range(start,end):
+            lower=_diagonal(flat,N,offset)
+            lower/=mean
+            if offset > 0:
+                upper=_diagonal(flat,N,offset,upper=True)
+                upper/=mean
+
+    return data
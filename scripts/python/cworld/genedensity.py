@@ -0,0 +1,193 @@
+"""
+gene density (number of overlapping refSeq genes) of every bin of a my5C header table.
+
+the counts are those of `bedtools intersect -a <compartment file> -b <refseq file> -c` -
+bins are read as start..end (bed, half-open) and a gene start..end overlaps a bin if
+gene start < bin end and gene end > bin start, on the same chromosome name.  with the
+gene starts and ends of a chromosome sorted, the count of every bin is
+
+    (# gene starts < bin end) - (# gene ends <= bin start)
+
+i.e. two np.searchsorted sweeps over the sorted bins, no interval tree and no temporary
+files.  genes with end <= start are skipped.
+
+with a cache directory, the binned track (the counts of the regular bin grid of the
+assembly/resolution, plus the sorted gene starts/ends for off-grid bins) is stored as
+<key>.genedensity.npz next to the matrix cache (see cworld.cache), keyed by the refseq
+file path/size/mtime, the assembly and the bin grid, so later runs skip the refseq parse.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import gzip
+import hashlib
+
+import numpy as np
+
+from cworld.cache import DEFAULT_CACHE_SIZE,evict_matrix_cache,_atomic_write
+
+def read_refseq(refSeqFile):
+    """{chromosome: (sorted gene starts, sorted gene ends)} of a refseq (chr start end name ...) file
+    """
+
+    if refSeqFile.endswith('.gz'):
+        fh=gzip.open(refSeqFile,'r')
+    else:
+        fh=open(refSeqFile,'r')
+
+    chr_starts={}
+    chr_ends={}
+    with fh:
+        for line in fh:
+            a=line.rstrip("\n").split("\t")
+            if len(a) < 3 or line.startswith(('#','track','browser')):
+                continue
+            start=int(a[1])
+            end=int(a[2])
+            if end <= start:
+                continue
+            chr_starts.setdefault(a[0],[]).append(start)
+            chr_ends.setdefault(a[0],[]).append(end)
+
+    genes={}
+    for chromosome in chr_starts:
+        genes[chromosome]=(np.sort(np.array(chr_starts[chromosome],dtype=np.int64)),np.sort(np.array(chr_ends[chromosome],dtype=np.int64)))
+
+    return genes
+
+def count_genes(gene_starts,gene_ends,bin_starts,bin_ends):
+    """number of genes (sorted starts/ends) overlapping every bin_start..bin_end"""
+
+    return np.searchsorted(gene_starts,bin_ends,'left')-np.searchsorted(gene_ends,bin_starts,'right')
+
+def gene_density(header_table,refSeqFile,cache_dir=None,cache_size=DEFAULT_CACHE_SIZE):
+    """float array of the number of refseq genes overlapping every bin of header_table
+    """
+
+    chromosomes=header_table.chromosomes()
+    starts=header_table['start']
+    ends=header_table['end']
+
+    grid=_bin_grid(header_table)
+
+    if cache_dir == None:
+        genes=read_refseq(refSeqFile)
+        track={}
+    else:
+        genes,track=_cached_track(cache_dir,cache_size,refSeqFile,header_table.assembly(),grid)
+
+    density=np.zeros(len(header_table))
+    for chromosome in np.unique(chromosomes):
+        if chromosome not in genes:
+            continue
+        chr_bins=np.nonzero(chromosomes == chromosome)[0]
+        chr_starts=starts[chr_bins]
+        chr_ends=ends[chr_bins]
+
+        off_grid=np.ones(len(chr_bins),dtype=bool)
+        if chromosome in track:
+            origin,spacing,sizing=grid
+            grid_bins=(chr_starts-origin)//spacing
+            off_grid=((chr_starts-origin)%spacing != 0) | ((chr_ends-chr_starts)+1 != sizing) | (grid_bins < 0)
+            chr_track=track[chromosome]
+            on_grid=np.nonzero(~off_grid)[0]
+            in_track=grid_bins[on_grid] < len(chr_track)
+            density[chr_bins[on_grid[in_track]]]=chr_track[grid_bins[on_grid[in_track]]]
+
+        gene_starts,gene_ends=genes[chromosome]
+        density[chr_bins[off_grid]]=count_genes(gene_starts,gene_ends,chr_starts[off_grid],chr_ends[off_grid])
+
+    return density
+
+def _bin_grid(header_table):
+    """(origin,spacing,sizing) of the regular bins of header_table, None if the bins are not equally spaced/sized"""
+
+    if len(header_table) == 0:
+        return None
+
+    equalSpacingFlag,equalSizingFlag,spacing,sizing=header_table.spacing()
+    if not (equalSpacingFlag and equalSizingFlag) or spacing <= 0:
+        return None
+
+    origin=int(header_table['start'][0]) % spacing
+
+    return (origin,spacing,sizing)
+
+def _grid_track(genes,grid):
+    """{chromosome: gene count of grid bins 0..} for the bins origin+k*spacing..origin+k*spacing+sizing-1 up to the last gene"""
+
+    origin,spacing,sizing=grid
+
+    track={}
+    for chromosome,(gene_starts,gene_ends) in genes.items():
+        num_bins=((gene_ends[-1]-origin)//spacing)+1
+        bin_starts=origin+(np.arange(max(num_bins,0),dtype=np.int64)*spacing)
+        track[chromosome]=count_genes(gene_starts,gene_ends,bin_starts,bin_starts+(sizing-1))
+
+    return track
+
+def _cached_track(cache_dir,cache_size,refSeqFile,assembly,grid):
+    """(genes,track) of refSeqFile from the cache, parsed/binned and stored on a cache miss"""
+
+    refSeqFile=os.path.realpath(refSeqFile)
+    st=os.stat(refSeqFile)
+
+    grid_tag="-".join([str(g) for g in grid]) if grid != None else "irregular"
+    stat_tag=refSeqFile+"|"+str(st.st_size)+"|"+repr(st.st_mtime)+"|"+str(assembly)+"|"+grid_tag
+    key=hashlib.sha1(stat_tag.encode('utf-8')).hexdigest()+".genedensity"
+    track_file=os.path.join(cache_dir,key+".npz")
+
+    if os.path.isfile(track_file):
+        try:
+            with np.load(track_file) as cached:
+                genes,track=_unpack_track(cached)
+            os.utime(track_file,None)
+            return genes,track
+        except (IOError,OSError,ValueError,KeyError):
+            pass
+
+    genes=read_refseq(refSeqFile)
+    track=_grid_track(genes,grid) if grid != None else {}
+
+    _atomic_write(cache_dir,track_file,lambda fh: np.savez(fh,**_pack_track(genes,track)))
+    evict_matrix_cache(cache_dir,cache_size,keep=key)
+
+    return genes,track
+
+def _pack_track(genes,track):
+    """flat arrays (chromosome names, offsets, concatenated values) of genes/track, for np.savez"""
+
+    chrs=sorted(genes)
+    gene_offsets=np.r_[0,np.cumsum([len(genes[c][0]) for c in chrs])].astype(np.int64)
+    track_offsets=np.r_[0,np.cumsum([len(track.get(c,[])) for c in chrs])].astype(np.int64)
+
+    def concatenate(arrays):
+        return np.concatenate(arrays).astype(np.int64) if len(arrays) else np.zeros(0,dtype=np.int64)
+
+    return {'chrs':np.array(chrs,dtype=str),
+            'gene_offsets':gene_offsets,
+            'gene_starts':concatenate([genes[c][0] for c in chrs]),
+            'gene_ends':concatenate([genes[c][1] for c in chrs]),
+            'track_offsets':track_offsets,
+            'track':concatenate([track.get(c,np.zeros(0,dtype=np.int64)) for c in chrs])}
+
+def _unpack_track(cached):
+    """(genes,track) of the arrays written by _pack_track"""
+
+    chrs=[str(c) for c in cached['chrs'].tolist()]
+    gene_offsets=cached['gene_offsets']
+    gene_starts=cached['gene_starts']
+    gene_ends=cached['gene_ends']
+    track_offsets=cached['track_offsets']
+    track_counts=cached['track']
+
+    genes={}
+    track={}
+    for i,chromosome in enumerate(chrs):
+        genes[chromosome]=(gene_starts[gene_offsets[i]:gene_offsets[i+1]],gene_ends[gene_offsets[i]:gene_offsets[i+1]])
+        if track_offsets[i+1] > track_offsets[i]:
+            track[chromosome]=track_counts[track_offsets[i]:track_offsets[i+1]]
+
+    return genes,track
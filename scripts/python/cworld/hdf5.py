@@ -0,0 +1,283 @@
+"""
+HDF5 matrix input/output for the cworld python scripts.
+
+the HDF5 layout is the one sampleHDF5.py reads:
+
+    interactions    n x n matrix (chunked)
+    bin_positions   (chr index, start, end) of every bin
+    chr_bin_range   (first bin, last bin) of every chromosome
+    chrs            chromosome names
+    headers         optional bin headers, otherwise synthesized as index|genome|chr:start-end
+    genome          (attr) assembly name
+
+rows are read chunk-aligned, blocksize rows at a time (a multiple of the HDF5 chunk
+size), and a chromosome or coordinate window (or each chromosome's cis block, see
+hdf5_cis_blocks) is read through chr_bin_range so only the rows/cols of the region
+are touched.
+
+matrices are written (write_hdf5_matrix_blocks) a row block at a time into a chunked,
+compressed interactions dataset, with bin_positions, chr_bin_range, chrs, headers
+and genome filled in from the headers - memory is bounded by one row block.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+import math
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py=None
+
+from cworld.index import parse_region
+from cworld.header import HeaderTable
+
+HDF5_MAGIC = b'\x89HDF\r\n\x1a\n'
+HDF5_MATRIX_EXTENSIONS = ('.hdf5','.h5')
+HDF5_CODECS = ['gzip','lzf','none']
+DEFAULT_HDF5_CHUNK = 256  # chunks are (at most) 256 x 256 values
+DEFAULT_HDF5_LEVEL = 4
+
+def is_hdf5_matrix(matrixFile):
+    """true if matrixFile starts with the HDF5 signature
+    """
+
+    try:
+        with open(matrixFile,'rb') as fh:
+            return fh.read(len(HDF5_MAGIC)) == HDF5_MAGIC
+    except IOError:
+        return False
+
+def is_hdf5_matrix_name(matrixFile):
+    return matrixFile.endswith(HDF5_MATRIX_EXTENSIONS)
+
+def get_blocksize(hdf_blocksize,blocksize):
+    """adjust blocksize to be evenly divisible by hdf_blocksize
+    """
+
+    if blocksize == None:
+        blocksize = hdf_blocksize
+    else:
+        if blocksize%hdf_blocksize != 0:
+            blocksize=int(math.ceil(blocksize/hdf_blocksize)*hdf_blocksize)
+
+    return(blocksize)
+
+def _interactions_blocksize(interactions,blocksize):
+    # unchunked datasets are read 1000 rows at a time
+    hdf_blocksize=interactions.chunks[0] if interactions.chunks != None else 1000
+    return get_blocksize(hdf_blocksize,blocksize)
+
+def _str(s):
+    if isinstance(s,bytes) and not isinstance(s,str):
+        return s.decode('utf-8')
+    return str(s)
+
+def hdf5_headers(inhdf):
+    """bin headers of an open HDF5 matrix - the headers dataset, or index|genome|chr:start-end as sampleHDF5.py builds them
+    """
+
+    if "headers" in inhdf.keys():
+        return [_str(h) for h in inhdf['headers'][:]]
+
+    genome=_str(inhdf.attrs['genome'][:])
+    bin_positions=inhdf['bin_positions'][:]
+    chrs=[_str(c) for c in inhdf['chrs'][:]]
+
+    return [str(i)+'|'+genome+'|'+str(chrs[bin_positions[i,0]])+':'+str(bin_positions[i,1])+'-'+str(bin_positions[i,2]) for i in np.arange(bin_positions.shape[0])]
+
+def load_hdf5_headers(matrixFile):
+    """bin headers of an HDF5 matrix, without loading the values
+    """
+
+    if h5py == None:
+        sys.exit('h5py is required to read HDF5 matrices!')
+
+    inhdf=h5py.File(matrixFile,'r')
+    headers=hdf5_headers(inhdf)
+    inhdf.close()
+
+    return headers
+
+def hdf5_bin_mask(chrs,chr_bin_range,bin_positions,region):
+    """boolean mask of the bins overlapping region (chr or chr:start-end), found through chr_bin_range
+    """
+
+    chr_id,start,end=parse_region(region)
+
+    bin_mask=np.zeros(bin_positions.shape[0],dtype=bool)
+    if chr_id not in chrs:
+        return bin_mask
+
+    r=chr_bin_range[chrs.index(chr_id)]
+    if end == None:
+        bin_mask[r[0]:r[1]+1]=True
+    else:
+        chr_bins=bin_positions[r[0]:r[1]+1]
+        bin_mask[r[0]:r[1]+1]=(chr_bins[:,2] >= start) & (chr_bins[:,1] <= end)
+
+    return bin_mask
+
+def hdf5_row_blocks(matrixFile,blocksize=None,np_dtype='float32'):
+    """iterate over (row headers, row values) of an HDF5 matrix, a chunk-aligned block of rows at a time
+    """
+
+    if h5py == None:
+        sys.exit('h5py is required to read HDF5 matrices!')
+
+    inhdf=h5py.File(matrixFile,'r')
+    interactions=inhdf['interactions']
+    headers=hdf5_headers(inhdf)
+
+    blocksize=_interactions_blocksize(interactions,blocksize)
+
+    for i in range(0,interactions.shape[0],blocksize):
+        yield headers[i:i+blocksize],np.asarray(interactions[i:i+blocksize,:],dtype=np_dtype)
+
+    inhdf.close()
+
+def hdf5_cis_blocks(matrixFile,np_dtype='float32'):
+    """iterate over (chromosome, headers, cis block) of an HDF5 matrix, one chromosome at a time
+    each block is read through chr_bin_range, so only the chunks on the diagonal are touched
+    """
+
+    if h5py == None:
+        sys.exit('h5py is required to read HDF5 matrices!')
+
+    inhdf=h5py.File(matrixFile,'r')
+    interactions=inhdf['interactions']
+    headers=hdf5_headers(inhdf)
+    chrs=[_str(c) for c in inhdf['chrs'][:]]
+    chr_bin_range=inhdf['chr_bin_range'][:]
+
+    for chr_id,(first_bin,last_bin) in zip(chrs,chr_bin_range):
+        yield chr_id,headers[first_bin:last_bin+1],np.asarray(interactions[first_bin:last_bin+1,first_bin:last_bin+1],dtype=np_dtype)
+
+    inhdf.close()
+
+def load_hdf5_matrix(matrixFile,region=None,blocksize=None,np_dtype='float32',verbose=False):
+    """load an HDF5 matrix (or the region window of it) - returns (data,header_rows,header_cols)
+    header_rows label the columns and header_cols the rows, as returned by load_matrix
+    """
+
+    if h5py == None:
+        sys.exit('h5py is required to read HDF5 matrices!')
+
+    inhdf=h5py.File(matrixFile,'r')
+    interactions=inhdf['interactions']
+
+    nrow,ncol=interactions.shape
+    if nrow != ncol:
+        sys.exit('error: non-symmetrical matrix found!')
+
+    headers=hdf5_headers(inhdf)
+
+    rows=np.arange(nrow)
+    if region != None:
+        chrs=[_str(c) for c in inhdf['chrs'][:]]
+        bin_mask=hdf5_bin_mask(chrs,inhdf['chr_bin_range'][:],inhdf['bin_positions'][:],region)
+        rows=np.nonzero(bin_mask)[0]
+        if len(rows) == 0:
+            sys.exit('no bins found in region '+region+'!')
+    cols=rows
+
+    # read whole chunks of rows, and only the column span of the region
+    blocksize=_interactions_blocksize(interactions,blocksize)
+
+    col_start,col_end=cols[0],cols[-1]+1
+    data=np.zeros((len(rows),len(cols)),dtype=np_dtype)
+
+    first_block=(rows[0]//blocksize)*blocksize
+    for i in range(first_block,rows[-1]+1,blocksize):
+        block_rows=np.nonzero((rows >= i) & (rows < i+blocksize))[0]
+        if len(block_rows) == 0:
+            continue
+        block=interactions[i:min(i+blocksize,nrow),col_start:col_end]
+        data[block_rows,:]=block[rows[block_rows]-i,:][:,cols-col_start]
+
+    inhdf.close()
+
+    if(verbose):
+        sys.stderr.write("loaded HDF5 matrix with dimensions ("+str(data.shape[0])+","+str(data.shape[1])+")\n")
+
+    return data,[headers[c] for c in cols],[headers[r] for r in rows]
+
+def write_hdf5_matrix(header_rows,header_cols,matrix,matrixFile,row_block_size=1000,chunk=DEFAULT_HDF5_CHUNK,codec='gzip',level=DEFAULT_HDF5_LEVEL):
+    """write a np matrix with row/col headers as an HDF5 matrix
+    header_rows label the rows, header_cols the columns (same convention as writeMatrix)
+    """
+
+    nrows=len(header_rows)
+
+    def row_blocks():
+        for i in range(0,nrows,row_block_size):
+            yield header_rows[i:i+row_block_size],matrix[i:i+row_block_size,:]
+
+    write_hdf5_matrix_blocks(header_cols,row_blocks(),matrixFile,chunk=chunk,codec=codec,level=level)
+
+def write_hdf5_matrix_blocks(header_cols,row_blocks,matrixFile,chunk=DEFAULT_HDF5_CHUNK,codec='gzip',level=DEFAULT_HDF5_LEVEL,dtype='float32'):
+    """stream (row headers, row values) blocks into a chunked, compressed HDF5 matrix
+    the layout is symmetric (one set of bins), so the row headers must match the column headers.
+    blocks are re-cut at chunk row boundaries, so every chunk is compressed once
+    """
+
+    if h5py == None:
+        sys.exit('h5py is required to write HDF5 matrices!')
+    if codec not in HDF5_CODECS:
+        raise ValueError('unknown HDF5 codec '+str(codec)+' (choose from '+','.join(HDF5_CODECS)+')')
+
+    header_cols=[str(h) for h in header_cols]
+    n=len(header_cols)
+
+    header_table=HeaderTable(header_cols)
+    chr_codes=header_table['chr']
+    chr_bin_range=header_table.chr_bin_range()
+
+    chunk=max(1,min(chunk,n))
+    compression=None if codec == 'none' else codec
+    compression_opts=level if codec == 'gzip' else None
+
+    outhdf=h5py.File(matrixFile,'w')
+    outhdf.attrs['genome']=str(header_table.assembly())
+    interactions=outhdf.create_dataset('interactions',shape=(n,n),dtype=dtype,chunks=(chunk,chunk) if n else None,compression=compression,compression_opts=compression_opts,fillvalue=np.nan)
+    outhdf.create_dataset('bin_positions',data=np.c_[chr_codes,header_table['start'],header_table['end']].astype(np.int64).reshape(-1,3))
+    outhdf.create_dataset('chr_bin_range',data=chr_bin_range)
+    outhdf.create_dataset('chrs',data=np.array(header_table.chrs,dtype='S'))
+    outhdf.create_dataset('headers',data=np.array(header_cols,dtype='S'))
+
+    r=0
+    buffer=[]
+    buffered=0
+    for block_headers,block_values in row_blocks:
+        block_values=np.asarray(block_values,dtype=dtype)
+        if block_values.ndim != 2 or block_values.shape[1] != n:
+            outhdf.close()
+            raise ValueError('HDF5 matrix block does not match the number of columns ('+str(n)+')')
+        if [str(h) for h in block_headers] != header_cols[r+buffered:r+buffered+len(block_values)]:
+            outhdf.close()
+            raise ValueError('row headers do not match the column headers (HDF5 matrices are symmetric)')
+
+        buffer.append(block_values)
+        buffered+=len(block_values)
+
+        # write whole chunk rows only
+        if buffered >= chunk:
+            data=np.concatenate(buffer)
+            nwrite=(buffered//chunk)*chunk
+            interactions[r:r+nwrite,:]=data[0:nwrite]
+            r+=nwrite
+            buffer=[data[nwrite:]]
+            buffered=len(buffer[0])
+
+    if buffered:
+        interactions[r:r+buffered,:]=np.concatenate(buffer)
+        r+=buffered
+
+    outhdf.close()
+
+    if r != n:
+        raise ValueError('HDF5 matrix has '+str(r)+' rows, expected '+str(n))
@@ -0,0 +1,154 @@
+"""
+parsed my5C header table.
+
+my5C headers look like subName|assembly|chromosome:start-end.  HeaderTable parses
+a header list once into a structured np array (one record per header) so tools
+read coordinates, assembly and spacing from array columns instead of running the
+header regex / getHeaderObject per header, per use.
+
+    chr         chromosome code (index into .chrs)
+    start       bin start
+    end         bin end
+    midpoint    (start+end)/2
+    size        end-start+1 (1-based positions)
+    assembly    assembly code (index into .assemblies)
+    region      region code (index into .regions) - the chromosome, or the 5C region / __ sub name
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import re
+import sys
+
+import numpy as np
+
+HEADER_TABLE_DTYPE = [('chr','i4'),('start','i8'),('end','i8'),('midpoint','f8'),('size','i8'),('assembly','i4'),('region','i4')]
+
+_header_regex = re.compile(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)')
+
+class HeaderTable(object):
+    """structured array of parsed headers, plus the chromosome/assembly/region names the codes refer to
+    """
+
+    def __init__(self,headers):
+
+        self.headers=[str(h) for h in headers]
+        self.chrs=[]
+        self.assemblies=[]
+        self.regions=[]
+
+        chr_dict={}
+        assembly_dict={}
+        region_dict={}
+
+        nheaders=len(self.headers)
+        self.table=np.zeros(nheaders,dtype=HEADER_TABLE_DTYPE)
+
+        chr_codes=np.zeros(nheaders,dtype='i4')
+        starts=np.zeros(nheaders,dtype='i8')
+        ends=np.zeros(nheaders,dtype='i8')
+        assembly_codes=np.zeros(nheaders,dtype='i4')
+        region_codes=np.zeros(nheaders,dtype='i4')
+
+        for i,header in enumerate(self.headers):
+            m=_header_regex.search(header)
+            if m==None:
+                sys.exit('error: incorrect input format!')
+
+            sub_name,assembly,chromosome,start,end=m.groups()
+
+            region=chromosome
+            if("__" in sub_name):
+                region=sub_name
+            else:
+                tmp=sub_name.split("_")
+                if(len(tmp) == 5 and tmp[0] == "5C"):
+                    region=str(tmp[1])+"_"+str(tmp[2])
+
+            chr_codes[i]=_code(chr_dict,self.chrs,chromosome)
+            assembly_codes[i]=_code(assembly_dict,self.assemblies,assembly)
+            region_codes[i]=_code(region_dict,self.regions,region)
+            starts[i]=int(start)
+            ends[i]=int(end)
+
+        self.table['chr']=chr_codes
+        self.table['start']=starts
+        self.table['end']=ends
+        self.table['midpoint']=(starts+ends)/2
+        self.table['size']=(ends-starts)+1
+        self.table['assembly']=assembly_codes
+        self.table['region']=region_codes
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __getitem__(self,field):
+        return self.table[field]
+
+    def chromosomes(self,degroup=False):
+        """chromosome name of every header, degroup strips the chr group (chr1-1 -> chr1) for UCSC usage
+        """
+
+        chrs=self.chrs
+        if degroup:
+            chrs=[c.split('-')[0] for c in chrs]
+
+        return np.array(chrs,dtype=object)[self.table['chr']] if len(self) else np.array([],dtype=object)
+
+    def assembly(self):
+        """the (constant) assembly of all headers
+        """
+
+        if len(self.assemblies) > 1:
+            sys.exit('assembly/genome is not constant!')
+        if len(self.assemblies) == 0:
+            return None
+
+        return self.assemblies[0]
+
+    def chr_bin_range(self):
+        """(first bin, last bin) of every chromosome (in .chrs order), raises ValueError if a chromosome's bins are not contiguous
+        """
+
+        chr_codes=self.table['chr']
+        chr_bin_range=np.zeros((len(self.chrs),2),dtype=np.int64)
+        for c in range(len(self.chrs)):
+            chr_bins=np.nonzero(chr_codes == c)[0]
+            if (chr_bins[-1]-chr_bins[0])+1 != len(chr_bins):
+                raise ValueError('bins of '+self.chrs[c]+' are not contiguous')
+            chr_bin_range[c]=(chr_bins[0],chr_bins[-1])
+
+        return chr_bin_range
+
+    def spacing(self):
+        """(equalSpacingFlag,equalSizingFlag,spacing,sizing) - bin step and bin size from the differences of neighbouring headers
+        neighbours in different regions or with the same start/end are skipped, spacing/sizing is the (int) mean
+        """
+
+        start=self.table['start']
+        end=self.table['end']
+        region=self.table['region']
+
+        valid=(region[1:] == region[:-1]) & (end[1:] != end[:-1]) & (start[1:] != start[:-1])
+
+        header_spacing=(start[1:]-start[:-1])[valid]
+        header_sizing=self.table['size'][:-1][valid]
+
+        equalSpacingFlag=int(np.all(header_spacing == header_spacing[0])) if len(header_spacing) else 1
+        equalSizingFlag=int(np.all(header_sizing == header_sizing[0])) if len(header_sizing) else 1
+
+        return(equalSpacingFlag,equalSizingFlag,int(np.mean(header_spacing)),int(np.mean(header_sizing)))
+
+def round_half_away(x):
+    """element-wise round half away from zero (python 2 round), np.round rounds half to even
+    """
+
+    x=np.asarray(x,dtype=float)
+    return np.sign(x)*np.floor(np.abs(x)+0.5)
+
+def _code(code_dict,names,name):
+    if name not in code_dict:
+        code_dict[name]=len(names)
+        names.append(name)
+    return code_dict[name]
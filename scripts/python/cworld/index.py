@@ -0,0 +1,203 @@
+"""
+random-access row index for block gzipped (see cworld.bgzf) my5C matrices.
+
+the index is a JSON file written next to the matrix (<matrix>.idx) holding:
+
+    blocks          (compressed offset, uncompressed offset) of every BGZF block
+    row_offsets     uncompressed offset of every matrix row, plus the end of the last row
+    header_rows     row headers, header_cols - column headers
+    chrs            chromosomes, row_bins/col_bins - (chr index, start, end) of every row/col
+
+a window or chromosome is loaded by decompressing only the blocks that hold its
+rows, so region-focused tools run in time proportional to the region size.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import re
+import json
+
+import numpy as np
+
+from cworld.bgzf import bgzf_blocks
+from cworld.binary import header2bin
+
+MATRIX_INDEX_EXTENSION = '.idx'
+MATRIX_INDEX_VERSION = 1
+
+def matrix_index_file(matrixFile):
+    return matrixFile+MATRIX_INDEX_EXTENSION
+
+def has_matrix_index(matrixFile):
+    """true if matrixFile has an index that is not older than the matrix itself
+    """
+
+    indexFile=matrix_index_file(matrixFile)
+    if not os.path.isfile(indexFile):
+        return False
+
+    return os.path.getmtime(indexFile) >= os.path.getmtime(matrixFile)
+
+def write_matrix_index(matrixFile,header_rows,header_cols,row_offsets,block_offsets):
+    """write the index of a block gzipped matrix
+    row_offsets holds the uncompressed offset of every row plus the end of the last row
+    """
+
+    header_rows=[str(h) for h in header_rows]
+    header_cols=[str(h) for h in header_cols]
+
+    chr_dict={}
+    row_bins=[header2bin(h,chr_dict) for h in header_rows]
+    col_bins=[header2bin(h,chr_dict) for h in header_cols]
+    chrs=sorted(chr_dict,key=chr_dict.get)
+
+    index={
+        'version':MATRIX_INDEX_VERSION,
+        'blocks':[list(b) for b in block_offsets],
+        'row_offsets':list(row_offsets),
+        'header_rows':header_rows,
+        'header_cols':header_cols,
+        'chrs':chrs,
+        'row_bins':row_bins,
+        'col_bins':col_bins
+    }
+
+    with open(matrix_index_file(matrixFile),'w') as out_fh:
+        json.dump(index,out_fh,separators=(',',':'))
+
+def load_matrix_index(matrixFile):
+    """read the index of a block gzipped matrix, offsets and bins as np arrays
+    """
+
+    with open(matrix_index_file(matrixFile),'r') as fh:
+        index=json.load(fh)
+
+    if index['version'] > MATRIX_INDEX_VERSION:
+        raise ValueError('unsupported matrix index version '+str(index['version'])+' ('+matrixFile+')')
+
+    index['blocks']=np.array(index['blocks'],dtype=np.int64).reshape(-1,2)
+    index['row_offsets']=np.array(index['row_offsets'],dtype=np.int64)
+    index['header_rows']=[str(h) for h in index['header_rows']]
+    index['header_cols']=[str(h) for h in index['header_cols']]
+    index['chrs']=[str(c) for c in index['chrs']]
+    index['row_bins']=np.array(index['row_bins'],dtype=np.int64).reshape(-1,3)
+    index['col_bins']=np.array(index['col_bins'],dtype=np.int64).reshape(-1,3)
+
+    return index
+
+def index_matrix(matrixFile):
+    """build the index of an existing block gzipped matrix by scanning it once
+    """
+
+    block_offsets=[]
+    header_cols=None
+    header_rows=[]
+    row_offsets=[]
+
+    uncompressed_offset=0
+    line_offset=0
+    carry=b''
+
+    for compressed_offset,data in bgzf_blocks(matrixFile):
+        # skip the empty end-of-file block
+        if len(data) == 0:
+            continue
+
+        block_offsets.append((compressed_offset,uncompressed_offset))
+        uncompressed_offset+=len(data)
+
+        lines=(carry+data).split(b'\n')
+        carry=lines.pop()
+
+        for line in lines:
+            offset=line_offset
+            line_offset+=len(line)+1
+
+            if line.startswith(b'#'):
+                continue
+
+            line=line.decode('utf-8') if not isinstance(line,str) else line
+            if header_cols == None:
+                header_cols=line.split("\t")[1:]
+                continue
+
+            header_rows.append(line.split("\t",1)[0])
+            row_offsets.append(offset)
+
+    if len(carry):
+        raise ValueError('matrix does not end with a newline ('+matrixFile+')')
+    if header_cols == None:
+        raise ValueError('empty matrix ('+matrixFile+')')
+
+    row_offsets.append(line_offset)
+
+    write_matrix_index(matrixFile,header_rows,header_cols,row_offsets,block_offsets)
+
+def parse_region(region):
+    """chr:start-end (or chr) -> (chr, start, end), end is None for a whole chromosome
+    """
+
+    m=re.search(r'^(\S+?):(\d+)-(\d+)$',region.replace(",",""))
+    if m != None:
+        chr_id,start,end=m.groups()
+        return chr_id,int(start),int(end)
+
+    return region,0,None
+
+def region_mask(bins,chrs,region):
+    """boolean mask of the bins (chr index, start, end) overlapping region
+    """
+
+    chr_id,start,end=parse_region(region)
+
+    if chr_id not in chrs:
+        return np.zeros(len(bins),dtype=bool)
+
+    mask=(bins[:,0] == chrs.index(chr_id))
+    if end != None:
+        mask &= (bins[:,2] >= start) & (bins[:,1] <= end)
+
+    return mask
+
+def region_tag(region):
+    """region as used in output file names, e.g. chr14:50,000,000-52,000,000 -> chr14-50000000-52000000
+    """
+
+    return re.sub(":","-",region.replace(",",""))
+
+def header_bins(headers):
+    """(chrs, bins) of a header list, as stored in the index
+    """
+
+    chr_dict={}
+    bins=np.array([header2bin(h,chr_dict) for h in headers],dtype=np.int64).reshape(-1,3)
+    chrs=sorted(chr_dict,key=chr_dict.get)
+
+    return chrs,bins
+
+def read_matrix_rows(matrixFile,index,first_row,last_row):
+    """return the text lines of rows first_row..last_row, decompressing only the blocks that hold them
+    """
+
+    start=index['row_offsets'][first_row]
+    end=index['row_offsets'][last_row+1]
+
+    blocks=index['blocks']
+    b=np.searchsorted(blocks[:,1],start,side='right')-1
+    block_start=blocks[b,1]
+
+    chunks=[]
+    size=0
+    for compressed_offset,data in bgzf_blocks(matrixFile,blocks[b,0]):
+        chunks.append(data)
+        size+=len(data)
+        if block_start+size >= end:
+            break
+
+    text=b''.join(chunks)[start-block_start:end-block_start]
+    if not isinstance(text,str):
+        text=text.decode('utf-8')
+
+    return text.split("\n")[:-1]
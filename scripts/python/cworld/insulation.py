@@ -0,0 +1,271 @@
+"""
+insulation scores from 2D cumulative sums over the band of a symmetric matrix.
+
+the insulation square of bin y covers rows y-k..y-1 and cols y+1..y+k (k = square size in
+bins), in band coordinates (row i, offset d=j-i) the offsets 2..2k.  with P the cumulative
+row sums over the offsets, the square sum is
+
+    sum_{m=1..k} P[y-m,k+m] - P[y-m,m]
+
+and both terms run along lines of constant i+d, so cumulating P along those lines gives
+the sum and the valid (non-nan) cell count of every square in O(1) - O(n*k) total work
+and memory, and one band serves every square size up to max_binsize.
+
+stream_insulation_scores runs the same sums over a sliding window of band rows, so text
+matrices can be insulated while they are read, with O(k*(k+row_block_size)) memory.
+
+insulation_boundaries calls TAD boundaries from the scores the way matrix2insulation.pl does
+(valleys of the normalized insulation, found as sign changes of the insulation delta), with
+the delta windows as convolutions and the valley walks as running max/min index scans.
+
+values are summed as exact fixed point integers (scaled by a power of 2) whenever the band
+fits in int64, so each score is the correctly rounded mean of its square - the same bits
+np.nanmean gives whenever its float64 sum is exact.  otherwise float64 sums are used.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+class InsulationBand(object):
+    """square sums and valid cell counts of every bin, for insulation square sizes up to max_binsize
+    """
+
+    def __init__(self,matrix,max_binsize,band=None):
+
+        self.n=matrix.shape[0] if band is None else band.shape[0]
+        self.max_binsize=int(max_binsize)
+
+        # offsets 0..2*max_binsize (0 and 1 are never inside a square)
+        w=(2*self.max_binsize)+1
+        if band is None:
+            band=np.empty((self.n,w))
+            band.fill(np.nan)
+            for d in range(1,min(w,self.n)):
+                band[0:self.n-d,d]=matrix.diagonal(d)
+        elif band.shape[1] != w:
+            raise ValueError('band rows must hold the offsets 0..'+str(w-1))
+
+        valid=~np.isnan(band)
+        values=np.where(valid,band,0)
+
+        self.exponent=fixed_point_exponent(values)
+        self.exact=self.exponent != None
+        if self.exact:
+            values=np.ldexp(values,-self.exponent).astype(np.int64)
+
+        self._sums=_line_sums(values)
+        self._counts=_line_sums(valid.astype(np.int64))
+
+    def square_sums(self,binsize):
+        """(sum, valid cell count) of the insulation square of every bin
+        """
+
+        if binsize > self.max_binsize:
+            raise ValueError('insulation square ('+str(binsize)+') is larger than the band ('+str(self.max_binsize)+')')
+
+        y=np.arange(self.n)
+        k=binsize
+
+        sums=(self._sums[y+k,k+1]-self._sums[y+k,(2*k)+1])-(self._sums[y,1]-self._sums[y,k+1])
+        counts=(self._counts[y+k,k+1]-self._counts[y+k,(2*k)+1])-(self._counts[y,1]-self._counts[y,k+1])
+
+        if self.exact:
+            sums=np.ldexp(sums.astype(np.float64),self.exponent)
+
+        return sums,counts
+
+    def scores(self,binsize):
+        """insulation score (mean of the non-nan square values, nan if there are none) of every bin
+        """
+
+        sums,counts=self.square_sums(binsize)
+
+        scores=np.empty(self.n)
+        scores.fill(np.nan)
+        nonempty=counts > 0
+        scores[nonempty]=sums[nonempty]/counts[nonempty]
+
+        return scores
+
+    @classmethod
+    def from_band(cls,band,max_binsize):
+        """band rows band[i,d] = matrix[i,i+d] (d = 0..2*max_binsize, nan past the end of the matrix)
+        """
+
+        return cls(None,max_binsize,band=band)
+
+def stream_insulation_scores(band_rows,n,binsizes,row_block_size=1000):
+    """iterate over (first bin, {binsize: scores}, {binsize: valid cell counts}) blocks, from an iterator over the n band rows
+    (offsets 0..2*max(binsizes) of every row, in order)
+
+    the square of bin y only covers rows y-k..y-1, so once a row is read the scores up to it are
+    final - only the last max(binsizes) rows are carried over to the next block
+    """
+
+    max_binsize=max(binsizes)
+    w=(2*max_binsize)+1
+
+    window=np.empty((max_binsize+row_block_size,w))
+    window.fill(np.nan)
+
+    # window rows hold the matrix rows start.., the bins from first_bin on are not emitted yet
+    start=0
+    first_bin=0
+    nrows=0
+    for i,band_row in enumerate(band_rows):
+        window[i-start,:]=band_row
+        nrows=i+1
+        if (nrows-start) < window.shape[0] and nrows < n:
+            continue
+
+        insulation_band=InsulationBand.from_band(window[0:nrows-start],max_binsize)
+        yield first_bin,dict((b,insulation_band.scores(b)[first_bin-start:]) for b in binsizes),dict((b,insulation_band.square_sums(b)[1][first_bin-start:]) for b in binsizes)
+
+        first_bin=nrows
+        carry=min(max_binsize,nrows-start)
+        window[0:carry,:]=window[nrows-start-carry:nrows-start,:]
+        start=nrows-carry
+
+    if nrows != n:
+        raise ValueError('expected '+str(n)+' band rows, found '+str(nrows))
+
+def boundary_insulation_scores(scores,counts,binsize):
+    """the scores matrix2insulation.pl calls boundaries from - nan for the bins within binsize of
+    either end, and for the squares that are more than half nan
+    """
+
+    scores=np.array(scores,dtype=np.float64)
+    scores[np.asarray(counts) < ((binsize*binsize)/2)]=np.nan
+    scores[0:binsize]=np.nan
+    scores[max(len(scores)-binsize,0):]=np.nan
+
+    return scores
+
+def normalize_insulation(scores,mean_score=None):
+    """log2(score/mean score), nan where the score (or the mean) is nan or 0
+    """
+
+    scores=np.asarray(scores,dtype=np.float64)
+    if mean_score == None:
+        valid=~np.isnan(scores)
+        if not np.any(valid):
+            raise ValueError('no available data points')
+        mean_score=np.mean(scores[valid])
+
+    normalized=np.empty(len(scores))
+    normalized.fill(np.nan)
+    if mean_score != 0:
+        with np.errstate(divide='ignore',invalid='ignore'):
+            nonzero=(~np.isnan(scores)) & (scores != 0)
+            normalized[nonzero]=np.log2(scores[nonzero]/mean_score)
+
+    return normalized
+
+def insulation_delta(normalized,delta_span_binsize):
+    """mean difference to the bins up to delta_span_binsize/2 on the left, minus the same on the right
+    nan where the bin or either of its windows has no data
+    """
+
+    n=len(normalized)
+    half_span=int(np.ceil(delta_span_binsize/2))
+
+    valid=~np.isnan(normalized)
+    values=np.where(valid,normalized,0)
+
+    # window sums of bins y-half_span..y-1 (left) and y+1..y+half_span (right)
+    kernel=np.ones(half_span)
+    window_sums=np.r_[0,np.convolve(values,kernel),np.zeros(half_span)]
+    window_counts=np.r_[0,np.convolve(valid.astype(np.float64),kernel),np.zeros(half_span)]
+    y=np.arange(n)
+    left_sums,left_counts=window_sums[y],window_counts[y]
+    right_sums,right_counts=window_sums[y+half_span+1],window_counts[y+half_span+1]
+
+    delta=np.empty(n)
+    delta.fill(np.nan)
+    ok=valid & (left_counts > 0) & (right_counts > 0)
+    delta[ok]=((left_sums[ok]/left_counts[ok])-values[ok])-((right_sums[ok]/right_counts[ok])-values[ok])
+
+    return delta
+
+def insulation_boundaries(delta,noise_threshold=0.1):
+    """(bins, strengths, directionalities) of the boundaries - the valleys of the insulation score
+    a boundary is a sign change of the delta (skipping nan), its strength the drop of the delta
+    from the start of the rise on its left to the end of the descent on its right
+    """
+
+    n=len(delta)
+    valid=~np.isnan(delta)
+    delta_square=np.sign(delta)
+
+    # zero crossings of the delta, ignoring the nan bins (a crossing from 0 does not count)
+    valid_bins=np.nonzero(valid)[0]
+    signs=delta_square[valid_bins]
+    last_signs=np.r_[0,signs[:-1]]
+    bins=valid_bins[(signs != last_signs) & (last_signs != 0)]
+
+    # walk left while the delta keeps rising, right while it keeps falling
+    with np.errstate(invalid='ignore'):
+        rising=np.zeros(n,dtype=bool)
+        rising[1:]=valid[1:] & valid[:-1] & (delta[:-1] >= delta[1:])
+        falling=np.zeros(n,dtype=bool)
+        falling[0:n-2]=valid[0:n-2] & valid[1:n-1] & (delta[1:n-1] <= delta[0:n-2])
+
+    y=np.arange(n)
+    left_search=np.maximum.accumulate(np.where(rising,0,y))
+    right_search=np.minimum.accumulate(np.where(falling,n-1,y)[::-1])[::-1]
+
+    left_delta=delta[left_search[bins]]
+    right_delta=delta[right_search[bins]]
+    strengths=left_delta-right_delta
+
+    keep=(strengths > 0) & (strengths >= noise_threshold)
+    bins,left_delta,right_delta,strengths=bins[keep],left_delta[keep],right_delta[keep],strengths[keep]
+
+    directionalities=np.empty(len(bins))
+    directionalities.fill(np.nan)
+    nonzero=(left_delta != 0) & (right_delta != 0)
+    directionalities[nonzero]=np.log2(np.abs(left_delta[nonzero])/np.abs(right_delta[nonzero]))
+
+    return bins,strengths,directionalities
+
+def _line_sums(values):
+    """cumulative row sums P[i,d], re-indexed by line s=i+d and cumulated over d (from the far end)
+
+    sums[s,d] = sum_{d' >= d} P[s-d',d'], so the P values of a line between two offsets are a difference
+    """
+
+    n,w=values.shape
+    P=np.cumsum(values,axis=1)
+
+    lines=np.zeros((n+w-1,w),dtype=P.dtype)
+    for d in range(w):
+        lines[d:d+n,d]=P[:,d]
+
+    sums=np.zeros((n+w-1,w+1),dtype=P.dtype)
+    sums[:,0:w]=np.cumsum(lines[:,::-1],axis=1)[:,::-1]
+
+    return sums
+
+def fixed_point_exponent(values):
+    """largest exponent e such that every value is an integer multiple of 2**e, or None if
+    the band sums scaled by 2**-e would not fit in int64
+    """
+
+    nonzero=values[values != 0]
+    if len(nonzero) == 0:
+        return 0
+
+    mantissas,exponents=np.frexp(nonzero)
+    mantissas=np.abs(np.ldexp(mantissas,53).astype(np.int64))
+    trailing_zeros=np.log2(mantissas & -mantissas).astype(np.int64)
+    exponent=int(np.min((exponents-53)+trailing_zeros))
+
+    # line sums add up at most w cumulative row sums of at most w values
+    w=values.shape[1]
+    bound=w*np.max(np.sum(np.abs(values),axis=1))
+    if np.ldexp(bound,-exponent) >= 2**62:
+        return None
+
+    return exponent
@@ -0,0 +1,139 @@
+"""
+sorted interval index for overlap queries (bins vs zoom coordinates / BED elements).
+
+intervals (chr code, start, end) are sorted by (chr, start), queries find their candidate
+run by binary search (np.searchsorted) on the starts and on the running max of the ends,
+so a whole BED file is answered in one vectorized pass instead of a scan of every bin
+per element.
+
+overlap follows sampleHDF5.py is_overlap: intervals overlap if one strictly contains the
+other or min(end)-max(start) > 0 (intervals only touching at one position do not).
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import gzip
+
+import numpy as np
+
+def overlap_sizes(a_starts,a_ends,b_starts,b_ends):
+    """element-wise is_overlap of the intervals a and b
+    """
+
+    a_starts=np.asarray(a_starts,dtype=np.int64)
+    a_ends=np.asarray(a_ends,dtype=np.int64)
+    b_starts=np.asarray(b_starts,dtype=np.int64)
+    b_ends=np.asarray(b_ends,dtype=np.int64)
+
+    sizes=np.maximum(0,np.minimum(a_ends,b_ends)-np.maximum(a_starts,b_starts))
+
+    a_contains_b=(a_starts < b_starts) & (a_ends > b_ends)
+    sizes[a_contains_b]=((b_ends-b_starts)+1)[a_contains_b]
+    b_contains_a=(b_starts < a_starts) & (b_ends > a_ends)
+    sizes[b_contains_a]=((a_ends-a_starts)+1)[b_contains_a]
+
+    return sizes
+
+class IntervalIndex(object):
+    """intervals (chr code, start, end) sorted by (chr, start), queried by binary search
+    """
+
+    def __init__(self,chrs,starts,ends):
+
+        chrs=np.asarray(chrs,dtype=np.int64)
+        starts=np.asarray(starts,dtype=np.int64)
+        ends=np.asarray(ends,dtype=np.int64)
+
+        self.n=len(chrs)
+
+        self._order=np.lexsort((starts,chrs))
+        self._chrs=chrs[self._order]
+        self._starts=starts[self._order]
+        self._ends=ends[self._order]
+
+        # chr codes are folded into one sorted key, span is larger than any coordinate
+        self._span=int(max(np.max(ends) if self.n else 0,np.max(starts) if self.n else 0))+2
+
+        # running max of the ends within each chromosome - every interval before i ends at or before max_ends[i]
+        max_ends=self._ends.copy()
+        chr_breaks=np.nonzero(self._chrs[1:] != self._chrs[:-1])[0]+1
+        for lo,hi in zip(np.r_[0,chr_breaks],np.r_[chr_breaks,self.n]):
+            np.maximum.accumulate(max_ends[lo:hi],out=max_ends[lo:hi])
+
+        self._start_keys=(self._chrs*self._span)+self._starts
+        self._max_end_keys=(self._chrs*self._span)+max_ends
+
+    def __len__(self):
+        return self.n
+
+    def query(self,chrs,starts,ends):
+        """all overlapping (query, interval) pairs - returns (query indices, interval indices)
+        """
+
+        chrs=np.asarray(chrs,dtype=np.int64).reshape(-1)
+        starts=np.asarray(starts,dtype=np.int64).reshape(-1)
+        ends=np.asarray(ends,dtype=np.int64).reshape(-1)
+
+        # queries past the last coordinate can not overlap, clip so the keys stay within the chromosome
+        clipped_starts=np.minimum(starts,self._span-1)
+        clipped_ends=np.minimum(ends,self._span-1)
+
+        # candidates start at or before the query end, and are not all ended before the query start
+        lo=np.searchsorted(self._max_end_keys,(chrs*self._span)+clipped_starts,side='left')
+        hi=np.searchsorted(self._start_keys,(chrs*self._span)+clipped_ends,side='right')
+        counts=np.maximum(hi-lo,0)
+
+        total=int(np.sum(counts))
+        q=np.repeat(np.arange(len(chrs)),counts)
+        i=np.repeat(lo,counts)+(np.arange(total)-np.repeat(np.cumsum(counts)-counts,counts))
+
+        hit=overlap_sizes(starts[q],ends[q],self._starts[i],self._ends[i]) > 0
+
+        return q[hit],self._order[i[hit]]
+
+    def overlaps(self,chr_code,start,end):
+        """sorted indices of the intervals overlapping one query
+        """
+
+        return np.sort(self.query([chr_code],[start],[end])[1])
+
+    def mask(self,chrs,starts,ends):
+        """boolean mask of the intervals overlapping any of the queries
+        """
+
+        mask=np.zeros(self.n,dtype=bool)
+        mask[self.query(chrs,starts,ends)[1]]=True
+
+        return mask
+
+def read_bed_intervals(bed_files,element_exten=0):
+    """(chrs, starts, ends) of all elements of the BED files, extended by element_exten on both sides
+    track/comment lines and elements with start > end are skipped, starts are kept >= 1
+    """
+
+    chrs=[]
+    starts=[]
+    ends=[]
+    for bed_file in bed_files:
+        if bed_file.endswith('.gz'):
+            fh=gzip.open(bed_file,'r')
+        else:
+            fh=open(bed_file,'r')
+
+        for li in fh:
+            li=li.rstrip("\n")
+            if li.startswith("#") or li.startswith("track"):
+                continue
+
+            lineList=li.split("\t")
+            chrs.append(lineList[0])
+            starts.append(int(lineList[1])-element_exten)
+            ends.append(int(lineList[2])+element_exten)
+        fh.close()
+
+    starts=np.maximum(1,np.array(starts,dtype=np.int64))
+    ends=np.array(ends,dtype=np.int64)
+    valid=starts <= ends
+
+    return [c for c,v in zip(chrs,valid) if v],starts[valid],ends[valid]
@@ -0,0 +1,601 @@
+"""
+my5C matrix input/output shared by the cworld python scripts.
+
+my5C format: one header row (NxM followed by the column headers), then one
+row per bin - row header followed by tab separated values, missing values
+written as NA/nan or left empty.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import re
+import sys
+import gzip
+import itertools
+import warnings
+
+import numpy as np
+
+from cworld.cache import matrix_cache_key,fetch_cached_matrix,store_cached_matrix,DEFAULT_CACHE_SIZE
+from cworld.binary import is_binary_matrix,is_binary_matrix_name,load_binary_matrix,load_binary_matrix_info,write_binary_matrix
+from cworld.bgzf import bgzf_open,DEFAULT_COMPRESSION_LEVEL
+from cworld.index import has_matrix_index,load_matrix_index,write_matrix_index,read_matrix_rows,region_mask,header_bins
+from cworld.packed import PackedSymmetricMatrix
+from cworld.sparse import SparseMatrix,SparseMatrixBuilder
+from cworld.banded import BandedMatrix
+from cworld.hdf5 import is_hdf5_matrix,is_hdf5_matrix_name,load_hdf5_matrix,load_hdf5_headers,hdf5_row_blocks,hdf5_cis_blocks,write_hdf5_matrix
+from cworld.header import HeaderTable
+
+NA_VALUES = ['','NA']
+
+def input_wrapper(infile):
+    if infile.endswith('.gz'):
+        fh=gzip.open(infile,'r')
+    else:
+        fh=open(infile,'r')
+
+    return fh
+
+def matrix_name(matrixFile):
+    """strip path and matrix extensions (.gz/.matrix/.bin/.hdf5) from a matrix file name, used to name tool outputs
+    """
+
+    name=os.path.basename(matrixFile)
+    name=re.sub(".gz", "", name)
+    name=re.sub(".matrix", "", name)
+    name=re.sub(r"\.bin$", "", name)
+    name=re.sub(r"\.(hdf5|h5)$", "", name)
+
+    return name
+
+def load_column_headers(matrixFile):
+    """column headers (first line) of a matrix file, without loading the values
+    """
+
+    if is_binary_matrix(matrixFile):
+        return load_binary_matrix_info(matrixFile)['header_cols']
+    if is_hdf5_matrix(matrixFile):
+        return load_hdf5_headers(matrixFile)
+    if has_matrix_index(matrixFile):
+        return load_matrix_index(matrixFile)['header_cols']
+
+    fh=input_wrapper(matrixFile)
+    for line in fh:
+        if not line.startswith('#'):
+            break
+    fh.close()
+
+    return line.rstrip("\n").split("\t")[1:]
+
+def matrix_row_blocks(matrixFile,row_block_size=1000):
+    """(column headers, iterator over (row headers, row values) blocks) of a text, binary or HDF5 matrix
+    memory is bounded by one row block
+    """
+
+    if is_hdf5_matrix(matrixFile):
+        return load_hdf5_headers(matrixFile),hdf5_row_blocks(matrixFile,row_block_size)
+
+    if is_binary_matrix(matrixFile):
+        data,header_rows,header_cols,meta=load_binary_matrix(matrixFile)
+        return header_cols,((header_rows[i:i+row_block_size],data[i:i+row_block_size,:]) for i in range(0,len(header_rows),row_block_size))
+
+    infh=input_wrapper(matrixFile)
+    fh=(l for l in infh if not l.startswith('#'))
+
+    header_cols=next(fh).rstrip("\n").split("\t")[1:]
+
+    def row_blocks():
+        while True:
+            try:
+                block_values,block_rows,block_headers=load_matrix(fh, hcols=1, max_rows=row_block_size, row_block_size=row_block_size, return_all=True)
+            except StopIteration:
+                break
+            yield block_headers,block_values
+        infh.close()
+
+    return header_cols,row_blocks()
+
+def matrix_band_rows(matrixFile,k,np_dtype='float32',row_block_size=1000):
+    """iterate over the band rows (cols i..i+k of row i, nan past the end of the matrix) of a symmetric matrix
+    text matrices are read a line at a time and only the band values are converted, so memory is O(k)
+    """
+
+    header_cols=load_column_headers(matrixFile)
+    n=len(header_cols)
+
+    band_row=np.empty(k+1,dtype=np_dtype)
+
+    if is_hdf5_matrix(matrixFile) or is_binary_matrix(matrixFile):
+        header_cols,row_blocks=matrix_row_blocks(matrixFile,row_block_size)
+        i=0
+        for block_headers,block_values in row_blocks:
+            for header,values in zip(block_headers,block_values):
+                if (i >= n) or (header != header_cols[i]):
+                    sys.exit('error: non-symmetrical matrix found!')
+                end=min(i+k+1,n)
+                band_row.fill(np.nan)
+                band_row[0:end-i]=values[i:end]
+                yield band_row
+                i+=1
+        return
+
+    infh=input_wrapper(matrixFile)
+    fh=(l for l in infh if not l.startswith('#'))
+    next(fh)
+
+    for i,line in enumerate(fh):
+        # split off the row header and the values up to col i+k only
+        line=line.rstrip("\n").split("\t",i+k+2)
+        if (i >= n) or (line[0] != header_cols[i]):
+            sys.exit('error: non-symmetrical matrix found!')
+        end=min(i+k+1,n)
+        values=[('nan' if v in NA_VALUES else v) for v in line[i+1:end+1]]
+        band_row.fill(np.nan)
+        band_row[0:end-i]=np.fromstring("\t".join(values),dtype=np_dtype,sep="\t")
+        yield band_row
+    infh.close()
+
+def cis_blocks(matrixFile,np_dtype='float32',row_block_size=1000,verbose=False):
+    """iterate over (chromosome, headers, cis block) of a symmetric matrix, one chromosome at a time
+    HDF5 blocks are read through chr_bin_range, binary blocks sliced from the memmap, and text
+    matrices streamed row_block_size rows at a time keeping only the cis columns - only one
+    chromosome block is resident at a time. headers label both the rows and the cols of the block
+    """
+
+    if is_hdf5_matrix(matrixFile):
+        for chr_id,headers,block in hdf5_cis_blocks(matrixFile,np_dtype=np_dtype):
+            if(verbose):
+                sys.stderr.write("loaded "+chr_id+" cis block ("+str(len(headers))+" bins)\n")
+            yield chr_id,headers,block
+        return
+
+    if is_binary_matrix(matrixFile):
+        data,header_rows,header_cols,meta=load_binary_matrix(matrixFile)
+        if list(header_rows) != list(header_cols):
+            sys.exit('error: non-symmetrical matrix found!')
+
+        header_table=HeaderTable(header_cols)
+        try:
+            chr_bin_range=header_table.chr_bin_range()
+        except ValueError as e:
+            sys.exit('error: '+str(e)+'!')
+
+        for chr_id,(first_bin,last_bin) in zip(header_table.chrs,chr_bin_range):
+            if(verbose):
+                sys.stderr.write("loaded "+chr_id+" cis block ("+str(last_bin-first_bin+1)+" bins)\n")
+            yield chr_id,header_cols[first_bin:last_bin+1],np.array(data[first_bin:last_bin+1,first_bin:last_bin+1],dtype=np_dtype)
+        return
+
+    header_cols,row_blocks=matrix_row_blocks(matrixFile,row_block_size)
+    header_table=HeaderTable(header_cols)
+    col_chrs=header_table['chr']
+    col_index=dict((h,i) for i,h in enumerate(header_cols))
+
+    def cis_block(c,rows,values):
+        chr_cols=np.nonzero(col_chrs == c)[0]
+        if rows != chr_cols.tolist():
+            sys.exit('error: non-symmetrical matrix found!')
+        if(verbose):
+            sys.stderr.write("loaded "+header_table.chrs[c]+" cis block ("+str(len(rows))+" bins)\n")
+        return header_table.chrs[c],[header_cols[i] for i in rows],np.concatenate(values)
+
+    c=None
+    done=set()
+    rows=[]
+    values=[]
+    for block_headers,block_values in row_blocks:
+        try:
+            block_rows=np.array([col_index[h] for h in block_headers],dtype=np.int64)
+        except KeyError:
+            sys.exit('error: non-symmetrical matrix found!')
+        block_chrs=col_chrs[block_rows]
+
+        # split the block where the row chromosome changes
+        breaks=np.nonzero(block_chrs[1:] != block_chrs[:-1])[0]+1
+        for start,end in zip(np.r_[0,breaks],np.r_[breaks,len(block_rows)]):
+            block_c=block_chrs[start]
+            if block_c != c:
+                if c != None:
+                    yield cis_block(c,rows,values)
+                    done.add(c)
+                if block_c in done:
+                    sys.exit('error: rows of '+header_table.chrs[block_c]+' are not contiguous!')
+                c=block_c
+                rows=[]
+                values=[]
+            chr_cols=np.nonzero(col_chrs == c)[0]
+            rows.extend(block_rows[start:end].tolist())
+            values.append(np.asarray(block_values[start:end,chr_cols[0]:chr_cols[-1]+1],dtype=np_dtype)[:,chr_cols-chr_cols[0]])
+
+    if c != None:
+        yield cis_block(c,rows,values)
+
+def load_matrix(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None,cache_dir=None,cache_size=DEFAULT_CACHE_SIZE,region=None,packed=False,sparse=False,band=None):
+    """
+    From Noam Kaplan (noamlib)
+    load a np.array or a list of lists from a text file handle (but works with any iterator) or filename, headers are returned as lists of strings
+
+    rows are parsed row_block_size lines at a time: the value columns of a block are joined and converted
+    with a single np.fromstring call (NA/'' converted to nan in bulk) into an array preallocated from the
+    header row width.  blocks that do not parse cleanly (ragged rows, pad, non-numeric values) fall back to
+    the line by line parser, which also handles numpy_mode=False and non-float dtypes.
+
+    if cache_dir is given (and fh is a filename) the parsed matrix is kept in a binary sidecar cache (see cworld.cache)
+    and later loads of the same file memory-map the cached array instead of parsing the text.
+
+    binary matrices (see cworld.binary) are recognised by their magic and returned as a copy-on-write np.memmap.
+    HDF5 matrices (see cworld.hdf5) are recognised by their signature and read chunk-aligned.
+
+    region (chr:start-end or chr) loads only the rows/cols of that window.  indexed block gzipped matrices
+    (see cworld.index) are read block by block from the index, anything else is loaded in full and subset.
+
+    packed returns a symmetric matrix as a cworld.packed.PackedSymmetricMatrix (upper triangle only, half the memory).
+    text matrices are packed while streaming, so the full square is never held in memory.
+
+    sparse returns a cworld.sparse.SparseMatrix (nonzero finite values plus nan row/col masks), text matrices
+    are sparsified a row block at a time.
+
+    band (k) returns a symmetric matrix as a cworld.banded.BandedMatrix holding only the diagonals 0..k (O(n*k) memory).
+    text matrices are parsed in blocks of at most k+1 rows and everything further out is discarded while streaming.
+    """
+
+    if (bool(packed)+bool(sparse)+(band!=None)) > 1:
+        sys.exit('choose one of packed, sparse or banded matrix storage!')
+
+    if (packed or sparse or band!=None) and numpy_mode and ((region!=None) or (isinstance(fh,str) and (fh!='-') and (is_binary_matrix(fh) or is_hdf5_matrix(fh) or cache_dir!=None))):
+        # binary/cached matrices are memory-mapped, pack/sparsify them a row block at a time
+        data,header_rows,header_cols=load_matrix(fh,hrows=hrows,hcols=hcols,np_dtype=np_dtype,row_block_size=row_block_size,max_rows=max_rows,verbose=verbose,return_all=True,pad=pad,cache_dir=cache_dir,cache_size=cache_size,region=region)
+        if sparse:
+            data=SparseMatrix.from_dense(data,row_block_size=row_block_size)
+            return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+        if(data.shape[0] != data.shape[1]):
+            sys.exit('non-symmetrical matrix! (packed/banded storage needs a square matrix)')
+        if band!=None:
+            data=BandedMatrix.from_dense(data,band,row_block_size=row_block_size)
+        else:
+            data=PackedSymmetricMatrix.from_dense(data,row_block_size=row_block_size)
+        return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+
+    if region!=None:
+        data,header_rows,header_cols=_load_region(fh,region,np_dtype,row_block_size,verbose,cache_dir,cache_size)
+        if (max_rows!=None):
+            data=data[0:max_rows,:]
+            header_cols=header_cols[0:max_rows]
+        return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+
+    if isinstance(fh,str) and (fh!='-') and is_hdf5_matrix(fh):
+        data,header_rows,header_cols=load_hdf5_matrix(fh,np_dtype=np_dtype,verbose=verbose)
+        if (max_rows!=None):
+            data=data[0:max_rows,:]
+            header_cols=header_cols[0:max_rows]
+        return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+
+    if isinstance(fh,str) and (fh!='-') and is_binary_matrix(fh):
+        data,header_rows,header_cols,meta=load_binary_matrix(fh)
+        if (max_rows!=None):
+            data=data[0:max_rows,:]
+            header_rows=header_rows[0:max_rows]
+        if(verbose):
+            sys.stderr.write("loaded binary matrix with dimensions ("+str(data.shape[0])+","+str(data.shape[1])+")\n")
+        # load_matrix returns the column headers (first line) as header_rows and the row headers as header_cols
+        return _matrix_result(data,header_cols,header_rows,hrows,hcols,return_all)
+
+    if (cache_dir!=None) and isinstance(fh,str) and (fh!='-') and numpy_mode and (max_rows==None):
+        key=matrix_cache_key(cache_dir,fh,(hrows,hcols,np.dtype(np_dtype).name))
+        cached=fetch_cached_matrix(cache_dir,key)
+        if cached==None:
+            cached=load_matrix(fh,hrows=hrows,hcols=hcols,np_dtype=np_dtype,row_block_size=row_block_size,pad=pad,return_all=True)
+            store_cached_matrix(cache_dir,key,cached[0],cached[1],cached[2],cache_size)
+        elif(verbose):
+            sys.stderr.write("loaded matrix from cache ("+cache_dir+")\n")
+        data,header_rows,header_cols=cached
+        return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+
+    fh_from_filename=False
+
+    if isinstance(fh,str):
+        if (fh=='-'):
+            fh=sys.stdin
+        else:
+            fh=input_wrapper(fh)
+            fh_from_filename=True
+
+    original_fh=fh
+
+    if fh_from_filename:
+        fh=(l for l in fh if not l.startswith('#'))
+
+    # init
+
+    firstline=next(fh)
+
+    fh=itertools.chain([firstline],fh)
+
+    cols=len(firstline.rstrip("\n").split("\t"))
+
+    if(hcols):
+        cols-=hcols
+
+    # square matrices are the norm, so preallocate rows from the header row width
+    rows=row_block_size
+    if(hrows):
+        rows=max(cols,1)
+    if (max_rows!=None and max_rows<rows):
+        rows=max_rows
+
+    block_mode=False
+    if numpy_mode and packed:
+        if (max_rows!=None):
+            sys.exit('packed matrices are loaded in full (no max_rows)!')
+        data=PackedSymmetricMatrix(cols,dtype=np_dtype)
+        block_mode=np.issubdtype(data.dtype,np.floating)
+    elif numpy_mode and (band!=None):
+        if (max_rows!=None):
+            sys.exit('banded matrices are loaded in full (no max_rows)!')
+        data=BandedMatrix(cols,band,dtype=np_dtype)
+        block_mode=np.issubdtype(data.dtype,np.floating)
+        # parse at most band+1 rows at a time, so the dense block is no larger than the band itself
+        row_block_size=max(1,min(row_block_size,band+1))
+    elif numpy_mode and sparse:
+        data=SparseMatrixBuilder(cols,dtype=np_dtype)
+        block_mode=np.issubdtype(data.dtype,np.floating)
+    elif numpy_mode:
+        data=np.zeros((rows,cols),dtype=np_dtype)
+        block_mode=np.issubdtype(data.dtype,np.floating)
+    else:
+        data=[]
+
+    header_rows=[[] for i in range(hrows)]
+
+    for i in range(hrows):
+        header_rows[i]=next(fh).rstrip("\n").split("\t")[hcols:]
+
+    header_cols=[[] for i in range(hcols)]
+
+    # fill one block at a time
+
+    prev_cols=-1
+
+    r=0
+
+    while (max_rows==None or r<max_rows):
+
+        block_size=row_block_size
+        if (max_rows!=None):
+            block_size=min(block_size,max_rows-r)
+
+        block=list(itertools.islice(fh,block_size))
+        if not block:
+            break
+
+        if numpy_mode:
+            # enlarge data if needed
+            if (packed or band!=None) and ((r+len(block)) > data.shape[0]):
+                sys.exit('non-symmetrical matrix! (packed/banded storage needs a square matrix)')
+            if (not sparse) and ((r+len(block)) > data.shape[0]):
+                new_rows=max(data.shape[0]*2,r+len(block))
+                new_data=np.zeros((new_rows,data.shape[1]),dtype=data.dtype)
+                new_data[0:r,:]=data[0:r,:]
+                data=new_data
+
+        block_values=None
+        if block_mode and (prev_cols==-1 or prev_cols==cols):
+            block_values=_parse_block(block,hcols,cols,data.dtype)
+
+        if block_values is not None:
+            block_headers,block_values=block_values
+            for j in range(hcols):
+                header_cols[j].extend(block_headers[j])
+            data[r:r+len(block),:]=block_values
+            prev_cols=cols
+            r+=len(block)
+            continue
+
+        for i in block:
+            line=i.rstrip("\n").split("\t")
+
+            cols=len(line)-hcols
+
+            if(prev_cols>-1 and cols!=prev_cols):
+                if(pad and cols<prev_cols):
+                    line=line+['']*(prev_cols-cols)
+                    cols=len(line)-hcols
+                else:
+                    sys.exit('inconsistent number of columns in input line '+str(r))
+
+            prev_cols=cols
+
+            if numpy_mode:
+                try: # if np_dtype does not except ''or 'NA' as a value
+                    np.dtype(np_dtype).type(NA_VALUES)
+                except ValueError:
+                    try:
+                        np.dtype(np_dtype).type('nan')
+                        line=[('nan' if i in NA_VALUES else i) for i in line] # '' or 'NA' are replaced with 'nan'
+                    except ValueError:
+                        pass
+
+            for j in range(hcols):
+                header_cols[j].append(line[j])
+
+            if numpy_mode:
+                data[r,:]=line[hcols:]
+            else:
+                data.append(line[hcols:])
+
+            r+=1
+
+    rows=r
+
+    if numpy_mode:
+        if sparse:
+            data=data.tosparse(rows)
+        if (packed or band!=None) and (rows != data.shape[0]):
+            sys.exit('non-symmetrical matrix! (packed/banded storage needs a square matrix)')
+        if(rows != data.shape[0]):
+            data=data[0:rows,:].copy()
+        cols=data.shape[1]
+
+    if (fh_from_filename):
+        original_fh.close()
+
+    if (hcols==1):
+        header_cols=header_cols[0]
+
+    if (hrows==1):
+        header_rows=header_rows[0]
+
+    if(verbose):
+        sys.stderr.write("loaded matrix with dimensions ("+str(len(data))+","+str(cols)+")\n")
+
+    return _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all)
+
+def _load_region(fh,region,np_dtype,row_block_size,verbose,cache_dir,cache_size):
+    """
+    load the region window of a matrix - returns (data,header_rows,header_cols) like load_matrix(hrows=1,hcols=1)
+    """
+
+    if isinstance(fh,str) and (fh!='-') and is_hdf5_matrix(fh):
+        return load_hdf5_matrix(fh,region=region,np_dtype=np_dtype,verbose=verbose)
+
+    if isinstance(fh,str) and (fh!='-') and (not is_binary_matrix(fh)) and has_matrix_index(fh):
+        index=load_matrix_index(fh)
+
+        rows=np.nonzero(region_mask(index['row_bins'],index['chrs'],region))[0]
+        cols=np.nonzero(region_mask(index['col_bins'],index['chrs'],region))[0]
+        if (len(rows)==0) or (len(cols)==0):
+            sys.exit('no bins found in region '+region+'!')
+
+        lines=read_matrix_rows(fh,index,rows[0],rows[-1])
+        data,block_headers=load_matrix(iter(lines),hcols=1,np_dtype=np_dtype,row_block_size=row_block_size)
+        data=data[rows-rows[0],:][:,cols]
+
+        header_rows=[index['header_cols'][i] for i in cols]
+        header_cols=[index['header_rows'][i] for i in rows]
+
+        if(verbose):
+            sys.stderr.write("loaded region "+region+" from index ("+str(len(rows))+" of "+str(len(index['header_rows']))+" rows)\n")
+
+        return data,header_rows,header_cols
+
+    data,header_rows,header_cols=load_matrix(fh,hrows=1,hcols=1,np_dtype=np_dtype,row_block_size=row_block_size,verbose=verbose,cache_dir=cache_dir,cache_size=cache_size)
+
+    # load_matrix header_rows are the column headers, header_cols the row headers
+    chrs,bins=header_bins(header_cols)
+    rows=np.nonzero(region_mask(bins,chrs,region))[0]
+    chrs,bins=header_bins(header_rows)
+    cols=np.nonzero(region_mask(bins,chrs,region))[0]
+    if (len(rows)==0) or (len(cols)==0):
+        sys.exit('no bins found in region '+region+'!')
+
+    data=np.asarray(data[rows[0]:rows[-1]+1,:][rows-rows[0],:][:,cols])
+    header_rows=[header_rows[i] for i in cols]
+    header_cols=[header_cols[i] for i in rows]
+
+    return data,header_rows,header_cols
+
+def _matrix_result(data,header_rows,header_cols,hrows,hcols,return_all):
+    if (return_all or (hrows and hcols)):
+        return data,header_rows,header_cols
+    if(hrows):
+        return data,header_rows
+    if(hcols):
+        return data,header_cols
+
+    return data
+
+def _parse_block(block,hcols,cols,dtype):
+    """
+    bulk parse a list of matrix lines into (header columns, values).
+    returns None if the block is not a clean rectangle of numbers, so the caller can fall back to per line parsing
+    """
+
+    nlines=len(block)
+
+    if hcols:
+        split_lines=[l.rstrip("\n").split("\t",hcols) for l in block]
+        if any(len(l) != hcols+1 for l in split_lines):
+            return None
+        block_headers=[[l[j] for l in split_lines] for j in range(hcols)]
+        block_text=[l[hcols] for l in split_lines]
+    else:
+        block_headers=[]
+        block_text=[l.rstrip("\n") for l in block]
+
+    # every line must hold exactly cols values
+    if any(l.count("\t") != cols-1 for l in block_text):
+        return None
+
+    block_text="\t"+"\t".join(block_text)+"\t"
+
+    # convert missing values (NA or empty) to nan - twice, since adjacent matches overlap on the shared tab
+    if "\t\t" in block_text:
+        block_text=block_text.replace("\t\t","\tnan\t").replace("\t\t","\tnan\t")
+    if "\tNA\t" in block_text:
+        block_text=block_text.replace("\tNA\t","\tnan\t").replace("\tNA\t","\tnan\t")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        block_values=np.fromstring(block_text,dtype=dtype,sep="\t")
+
+    if block_values.size != nlines*cols:
+        return None
+
+    return block_headers,block_values.reshape(nlines,cols)
+
+def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4,open_func=None,compresslevel=DEFAULT_COMPRESSION_LEVEL,threads=1,row_block_size=1000,index=False):
+    """
+    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
+    matrix files ending in .bin are written in the binary matrix format (see cworld.binary), .hdf5/.h5 as HDF5 (see cworld.hdf5)
+    open_func (e.g. a script's output_wrapper) opens the text output, default is a block gzip (see cworld.bgzf)
+    writer compressing on threads workers at compresslevel
+
+    values are formatted row_block_size rows at a time, each row with a single % format call
+    index writes a random-access row index (<matrixFile>.idx, see cworld.index) next to the block gzipped matrix
+    """
+
+    if is_binary_matrix_name(matrixFile):
+        write_binary_matrix(header_rows,header_cols,matrix,matrixFile)
+        return
+    if is_hdf5_matrix_name(matrixFile):
+        write_hdf5_matrix(header_rows,header_cols,matrix,matrixFile,row_block_size=row_block_size)
+        return
+
+    nrows=len(header_rows)
+    ncols=len(header_cols)
+
+    # interaction matrix output
+    if open_func==None:
+        out_fh=bgzf_open(matrixFile,"wb",compresslevel=compresslevel,threads=threads)
+    else:
+        out_fh=open_func(matrixFile)
+
+    if index and not hasattr(out_fh,'block_offsets'):
+        sys.exit('matrix index requires a block gzipped (.gz) output!')
+
+    # write matrix col headers
+    header=[str(i) for i in header_cols]
+    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
+
+    row_format="\t".join(["%0."+str(precision)+"f"]*ncols)
+    row_offsets=[]
+
+    for i in range(0,nrows,row_block_size):
+        block_rows=matrix[i:i+row_block_size,:].tolist()
+        block=[header_rows[i+j]+"\t"+(row_format % tuple(row)) for j,row in enumerate(block_rows)]
+        if index:
+            offset=out_fh.tell()
+            for line in block:
+                row_offsets.append(offset)
+                offset+=len(line)+1
+        out_fh.write("\n".join(block)+"\n")
+
+    if index:
+        row_offsets.append(out_fh.tell())
+
+    out_fh.close()
+
+    if index:
+        write_matrix_index(matrixFile,header_rows,header_cols,row_offsets,out_fh.block_offsets)
@@ -0,0 +1,166 @@
+"""
+packed upper-triangle storage for symmetric matrices.
+
+only the upper triangle (diagonal included) of an n x n symmetric matrix is kept,
+row by row, in one flat array of n*(n+1)/2 values - half the memory of the square:
+
+    row i holds columns i..n-1, starting at offset(i) = i*n - i*(i-1)/2
+
+indexing (matrix[rows,cols] with ints and slices) returns dense np arrays built from
+the triangle, so code reading rows, columns or sub-blocks runs unchanged on a packed
+matrix; row(), diagonal() and block() are the explicit accessors.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+from cworld.storage import StoredMatrix,square_size,copy_row_blocks
+
+class PackedSymmetricMatrix(StoredMatrix):
+    """symmetric n x n matrix stored as its packed upper triangle
+    """
+
+    storage='packed'
+
+    def __init__(self,n,dtype='float32',data=None,fill=0):
+
+        self.n=int(n)
+        self.shape=(self.n,self.n)
+        self.ndim=2
+
+        # row start offsets into the packed array, plus the total size
+        rows=np.arange(self.n+1,dtype=np.int64)
+        self._offsets=(rows*self.n)-((rows*(rows-1))//2)
+
+        size=int(self._offsets[-1])
+        if data is None:
+            data=np.empty(size,dtype=dtype)
+            data.fill(fill)
+        elif data.shape != (size,):
+            raise ValueError('packed data does not match a '+str(self.n)+'x'+str(self.n)+' matrix')
+
+        self.data=data
+        self.dtype=data.dtype
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def _index(self,rows,cols):
+        """packed positions of the (rows x cols) grid
+        """
+
+        rows=np.asarray(rows,dtype=np.int64).reshape(-1,1)
+        cols=np.asarray(cols,dtype=np.int64).reshape(1,-1)
+        lo=np.minimum(rows,cols)
+        hi=np.maximum(rows,cols)
+
+        return self._offsets[lo]+(hi-lo)
+
+    def __getitem__(self,key):
+        (rows,squeeze_rows),(cols,squeeze_cols)=self._keys(key)
+
+        values=self.data[self._index(rows,cols)]
+        return self._squeeze(values,squeeze_rows,squeeze_cols)
+
+    def __setitem__(self,key,values):
+        """assign whole rows (matrix[r,:] or matrix[r0:r1,:]), only the upper triangle part is kept
+        """
+
+        rows=self._row_keys(key)
+
+        values=np.asarray(values,dtype=self.dtype).reshape(len(rows),self.n)
+        for k,i in enumerate(rows):
+            self.data[self._offsets[i]:self._offsets[i+1]]=values[k,i:]
+
+    def row(self,i):
+        """row (= column) i as a dense vector
+        """
+
+        return self[i,:]
+
+    def block(self,rows,cols):
+        """dense sub-block, rows/cols are slices or index arrays
+        """
+
+        return self[rows,cols]
+
+    def diagonal(self,k=0):
+        """k-th diagonal (the -k-th diagonal is the same), as a copy
+        """
+
+        k=abs(k)
+        return self.data[self._offsets[0:self.n-k]+k]
+
+    def set_diagonal(self,k,value):
+        """set the k-th (and -k-th) diagonal to value
+        """
+
+        k=abs(k)
+        self.data[self._offsets[0:self.n-k]+k]=value
+
+    def mask_rowcols(self,mask,value=np.nan):
+        """set the rows and columns in the boolean mask to value
+        """
+
+        for i in np.nonzero(mask)[0]:
+            self.data[self._offsets[i]:self._offsets[i+1]]=value
+            self.data[self._offsets[0:i]+(i-np.arange(i))]=value
+
+    @classmethod
+    def from_dense(cls,matrix,row_block_size=1000,dtype=None):
+        """pack the upper triangle of a square (np array or np.memmap) matrix, a row block at a time
+        """
+
+        n=square_size(matrix,'packed')
+
+        if dtype == None:
+            dtype=matrix.dtype
+        return copy_row_blocks(cls(n,dtype=dtype),matrix,row_block_size)
+
+def nan_rowcols(matrix,row_block_size=1000):
+    """rows (= cols) that are entirely nan, computed a row block at a time
+    """
+
+    nan_rows=np.zeros(matrix.shape[0],dtype=bool)
+    for i in range(0,matrix.shape[0],row_block_size):
+        nan_rows[i:i+row_block_size]=np.all(np.isnan(matrix[i:i+row_block_size,:]),axis=1)
+
+    return nan_rows
+
+def packed_corrcoef(matrix,row_block_size=1000):
+    """row correlation (np.corrcoef) of a nan-free symmetric matrix as a packed float64 matrix
+    computed a pair of row blocks at a time, so neither the input nor the output square is expanded
+    """
+
+    n=matrix.shape[0]
+
+    # row means and norms
+    means=np.zeros(n)
+    norms=np.zeros(n)
+    for i in range(0,n,row_block_size):
+        block=np.asarray(matrix[i:i+row_block_size,:],dtype=np.float64)
+        means[i:i+row_block_size]=block.mean(axis=1)
+        block-=means[i:i+row_block_size,None]
+        norms[i:i+row_block_size]=np.sqrt(np.sum(block*block,axis=1))
+
+    corr=PackedSymmetricMatrix(n,dtype=np.float64)
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        for a in range(0,n,row_block_size):
+            rows=np.arange(a,min(a+row_block_size,n))
+            za=(np.asarray(matrix[a:a+row_block_size,:],dtype=np.float64)-means[rows,None])/norms[rows,None]
+
+            for b in range(a,n,row_block_size):
+                cols=np.arange(b,min(b+row_block_size,n))
+                zb=(np.asarray(matrix[b:b+row_block_size,:],dtype=np.float64)-means[cols,None])/norms[cols,None]
+
+                block=np.dot(za,zb.T)
+                np.clip(block,-1,1,out=block)
+
+                upper=cols[None,:] >= rows[:,None]
+                corr.data[corr._index(rows,cols)[upper]]=block[upper]
+
+    return corr
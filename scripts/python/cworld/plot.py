@@ -0,0 +1,240 @@
+"""
+insulation, eigenvector and explained variance plots, drawn in-process with a headless
+(Agg) matplotlib backend from the in-memory tracks.
+
+these are the plots of R/matrix2insulation-lite.R, R/plotEigen.R and R/plotEVR.R (same
+layout, sizes, colors and output file names), without an Rscript start and a re-read of
+the files per plot.  every figure is its own Figure/FigureCanvasAgg (no pyplot state), so
+many samples can be rendered in one process (see renderPlots.py).
+
+if matplotlib is not installed, plotting_available() is False and the scripts fall back
+to the R scripts.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import math
+import os
+
+import numpy as np
+
+try:
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection,PolyCollection
+except ImportError:
+    matplotlib=None
+
+# R png() default resolution, image sizes below are in pixels like the R scripts
+PLOT_DPI = 72
+
+GRAY_FILL = (0.75,0.75,0.75,0.5)
+
+def plotting_available():
+    return matplotlib != None
+
+def _figure(width,height):
+    """headless figure of width x height pixels"""
+
+    fig=Figure(figsize=(width/PLOT_DPI,height/PLOT_DPI),dpi=PLOT_DPI)
+    FigureCanvasAgg(fig)
+
+    return fig
+
+def _bands(x0,x1,y0,y1):
+    """vertices of the rectangles x0..x1 x y0..y1"""
+
+    x0=np.asarray(x0,dtype=float)
+    x1=np.asarray(x1,dtype=float)
+    y0=np.broadcast_to(np.asarray(y0,dtype=float),x0.shape)
+    y1=np.broadcast_to(np.asarray(y1,dtype=float),x0.shape)
+
+    return np.stack([np.c_[x0,y0],np.c_[x1,y0],np.c_[x1,y1],np.c_[x0,y1]],axis=1)
+
+def _format_coordinate(value):
+    return str(int(round(value)))
+
+def insulation_plot_size(num_headers):
+    """(width, height) of the insulation plot in pixels"""
+
+    image_width=max(num_headers*2,900)
+    image_height=max(int(math.ceil(image_width/8)),325)
+
+    return image_width,image_height
+
+def draw_insulation(ax,starts,ends,bin_starts,bin_ends,bin_midpoints,scores,title,y_bound=0):
+    """insulation track on ax - lines between adjacent bins, gray bands over gaps, purple where saturated"""
+
+    starts=np.asarray(starts)
+    ends=np.asarray(ends)
+    bin_starts=np.asarray(bin_starts,dtype=float)
+    bin_ends=np.asarray(bin_ends,dtype=float)
+    scores=np.asarray(scores,dtype=float)
+
+    x_start,x_end=np.min(starts),np.max(ends)
+    x_bin_start,x_bin_end=np.min(bin_starts),np.max(bin_ends)
+
+    # remove NAs from the scores
+    valid=~np.isnan(scores)
+    order=np.argsort(starts[valid],kind='mergesort')
+    x=np.asarray(bin_midpoints,dtype=float)[valid][order]
+    y=scores[valid][order]
+
+    if y_bound == 0:
+        y_bound=math.ceil(np.max(np.abs(y))) if len(y) else 1
+        y_bound=max(y_bound,1)
+
+    # saturate plot at y_bound
+    y=np.clip(y,-y_bound,y_bound)
+
+    ax.set_title(title)
+    ax.set_xlabel("genomic coordinates")
+    ax.set_ylabel("insulation index")
+    ax.set_xlim(x_bin_start,x_bin_end)
+    ax.set_ylim(-y_bound,y_bound)
+    ax.set_yticks(np.linspace(-y_bound,y_bound,11))
+
+    if len(x) > 1:
+        adjacent=np.diff(x) == 1
+
+        # gaps (non adjacent bins), and the ends of the track without data
+        gap_starts=x[:-1][~adjacent]
+        gap_ends=x[1:][~adjacent]
+        if x[0] != x_bin_start:
+            gap_starts=np.r_[x_bin_start,gap_starts]
+            gap_ends=np.r_[x[0],gap_ends]
+        if x[-1] != x_bin_end:
+            gap_starts=np.r_[gap_starts,x[-1]]
+            gap_ends=np.r_[gap_ends,x_bin_end]
+        ax.add_collection(PolyCollection(_bands(gap_starts,gap_ends,-y_bound,y_bound),facecolors=[GRAY_FILL],edgecolors='none'))
+
+        segments=np.stack([np.c_[x[:-1],y[:-1]],np.c_[x[1:],y[1:]]],axis=1)[adjacent]
+        ax.add_collection(LineCollection(segments,colors='black',linewidths=1))
+
+        # saturation blobs
+        saturated=adjacent & (np.abs(y[1:]) >= y_bound)
+        bound=np.sign(y[1:][saturated])*y_bound
+        blobs=np.stack([np.c_[x[:-1][saturated],bound],np.c_[x[1:][saturated],bound]],axis=1)
+        ax.add_collection(LineCollection(blobs,colors='purple',linewidths=4))
+
+        ax.axhline(0,linewidth=1,linestyle='--',color='black')
+        ax.axvline(x_bin_start,color='red',linewidth=2,linestyle='--')
+        ax.axvline(x_bin_end,color='red',linewidth=2,linestyle='--')
+
+    ax.set_xticks(np.linspace(x_bin_start,x_bin_end,11))
+    ax.set_xticklabels([_format_coordinate(l) for l in np.linspace(x_start,x_end,11)])
+
+def plot_insulation(insulation_file,starts,ends,bin_starts,bin_ends,bin_midpoints,scores,insulation_square_size_binsize,insulation_square_size_bp,y_bound=0,transparent_bg=False):
+    """<insulation file>.png and .pdf (see R/matrix2insulation-lite.R)"""
+
+    title=os.path.basename(insulation_file)+"\nbinSize="+str(insulation_square_size_binsize)+"|"+str(insulation_square_size_bp)
+
+    image_width,image_height=insulation_plot_size(len(scores))
+    fig=_figure(image_width,image_height)
+    draw_insulation(fig.add_subplot(1,1,1),starts,ends,bin_starts,bin_ends,bin_midpoints,scores,title,y_bound)
+    fig.savefig(insulation_file+".png",dpi=PLOT_DPI,transparent=transparent_bg)
+
+    fig=Figure(figsize=(7,7))
+    FigureCanvasAgg(fig)
+    draw_insulation(fig.add_subplot(1,1,1),starts,ends,bin_starts,bin_ends,bin_midpoints,scores,title,y_bound)
+    fig.savefig(insulation_file+".pdf")
+
+def _y_bounds(y):
+    y_min,y_max=np.nanmin(y),np.nanmax(y)
+    y_bound=max(abs(y_min),abs(y_max))
+    if y_min < 0:
+        return y_bound,(-y_bound,y_bound)
+    return y_bound,(0,y_bound)
+
+def draw_eigen(ax,x,y,title):
+    """eigenvector track on ax - red (>= 0) / blue (< 0) areas, gray bands over nan bins"""
+
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+
+    y_bound,y_lim=_y_bounds(y)
+
+    ax.set_title(title)
+    ax.set_xlabel("genomic coordinates (bp)")
+    ax.set_ylabel("eigen value")
+    ax.set_xlim(np.min(x),np.max(x))
+    ax.set_ylim(*y_lim)
+
+    x0,x1,y0,y1=x[:-1],x[1:],y[:-1],y[1:]
+    valid=~np.isnan(y0) & ~np.isnan(y1)
+    with np.errstate(invalid='ignore'):
+        same_sign=valid & ((y0*y1) >= 0)
+        crossing=valid & ~same_sign
+
+    quads=np.stack([np.c_[x0,y0],np.c_[x1,y1],np.c_[x1,np.zeros(len(x1))],np.c_[x0,np.zeros(len(x0))]],axis=1)[same_sign]
+    with np.errstate(invalid='ignore'):
+        quad_colors=np.where(y1[same_sign] >= 0,'red','blue')
+    # about to cross the 0 line - a triangle to the next bin
+    triangles=np.stack([np.c_[x0,y0],np.c_[x1,np.zeros(len(x1))],np.c_[x0,np.zeros(len(x0))]],axis=1)[crossing]
+    triangle_colors=np.where(y0[crossing] >= 0,'red','blue')
+
+    ax.add_collection(PolyCollection(list(quads)+list(triangles),facecolors=list(quad_colors)+list(triangle_colors),edgecolors='face',linewidths=0.5))
+    ax.add_collection(PolyCollection(_bands(x0[~valid],x1[~valid],-y_bound,y_bound),facecolors=[GRAY_FILL],edgecolors='none'))
+
+    ax.axhline(0,linewidth=1,linestyle='--',color='black')
+
+def draw_gene_density(ax,x,y,eigen1,title):
+    """gene density track on ax - black (eigen1 >= 0) / darkgray (eigen1 < 0) areas, orange bands over nan bins"""
+
+    x=np.asarray(x,dtype=float)
+    y=np.asarray(y,dtype=float)
+    eigen1=np.asarray(eigen1,dtype=float)
+
+    y_bound,y_lim=_y_bounds(y)
+
+    ax.set_title(title)
+    ax.set_xlabel("genomic coordinates (bp)")
+    ax.set_ylabel("gene density")
+    ax.set_xlim(np.min(x),np.max(x))
+    ax.set_ylim(*y_lim)
+
+    x0,x1,y0,y1=x[:-1],x[1:],y[:-1],y[1:]
+    valid=~np.isnan(y0) & ~np.isnan(y1)
+    # bins without an eigenvector are left unfilled
+    filled=valid & ~np.isnan(eigen1[:-1])
+
+    quads=np.stack([np.c_[x0,y0],np.c_[x1,y1],np.c_[x1,np.zeros(len(x1))],np.c_[x0,np.zeros(len(x0))]],axis=1)[filled]
+    quad_colors=np.where(eigen1[:-1][filled] >= 0,'black','darkgray')
+
+    ax.add_collection(PolyCollection(quads,facecolors=list(quad_colors),edgecolors='face',linewidths=0.5))
+    ax.add_collection(PolyCollection(_bands(x0[~valid],x1[~valid],-y_bound,y_bound),facecolors=[(1.0,165/255,0.0,100/255)],edgecolors='none'))
+
+    ax.axhline(0,linewidth=1,linestyle='--',color='black')
+
+def plot_eigen(compartment_file,job_name,x,eigen1,eigen2,eigen3,evr,gene_density=None):
+    """<compartment file>.png - gene density and the first 3 eigenvectors (see R/plotEigen.R)"""
+
+    # R cex=1.1
+    with matplotlib.rc_context({'font.size':1.1*matplotlib.rcParamsDefault['font.size']}):
+        fig=_figure(1200,1200)
+
+        if gene_density is not None and not np.all(np.isnan(gene_density)):
+            draw_gene_density(fig.add_subplot(4,1,1),x,gene_density,eigen1,job_name+"\ngeneDensity")
+        for i,eigen in enumerate([eigen1,eigen2,eigen3]):
+            draw_eigen(fig.add_subplot(4,1,i+2),x,eigen,"prinicple component #"+str(i+1)+" - evr ["+'{:.7g}'.format(evr[i]*100)+"%]")
+
+        fig.tight_layout()
+        fig.savefig(compartment_file+".png",dpi=PLOT_DPI)
+
+def plot_evr(evr_file,evr):
+    """<evr file>.png - explained variance ratio of every eigenvector (see R/plotEVR.R)"""
+
+    evr=np.asarray(evr,dtype=float)*100
+    eigenvectors=np.arange(1,len(evr)+1)
+
+    fig=_figure(600,400)
+    ax=fig.add_subplot(1,1,1)
+    ax.set_title("Eigenvector explained variance ratio")
+    ax.set_xlabel("eigenvector 1 .. n")
+    ax.set_ylabel("explained variance")
+    ax.set_ylim(0,100)
+    ax.plot(eigenvectors,evr,color='black',marker='o',markerfacecolor='none',linewidth=1)
+
+    fig.savefig(evr_file+".png",dpi=PLOT_DPI)
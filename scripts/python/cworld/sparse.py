@@ -0,0 +1,195 @@
+"""
+sparse (CSR) storage for genome-wide / high resolution matrices.
+
+only the nonzero finite values are kept (scipy.sparse CSR), plus one boolean mask
+per axis marking the bins whose whole row/column is nan - memory scales with the
+number of contacts instead of bins^2.  nan values outside the nan rows/cols are
+not kept (they read back as 0, as after np.nan_to_num).
+
+indexing (matrix[rows,cols] with ints and slices) returns dense np arrays with the
+nan rows/cols restored, so code reading row blocks (e.g. writeMatrix) runs
+unchanged on a sparse matrix.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+import scipy.sparse
+
+from cworld.storage import StoredMatrix,copy_row_blocks
+
+class SparseMatrix(StoredMatrix):
+    """matrix stored as a CSR matrix of its nonzero finite values plus nan row/col masks
+    """
+
+    storage='sparse'
+
+    def __init__(self,data,nan_rows=None,nan_cols=None):
+
+        self.data=scipy.sparse.csr_matrix(data)
+        self.shape=self.data.shape
+        self.ndim=2
+        self.dtype=self.data.dtype
+
+        if nan_rows is None:
+            nan_rows=np.zeros(self.shape[0],dtype=bool)
+        if nan_cols is None:
+            nan_cols=np.zeros(self.shape[1],dtype=bool)
+
+        self.nan_rows=np.asarray(nan_rows,dtype=bool)
+        self.nan_cols=np.asarray(nan_cols,dtype=bool)
+
+    @property
+    def nnz(self):
+        return self.data.nnz
+
+    @property
+    def nbytes(self):
+        return self.data.data.nbytes+self.data.indices.nbytes+self.data.indptr.nbytes+self.nan_rows.nbytes+self.nan_cols.nbytes
+
+    def __getitem__(self,key):
+        (rows,squeeze_rows),(cols,squeeze_cols)=self._keys(key)
+
+        values=self.data[rows,:][:,cols].toarray()
+        values[self.nan_rows[rows],:]=np.nan
+        values[:,self.nan_cols[cols]]=np.nan
+
+        return self._squeeze(values,squeeze_rows,squeeze_cols)
+
+    def submatrix(self,rows,cols):
+        """rows x cols (index arrays or boolean masks) as a SparseMatrix
+        """
+
+        (rows,squeeze_rows),(cols,squeeze_cols)=self._keys((rows,cols))
+
+        return SparseMatrix(self.data[rows,:][:,cols],self.nan_rows[rows],self.nan_cols[cols])
+
+    def nan_to_num(self):
+        """the matrix with nan rows/cols as 0 (shares the CSR values)
+        """
+
+        return SparseMatrix(self.data)
+
+    def observed_over_expected(self,bins):
+        """divide every value by the mean of its distance band (offset |row-col|)
+        bins are [start,end) offset bands covering 0..N-1, means are taken over the lower triangle cells (zeros included)
+        """
+
+        N=self.shape[0]
+        bins=np.asarray(bins,dtype=np.int64).reshape(-1,2)
+
+        coo=self.data.tocoo()
+        values=coo.data.astype(np.float64)
+        offsets=np.abs(coo.row.astype(np.int64)-coo.col)
+        band=np.searchsorted(bins[:,0],offsets,side='right')-1
+
+        lower=coo.row >= coo.col
+        sums=np.bincount(band[lower],weights=values[lower],minlength=len(bins))
+
+        # number of cells in offsets start..end-1 = sum of (N-offset)
+        starts=bins[:,0]
+        ends=bins[:,1]
+        counts=((ends-starts)*N)-(((starts+ends-1)*(ends-starts))//2)
+
+        means=sums/counts
+        scale=means[band]
+        nonzero=scale != 0
+        values[nonzero]/=scale[nonzero]
+
+        data=scipy.sparse.csr_matrix((values,(coo.row,coo.col)),shape=self.shape)
+
+        return SparseMatrix(data,self.nan_rows,self.nan_cols)
+
+    @classmethod
+    def from_dense(cls,matrix,row_block_size=1000,dtype=None):
+        """sparsify a dense (np array or np.memmap) matrix, a row block at a time
+        """
+
+        if dtype == None:
+            dtype=matrix.dtype
+        builder=copy_row_blocks(SparseMatrixBuilder(matrix.shape[1],dtype=dtype),matrix,row_block_size)
+
+        return builder.tosparse(matrix.shape[0])
+
+class SparseMatrixBuilder(object):
+    """collect rows (assigned whole rows at a time, in any order) into a SparseMatrix
+    """
+
+    def __init__(self,ncols,dtype='float32'):
+
+        self.ncols=int(ncols)
+        self.dtype=np.dtype(dtype)
+        self.nrows=0
+
+        self._rows=[]
+        self._cols=[]
+        self._values=[]
+        self._nan_rows=[]
+        self._nan_col_counts=np.zeros(self.ncols,dtype=np.int64)
+
+    @property
+    def shape(self):
+        return (self.nrows,self.ncols)
+
+    def __setitem__(self,key,values):
+        if not isinstance(key,tuple):
+            key=(key,slice(None))
+        row_key,col_key=key
+        if col_key != slice(None):
+            raise IndexError('sparse matrices are assigned whole rows at a time')
+
+        if isinstance(row_key,slice):
+            start=row_key.start if row_key.start != None else 0
+        else:
+            start=int(row_key)
+
+        values=np.asarray(values,dtype=self.dtype).reshape(-1,self.ncols)
+
+        nan_values=np.isnan(values)
+        all_nan=np.all(nan_values,axis=1)
+        self._nan_rows.extend((start+np.nonzero(all_nan)[0]).tolist())
+        self._nan_col_counts+=np.sum(nan_values,axis=0)
+
+        rows,cols=np.nonzero(np.isfinite(values) & (values != 0))
+        self._rows.append((rows+start).astype(np.int32))
+        self._cols.append(cols.astype(np.int32))
+        self._values.append(values[rows,cols])
+
+        self.nrows=max(self.nrows,start+len(values))
+
+    def tosparse(self,nrows=None):
+        if nrows == None:
+            nrows=self.nrows
+
+        rows=np.concatenate(self._rows) if self._rows else np.zeros(0,dtype=np.int32)
+        cols=np.concatenate(self._cols) if self._cols else np.zeros(0,dtype=np.int32)
+        values=np.concatenate(self._values) if self._values else np.zeros(0,dtype=self.dtype)
+
+        data=scipy.sparse.csr_matrix((values,(rows,cols)),shape=(nrows,self.ncols),dtype=self.dtype)
+
+        nan_rows=np.zeros(nrows,dtype=bool)
+        nan_rows[self._nan_rows]=True
+        nan_cols=(self._nan_col_counts == nrows) if nrows else np.zeros(self.ncols,dtype=bool)
+
+        return SparseMatrix(data,nan_rows,nan_cols)
+
+def sparse_corrcoef(matrix):
+    """row correlation (np.corrcoef) of a SparseMatrix (nan rows/cols taken as 0), as a dense float64 np array
+    computed from the sparse product A.A' so the input is never expanded
+    """
+
+    A=matrix.data.astype(np.float64)
+    m=A.shape[1]
+
+    means=np.asarray(A.sum(axis=1)).ravel()/m
+    cov=(A.dot(A.T)).toarray()
+    cov-=m*np.outer(means,means)
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        d=np.sqrt(np.diag(cov))
+        cov/=d[:,None]
+        cov/=d[None,:]
+    np.clip(cov,-1,1,out=cov)
+
+    return cov
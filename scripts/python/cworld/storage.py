@@ -0,0 +1,105 @@
+"""
+shared indexing for the matrix storage classes (packed, banded, sparse).
+
+StoredMatrix parses numpy style keys - matrix[rows,cols] with ints, slices, index
+arrays or boolean masks - into index arrays, squeezes int keys out of the dense result,
+and provides the row block iteration / dense expansion every storage class offers.
+subclasses set .shape and .storage (the name used in error messages) and implement
+__getitem__ (and, to be filled by copy_row_blocks, whole-row __setitem__).
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import numpy as np
+
+class StoredMatrix(object):
+    """base class of the matrix storage classes
+    """
+
+    storage='stored'
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _axis(self,key,n):
+        """int/slice/array key -> (index array, squeeze flag)
+        """
+
+        if isinstance(key,slice):
+            return np.arange(*key.indices(n)),False
+        if np.isscalar(key):
+            key=int(key)
+            if key < 0:
+                key+=n
+            if key < 0 or key >= n:
+                raise IndexError('index '+str(key)+' is out of bounds for size '+str(n))
+            return np.array([key]),True
+
+        key=np.asarray(key)
+        if key.dtype == bool:
+            key=np.nonzero(key)[0]
+        return key,False
+
+    def _keys(self,key):
+        if not isinstance(key,tuple):
+            key=(key,slice(None))
+        if len(key) != 2:
+            raise IndexError(self.storage+' matrices take two indices')
+
+        return self._axis(key[0],self.shape[0]),self._axis(key[1],self.shape[1])
+
+    def _row_keys(self,key):
+        """rows of a whole-row assignment key (matrix[r,:] or matrix[r0:r1,:])
+        """
+
+        (rows,squeeze_rows),(cols,squeeze_cols)=self._keys(key)
+        if len(cols) != self.shape[1] or np.any(cols != np.arange(self.shape[1])):
+            raise IndexError(self.storage+' matrices are assigned whole rows at a time')
+
+        return rows
+
+    @staticmethod
+    def _squeeze(values,squeeze_rows,squeeze_cols):
+        """drop the axes indexed by ints from a dense (rows x cols) result
+        """
+
+        if squeeze_rows and squeeze_cols:
+            return values[0,0]
+        if squeeze_rows:
+            return values[0,:]
+        if squeeze_cols:
+            return values[:,0]
+        return values
+
+    def row_blocks(self,row_block_size=1000):
+        """iterate over (start row, dense row block)
+        """
+
+        for i in range(0,self.shape[0],row_block_size):
+            yield i,self[i:i+row_block_size,:]
+
+    def toarray(self):
+        """expand into the full dense matrix
+        """
+
+        return self[:,:]
+
+def square_size(matrix,storage):
+    """n of a square n x n matrix, ValueError for other shapes
+    """
+
+    n=matrix.shape[0]
+    if matrix.shape[1] != n:
+        raise ValueError(storage+' storage needs a square matrix')
+
+    return n
+
+def copy_row_blocks(target,matrix,row_block_size=1000):
+    """assign the rows of a dense (np array or np.memmap) matrix to target, a row block at a time
+    """
+
+    for i in range(0,matrix.shape[0],row_block_size):
+        target[i:i+row_block_size,:]=matrix[i:i+row_block_size,:]
+
+    return target
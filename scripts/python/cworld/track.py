@@ -0,0 +1,63 @@
+"""
+column-oriented writers for the tab delimited track outputs (.insulation, .compartments,
+.bedGraph ...).
+
+columns are formatted in bulk, then joined and written in large chunks instead of one
+print() per row.  every column is formatted exactly as print()/str() shows its elements, so
+the files are identical to the per-row writers:
+
+    - lists (ints, python floats, strings) are str()'d element-wise
+    - numpy float64 arrays are formatted like their scalars, i.e. the shortest repr (via the
+      repr of the python floats - the same digits, also under python 2)
+    - nan is written as the na token, if one is given
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+
+import numpy as np
+
+# rows per write
+TRACK_CHUNK_ROWS = 65536
+
+def format_column(values,na=None):
+    """list of the strings print() shows for the elements of values, nan as na (if not None)"""
+
+    if isinstance(values,np.ndarray):
+        if values.dtype == np.float64:
+            strings=list(map(repr,values.tolist()))
+        elif values.dtype.kind in 'iub':
+            strings=list(map(str,values.tolist()))
+        else:
+            # object/string arrays and other float types (e.g. float32 scalars have their own repr)
+            strings=[str(v) for v in values]
+    else:
+        strings=list(map(str,values))
+
+    if na != None:
+        nan_values=np.isnan(np.asarray(values,dtype=np.float64))
+        for i in np.nonzero(nan_values)[0]:
+            strings[i]=na
+
+    return strings
+
+def round_column(values,decimals):
+    """the values of a float64 array as round(value,decimals) of its scalars gives them - under
+    python 2 builtin round() of the python floats, otherwise numpy rounding"""
+
+    values=np.asarray(values,dtype=np.float64)
+    if sys.version_info[0] < 3:
+        return [round(v,decimals) for v in values.tolist()]
+
+    return np.round(values,decimals)
+
+def write_columns(fh,columns,sep="\t",chunk_rows=TRACK_CHUNK_ROWS):
+    """write the rows of equal length string columns (see format_column) to fh"""
+
+    num_rows=len(columns[0]) if len(columns) else 0
+    for chunk_start in range(0,num_rows,chunk_rows):
+        chunk_end=min(chunk_start+chunk_rows,num_rows)
+        rows=zip(*[c[chunk_start:chunk_end] for c in columns])
+        fh.write("\n".join(map(sep.join,rows))+"\n")
@@ -0,0 +1,333 @@
+"""
+zoomed (coordinate / BED subset) views of a symmetric matrix.
+
+zoom coordinates are UCSC formatted (chr:start-end), BED elements can be extended by
+element_exten bp on both sides.  MatrixView selects the bins of a zoom coordinate like
+--region does (both ends inclusive, see cworld.index.region_mask).  build_bin_mask turns the selection into a boolean mask
+over the bins (chr_bin_range, bin_positions - the HDF5 layout, see cworld.hdf5), looking
+the coordinates up in a sorted interval index (see cworld.interval).
+
+MatrixView reads values only when sliced:
+
+    HDF5            only the chunks intersecting the selected rows/cols are read
+    binary          the selected rows/cols are read from the memmap
+    indexed text    only the gzip blocks holding the selected rows are decompressed
+    text            loaded whole (no random access)
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import os
+import re
+import sys
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py=None
+
+from cworld.matrix import load_matrix
+from cworld.binary import is_binary_matrix,load_binary_matrix
+from cworld.index import has_matrix_index,load_matrix_index,read_matrix_rows,region_tag,region_mask
+from cworld.hdf5 import is_hdf5_matrix,hdf5_headers,_str
+from cworld.header import HeaderTable
+from cworld.interval import IntervalIndex,read_bed_intervals
+
+def split_coord(z):
+    """validate and split zoom coordinate.
+    coordinates must be UCSC formatted.
+    e.g. chr1:500-1000
+    chr(colon)start(hyphen)end where start <= end
+    """
+    z=z.replace(',','')
+    zoom_coord=re.search(r'(\S+):(\d+)-(\d+)',z)
+
+    if zoom_coord==None:
+        return None
+
+    zoom_chr,zoom_start,zoom_end=zoom_coord.groups()
+    zoom_start=int(zoom_start)
+    zoom_end=int(zoom_end)
+
+    if(zoom_start > zoom_end):
+        return None
+
+    return [zoom_chr,zoom_start,zoom_end]
+
+def subset_by_coords(zoom_chrs,zoom_dict,coord):
+    """read UCSC coordinates, extract chr, coordinates
+    """
+
+    # process zoom coordinates
+    if(coord!=None):
+        for z in coord:
+            coord=split_coord(z)
+
+            if coord==None:
+                continue
+
+            coord_chr,coord_start,coord_end=coord
+            if coord_chr not in zoom_chrs:
+                zoom_chrs += [coord_chr]
+            zoom_dict[coord_chr].append(coord)
+
+    return zoom_chrs,zoom_dict
+
+def subset_by_bed(bed_chrs,bed_dict,bed_file,element_exten):
+    """read bed file, extract chr, coordinates
+    """
+
+    chrs,starts,ends=read_bed_intervals(bed_file,element_exten)
+    for bed_chr,bed_start,bed_end in zip(chrs,starts.tolist(),ends.tolist()):
+        if bed_chr not in bed_chrs:
+            bed_chrs += [bed_chr]
+        bed_dict[bed_chr].append([bed_chr,bed_start,bed_end])
+
+    return bed_chrs,bed_dict
+
+def build_bin_mask(n,chrs,zoom_dict,chr_dict,chr_bin_range,bin_positions,axis=None,bin_index=None):
+    """build a 1D mask (x or y axis) based upon user chr/coor selection
+    zoom coordinates are looked up in an IntervalIndex over bin_positions (bin_index, built if not given)
+    """
+
+    bin_mask=np.zeros(n,dtype=bool)
+
+    # whole chromosomes, and the zoom coordinates of the others
+    zoom_coords=[]
+    for c in chrs:
+        r=chr_bin_range[chr_dict[c]]
+        if c in zoom_dict:
+            zoom_coords += [(chr_dict[c],zoom_coord[1],zoom_coord[2]) for zoom_coord in zoom_dict[c]]
+        else:
+            bin_mask[r[0]:r[1]+1]=True
+
+    if len(zoom_coords):
+        if bin_index == None:
+            bin_index=IntervalIndex(bin_positions[:,0],bin_positions[:,1],bin_positions[:,2])
+        zoom_chrs,zoom_starts,zoom_ends=zip(*zoom_coords)
+        bin_mask |= bin_index.mask(zoom_chrs,zoom_starts,zoom_ends)
+
+    return(bin_mask)
+
+def zoom_tag(zoom=None,bed=None):
+    """zoom coordinates / BED files as used in output file names (joined by __, as subsetMatrix.pl does)
+    """
+
+    tags=[region_tag(z) for z in (zoom or [])]
+    tags+=[re.sub(r"\.bed(\.gz)?$","",os.path.basename(b)) for b in (bed or [])]
+
+    return '__'.join(tags)
+
+def flip_intervals(a,b):
+    """flip intervals, to ensure a < b
+    """
+
+    return(b,a)
+
+def is_overlap(a, b):
+    """test to for overlap between two intervals.
+    """
+
+    if(a[0] > a[1]):
+        sys.exit('\nerror: incorrectly formated interval! start '+str(a[0])+' > end '+str(a[1])+'!\n\t'+str(a)+' '+str(b)+'\n')
+    if(b[0] > b[1]):
+        sys.exit('\nerror: incorrectly formated interval! start '+str(b[0])+' > end '+str(b[1])+'!\n\t'+str(a)+' '+str(b)+'\n')
+
+    if a[0] < b[0] and a[1] > b[1]:
+        return((b[1]-b[0])+1)
+
+    if b[0] < a[0] and b[1] > a[1]:
+        return((a[1]-a[0])+1)
+
+    if b[0] < a[0]:
+        a,b=flip_intervals(a,b)
+
+    return max(0, ( min(a[1],b[1]) - max(a[0],b[0]) ) )
+
+def _chunk_groups(idx,chunk):
+    """group the positions of idx by idx//chunk, each group sorted by idx
+    """
+
+    order=np.argsort(idx,kind='mergesort')
+    chunk_ids=idx[order]//chunk
+    breaks=np.nonzero(chunk_ids[1:] != chunk_ids[:-1])[0]+1
+
+    return np.split(order,breaks)
+
+class MatrixView(object):
+    """lazy view of a symmetric HDF5, binary or (indexed) text matrix, values are read only when the view is sliced
+    """
+
+    def __init__(self,matrixFile,np_dtype='float32'):
+
+        self.matrixFile=matrixFile
+        self.dtype=np.dtype(np_dtype)
+
+        self._hdf=None
+        self._index=None
+        self._data=None
+        self._bin_index=None
+
+        if is_hdf5_matrix(matrixFile):
+            if h5py == None:
+                sys.exit('h5py is required to read HDF5 matrices!')
+            self._hdf=h5py.File(matrixFile,'r')
+            self._interactions=self._hdf['interactions']
+            if self._interactions.shape[0] != self._interactions.shape[1]:
+                sys.exit('error: non-symmetrical matrix found!')
+
+            self.headers=hdf5_headers(self._hdf)
+            self.chrs=[_str(c) for c in self._hdf['chrs'][:]]
+            self.chr_bin_range=self._hdf['chr_bin_range'][:]
+            self.bin_positions=self._hdf['bin_positions'][:]
+        else:
+            if is_binary_matrix(matrixFile):
+                self._data,header_rows,header_cols,meta=load_binary_matrix(matrixFile)
+            elif has_matrix_index(matrixFile):
+                self._index=load_matrix_index(matrixFile)
+                header_rows,header_cols=self._index['header_rows'],self._index['header_cols']
+            else:
+                self._data,header_cols,header_rows=load_matrix(matrixFile,hrows=1,hcols=1,np_dtype=np_dtype)
+
+            if list(header_rows) != list(header_cols):
+                sys.exit('error: non-symmetrical matrix found!')
+
+            header_table=HeaderTable(header_cols)
+            self.headers=list(header_cols)
+            self.chrs=header_table.chrs
+            try:
+                self.chr_bin_range=header_table.chr_bin_range()
+            except ValueError as e:
+                sys.exit('error: '+str(e)+'!')
+            self.bin_positions=np.c_[header_table['chr'],header_table['start'],header_table['end']].astype(np.int64).reshape(-1,3)
+
+        n=len(self.headers)
+        self.shape=(n,n)
+        self.ndim=2
+        self.chr_dict=dict((c,i) for i,c in enumerate(self.chrs))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _axis(self,key):
+        if isinstance(key,slice):
+            return np.arange(*key.indices(self.shape[0]))
+
+        key=np.asarray(key)
+        if key.dtype == bool:
+            key=np.nonzero(key)[0]
+        return key.astype(np.int64).reshape(-1)
+
+    def __getitem__(self,key):
+        """matrix[rows,cols] (slices, index arrays or boolean masks) as a dense np array
+        """
+
+        if not isinstance(key,tuple):
+            key=(key,slice(None))
+        rows,cols=self._axis(key[0]),self._axis(key[1])
+
+        if self._hdf != None:
+            return self._read_hdf5(rows,cols)
+        if self._index != None:
+            return self._read_indexed(rows,cols)
+
+        return np.asarray(self._data[np.ix_(rows,cols)],dtype=self.dtype)
+
+    def _read_hdf5(self,rows,cols):
+        """read only the chunks that intersect rows x cols
+        """
+
+        chunk_rows,chunk_cols=self._interactions.chunks if self._interactions.chunks != None else (1000,1000)
+
+        values=np.empty((len(rows),len(cols)),dtype=self.dtype)
+        col_groups=_chunk_groups(cols,chunk_cols) if len(cols) else []
+        for pr in (_chunk_groups(rows,chunk_rows) if len(rows) else []):
+            r0,r1=rows[pr[0]],rows[pr[-1]]+1
+            for pc in col_groups:
+                c0,c1=cols[pc[0]],cols[pc[-1]]+1
+                block=self._interactions[r0:r1,c0:c1]
+                values[np.ix_(pr,pc)]=block[np.ix_(rows[pr]-r0,cols[pc]-c0)]
+
+        return values
+
+    def _read_indexed(self,rows,cols):
+        """decompress only the blocks holding each run of consecutive rows
+        """
+
+        values=np.empty((len(rows),len(cols)),dtype=self.dtype)
+        order=np.argsort(rows,kind='mergesort')
+        sorted_rows=rows[order]
+        breaks=np.nonzero(np.diff(sorted_rows) > 1)[0]+1
+        for run in np.split(order,breaks) if len(rows) else []:
+            r0,r1=rows[run[0]],rows[run[-1]]
+            lines=read_matrix_rows(self.matrixFile,self._index,r0,r1)
+            block,block_headers=load_matrix(iter(lines),hcols=1,np_dtype=self.dtype)
+            values[run,:]=block[rows[run]-r0,:][:,cols]
+
+        return values
+
+    @property
+    def bin_index(self):
+        """IntervalIndex over the bins, built on first use
+        """
+
+        if self._bin_index == None:
+            self._bin_index=IntervalIndex(self.bin_positions[:,0],self.bin_positions[:,1],self.bin_positions[:,2])
+        return self._bin_index
+
+    def bin_mask(self,zoom=None,bed=None,element_exten=0):
+        """boolean mask of the bins selected by zoom coordinates and/or BED files (all bins if neither is given)
+        zoom coordinates select bins like --region does (region_mask, both ends inclusive), BED elements by is_overlap
+        """
+
+        if (zoom == None) and (bed == None):
+            return np.ones(self.shape[0],dtype=bool)
+
+        bin_mask=np.zeros(self.shape[0],dtype=bool)
+        for coord in [split_coord(z) for z in (zoom or [])]:
+            if coord != None:
+                bin_mask |= region_mask(self.bin_positions,self.chrs,coord[0]+":"+str(coord[1])+"-"+str(coord[2]))
+
+        if bed != None:
+            chrs,starts,ends=read_bed_intervals(bed,element_exten)
+
+            # elements on chromosomes not in the matrix are skipped
+            chr_codes=np.array([self.chr_dict.get(c,-1) for c in chrs],dtype=np.int64)
+            known=chr_codes >= 0
+
+            bin_mask |= self.bin_index.mask(chr_codes[known],starts[known],ends[known])
+
+        return bin_mask
+
+    def zoom(self,zoom=None,bed=None,element_exten=0):
+        """load the zoomed/BED selected bins - returns (data,header_rows,header_cols) like load_matrix(hrows=1,hcols=1)
+        """
+
+        bins=np.nonzero(self.bin_mask(zoom,bed,element_exten))[0]
+        if len(bins) == 0:
+            sys.exit('no bins found in zoom/bed selection!')
+
+        headers=[self.headers[i] for i in bins]
+
+        return self[bins,bins],headers,list(headers)
+
+    def close(self):
+        if self._hdf != None:
+            self._hdf.close()
+            self._hdf=None
+
+def load_zoomed_matrix(matrixFile,zoom=None,bed=None,element_exten=0,np_dtype='float32',verbose=False):
+    """load only the bins selected by zoom coordinates and/or BED files, through a MatrixView
+    """
+
+    view=MatrixView(matrixFile,np_dtype=np_dtype)
+    data,header_rows,header_cols=view.zoom(zoom,bed,element_exten)
+    view.close()
+
+    if(verbose):
+        sys.stderr.write("loaded zoomed matrix with dimensions ("+str(data.shape[0])+","+str(data.shape[1])+") of "+str(view.shape[0])+" bins\n")
+
+    return data,header_rows,header_cols
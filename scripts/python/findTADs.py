@@ -37,6 +37,9 @@ from math import cos,log,sin,sqrt
 # deprecated from scipy and unusde in the script:
 # from scipy import weave 
 
+# user defined modules
+from cworld.matrix import load_matrix,matrix_name
+
 def main():
     print("")
     
@@ -51,9 +54,7 @@ def main():
         sys.exit('invalid input file! (non-existant)')
     
     print("inputMatrix",inputMatrix)
-    inputMatrixName=os.path.basename(inputMatrix)
-    inputMatrixName=re.sub(".gz", "", inputMatrixName)    
-    inputMatrixName=re.sub(".matrix", "", inputMatrixName)
+    inputMatrixName=matrix_name(inputMatrix)
     print("inputMatrixName",inputMatrixName)
     
     print("")
@@ -71,6 +72,11 @@ def main():
     nrows=len(header_rows)
     ncols=len(header_cols)
     
+    if(nrows != matrix.shape[0]):
+        sys.exit('header/data mismatch!')    
+    if(ncols != matrix.shape[1]):
+        sys.exit('header/data mismatch!')    
+    
     print("")
     
     # enfore symmetrical matrices only
@@ -112,29 +118,6 @@ def main():
     print("")
 
 
-def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4):
-    """
-    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
-    """
-    
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    
-    # interaction matrix output
-    out_fh=gzip.open(matrixFile,"wb")
-    
-    # write matrix col headers
-    header=[str(i) for i in header_cols]
-    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
-
-    format_func=("{:0."+str(precision)+"f}").format
-    k=0
-    
-    for i in xrange(nrows):
-        print(header_rows[i]+"\t"+"\t".join(map(format_func,matrix[i,:])),file=out_fh)
-    
-    out_fh.close()
-
 def enforceSymmetrical(matrix):
     
     nmatrix_rows=matrix.shape[0]
@@ -174,143 +157,6 @@ def getMatrixAssembly(headers):
     print("matrix assembly:",assembly)
     return(assembly)
    
-def load_matrix(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None):
-    """
-    load a np.array or a list of lists from a text file handle (but works with any iterator) or filename, more memory efficient than numpy.genfromtxt(), headers are returned as lists of strings
-    """
-    fh_from_filename=False
-    
-    if type(fh)==str:
-        if (fh=='-'):
-            fh=sys.stdin
-        else:
-            fh=open(fh,'r')
-            fh_from_filename=True
-
-    original_fh=fh
-        
-    # init
-
-    firstline=fh.next()
-    
-    fh=itertools.chain([firstline],fh)
-    
-    cols=len(firstline.rstrip("\n").split("\t"))
-    rows=row_block_size
-
-    if (max_rows!=None and max_rows<row_block_size):
-        rows=max_rows
-
-    if(hcols):
-        cols-=hcols
-
-   
-    if numpy_mode:
-        data=np.zeros((rows,cols),dtype=np_dtype)
-    else:
-        data=[]
-
-    header_rows=[[] for i in range(hrows)]
-
-    for i in range(hrows):
-        header_rows[i]=fh.next().rstrip("\n").split("\t")[hcols:]
- 
-    header_cols=[[] for i in range(hcols)]
-    
-    # fill one line at a time
-
-    prev_cols=-1
-
-    r=0
-
-    if (max_rows==None or r<max_rows):
-  
-        for i in fh:
-            line=i.rstrip("\n").split("\t")
-
-            cols=len(line)-hcols
-
-           # if(cols==0):
-           #     sys.exit('no valid columns in input line '+str(r))
-
-            if(prev_cols>-1 and cols!=prev_cols):
-                if(pad and cols<prev_cols):
-                    line=line+['']*(prev_cols-cols)
-                    cols=len(line)-hcols
-                else:
-                    sys.exit('inconsistent number of columns in input line '+str(r))
-
-            prev_cols=cols
-
-            if numpy_mode:
-                not_allowed = ['','NA']
-                try: # if np_dtype does not except ''or 'NA' as a value
-                    np.dtype(np_dtype).type(not_allowed)
-                except ValueError:
-                    try:
-                        np.dtype(np_dtype).type('nan')
-                        line=[('nan' if i in not_allowed else i) for i in line] # '' or 'NA' are replaced with 'nan'
-                    except ValueError:
-                        pass
-        
-                
-            for j in range(hcols):
-                header_cols[j].append(line[j])
-
-            if numpy_mode:
-                data[r,:]=line[hcols:]
-
-                # enlarge data if needed
-                if(r==(data.shape[0]-1)):
-                    data=np.resize(data,(data.shape[0]+row_block_size,cols))
-                    rows=data.shape[0]
-
-            else:
-                data.append(line[hcols:]) 
-
-            r+=1
-
-            if (max_rows!=None and r>=max_rows):
-                break
-
-    rows=r
-
-    if numpy_mode:
-        data=np.resize(data,(rows,cols))
-
-    if (fh_from_filename):
-        original_fh.close()
-
-    if (hcols==1):
-        header_cols=header_cols[0]
-        
-    if (hrows==1):
-        header_rows=header_rows[0]
-
-    if(verbose):
-        sys.stderr.write("loaded matrix with dimensions ("+str(len(data))+","+str(cols)+")\n")
-    
-    
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    ndata_rows=data.shape[0]
-    ndata_cols=data.shape[1]
-    
-    if(nrows != ndata_rows):
-        sys.exit('header/data mismatch!')    
-    if(ncols != ndata_cols):
-        sys.exit('header/data mismatch!')    
-        
-    if (return_all or (hrows and hcols)):
-        return data,header_rows,header_cols
-    if(hrows):
-        return data,header_rows
-    if(hcols):
-        return data,header_cols
-
-    
-    return data
-
 def check_options():
     ''' Checks the options to the program '''
 
@@ -22,13 +22,18 @@ import scipy as sp
 from  collections import *
 
 # user defined modules
-from noamlib  import *
+from cworld.matrix import load_matrix,matrix_name
+from cworld.cache import DEFAULT_CACHE_SIZE
+from cworld.header import HeaderTable
+from cworld.track import format_column,round_column,write_columns
+from cworld.sparse import SparseMatrix,sparse_corrcoef
+from cworld.expected import observed_over_expected
+from cworld.genedensity import gene_density
 
 # For eigenvectors and eigenvalues
+import scipy.sparse.linalg
 from scipy import linalg as la
 from math import cos,log,sin,sqrt 
-# deprecated from scipy to be replaced with Cython:
-from scipy import weave 
 
 def main():
     print("")
@@ -38,43 +43,27 @@ def main():
 
     # Store the variables
     inputMatrix = args.inputMatrix
+    sparse = args.sparse
+    cache_dir = args.cache_dir
+    cache_size = args.cache_size
         
     if not os.path.isfile(inputMatrix):
         sys.exit('invalid input file! (non-existant)')
         
     print("inputMatrix",inputMatrix)
-    inputMatrix_name=os.path.basename(inputMatrix)
-    inputMatrix_name=re.sub(".gz", "", inputMatrix_name)    
-    inputMatrix_name=re.sub(".matrix", "", inputMatrix_name)
+    inputMatrix_name=matrix_name(inputMatrix)
     print("inputMatrix_name",inputMatrix_name)
     
     print("loading matrix ... ",end="")
-    if inputMatrix.endswith('.gz'):
-        infh=gzip.open(inputMatrix,'r')
-    else:
-        infh=open(inputMatrix,'r')
-   
-    matrix,header_rows,header_cols = load_matrix((l for l in infh if not l.startswith('#')), hrows=1, hcols=1) # since this returns data, header_rows and header_cols
-    infh.close()
+    matrix,header_rows,header_cols = load_matrix(inputMatrix, hrows=1, hcols=1, cache_dir=cache_dir, cache_size=cache_size, sparse=sparse) # since this returns data, header_rows and header_cols
     print("done")
     
     print("")
     if(len(header_rows) != len(header_cols)):
         sys.exit('non-symmetrical matrix!')
     
-    assembly=None
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        if assembly==None:
-            assembly=genome
-        else:
-            if assembly!=genome:
-                sys.exit('assembly/genome is not constant!')
-            assembly=genome
+    header_table=HeaderTable(header_rows)
+    assembly=header_table.assembly()
 
     print("matrix assembly:",assembly)
     refSeqDir="/cShare/tools/geneDensity/"
@@ -94,24 +83,35 @@ def main():
     
     # find nan rows
     print("finding nan rows ... ",end="")
-    nan_rowcols=np.sum(np.isnan(matrix),0)==matrix.shape[0]
-    # remove nan rows
-    matrix=matrix[-nan_rowcols,:][:,-nan_rowcols]
+    if sparse:
+        nan_rowcols=matrix.nan_cols
+        # remove nan rows
+        matrix=matrix.submatrix(~nan_rowcols,~nan_rowcols)
+    else:
+        nan_rowcols=np.sum(np.isnan(matrix),0)==matrix.shape[0]
+        # remove nan rows
+        matrix=matrix[~nan_rowcols,:][:,~nan_rowcols]
     print("done")
     
     # convert all nan to 0
     print("converting all 2D nan to 0 ... ",end="")
-    matrix = np.nan_to_num(matrix)
+    if sparse:
+        matrix = matrix.nan_to_num()
+    else:
+        matrix = np.nan_to_num(matrix)
     print("done")
     
-    # calculate obs/exp matrix
+    # calculate obs/exp matrix (log-binned distance bands, see cworld.expected)
     print("calculating obs/exp ... ",end="")
-    matrix = observedOverExpected(matrix)
+    matrix = observed_over_expected(matrix)
     print("done")
     
     # calculate corrcoef matrix
     print("calculating coorcoef ... ",end="")
-    matrix = np.corrcoef(matrix)
+    if sparse:
+        matrix = sparse_corrcoef(matrix)
+    else:
+        matrix = np.corrcoef(matrix)
     print("done")
     
     # do eigenvector analysis
@@ -132,18 +132,13 @@ def main():
     egv2[~nan_rowcols]=eig2
     egv3[~nan_rowcols]=eig3
 
-    geneDensity=np.nan*np.ones(nrows)
-    
     compartmentFile=inputMatrix_name+".compartments"    
-    writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,compartmentFile)
     
     print("intersecing compartments with ref seq ... ",end="")
-    compartmentRefSeqFile=compartmentFile+".refSeq.txt"
-    os.system("bedtools intersect -a "+compartmentFile+" -b "+refSeqFile+" -c > "+compartmentRefSeqFile)
+    geneDensity=gene_density(header_table,refSeqFile,cache_dir=cache_dir,cache_size=cache_size)
     print("done")
     
-    eigenMultiplier,geneDensity = detectActiveCompartment(compartmentRefSeqFile)
-    os.system("rm "+compartmentRefSeqFile)
+    eigenMultiplier = detectActiveCompartment(egv1,geneDensity)
 
     print("flipping vectors by",eigenMultiplier," ... ",end="")
     egv1 *= eigenMultiplier
@@ -151,10 +146,10 @@ def main():
     egv3 *= eigenMultiplier
     print("done")
     
-    writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,compartmentFile)
+    writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,compartmentFile,header_table=header_table)
     
     eig1BedGraphFile=inputMatrix_name+".eigen1.bedGraph"    
-    writeBedGraphFile(egv1,header_rows,inputMatrix_name,eig1BedGraphFile)
+    writeBedGraphFile(egv1,header_rows,inputMatrix_name,eig1BedGraphFile,header_table=header_table)
     
     print("drawing plot (",inputMatrix_name,") ... ",end="")
     drawPlot = "/cShare/tools/Rscripts/plotEigen.R"
@@ -163,38 +158,33 @@ def main():
     
     print("")
 
-def writeBedGraphFile(egv1,header_rows,name,outfile):
+def writeBedGraphFile(egv1,header_rows,name,outfile,header_table=None):
     "write the compartment file"
     
+    if header_table == None:
+        header_table=HeaderTable(header_rows)
+    
     print("writing bed graph file (",outfile,") ... ",end="")
     
-    yBound=np.nanmax(abs(np.nanmin(egv1)),np.nanmax(egv1))
+    yBound=np.nanmax([abs(np.nanmin(egv1)),np.nanmax(egv1)])
     yBound *= 1.25
     yBound=round(yBound,5)
     
     out_fh=open(outfile,"w")
     print("track type=bedGraph name='"+name+"' description='"+name+"' visibility=full autoScale=off viewLimits="+str(-yBound)+":"+str(yBound)+" color=0,0,0 altColor=100,100,100",end="\n",file=out_fh)
 
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        
-        chr_id=chr_id.split("-")[0]
-        
-        eigen1=round(egv1[i],5)
-        
-        print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(eigen1),end="\n",file=out_fh)
+    write_columns(out_fh,[format_column(header_table.chromosomes(degroup=True)),format_column(header_table['start']),format_column(header_table['end']),format_column(round_column(egv1,5))])
   
     out_fh.close()
     print("done")
 
   
-def writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,outfile):
+def writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,outfile,header_table=None):
     "write the compartment file"
     
+    if header_table == None:
+        header_table=HeaderTable(header_rows)
+    
     nan_geneDensity=np.sum(np.isnan(geneDensity))
     
     out_fh=open(outfile,"w")
@@ -205,62 +195,29 @@ def writeCompartmentFile(egv1,egv2,egv3,geneDensity,header_rows,outfile):
     else:
         print("#chr\tstart\tend\tname\tindex\teigen1\teigen2\teigen3\tgeneDensity",end="\n",file=out_fh)
         
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        
-        eigen1=egv1[i]
-        eigen2=egv2[i]
-        eigen3=egv3[i]
-        
-        if len(geneDensity)==nan_geneDensity:
-            print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(header)+"\t"+str(i)+"\t"+str(eigen1)+"\t"+str(eigen2)+"\t"+str(eigen3),end="\n",file=out_fh)
-        else:
-            nGenes=geneDensity[i]
-            print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(header)+"\t"+str(i)+"\t"+str(eigen1)+"\t"+str(eigen2)+"\t"+str(eigen3)+"\t",str(nGenes),end="\n",file=out_fh)
+    columns=[format_column(header_table.chromosomes()),format_column(header_table['start']),format_column(header_table['end']),format_column(header_rows),format_column(range(len(header_rows))),format_column(egv1),format_column(egv2),format_column(egv3)]
+    if len(geneDensity)!=nan_geneDensity:
+        # the gene density is separated by a tab and a space
+        columns.append([" "+n for n in format_column(geneDensity)])
+    
+    write_columns(out_fh,columns)
     
     out_fh.close()
     print("done")
     
-def detectActiveCompartment(file):
+def detectActiveCompartment(egv1,geneDensity):
     "detect the active compartment - overlap +/- with gene density"
     eigenMultiplier=1
     
-    infh=open(file,'r')
-    #chr    start   end     name    eigen1  eigen2  eigen3 geneCount    
-    
-    geneDensity=[]
-    
-    posSum=0
-    posCount=0
-    negSum=0
-    negCount=0
-    
-    for i,x in enumerate(infh):
-        a=x.rstrip("\n").split("\t")
-        
-        nGenes=float(a[8])
-        geneDensity.append(nGenes)
-        
-        if a[5] == 'nan':
-            continue
-        
-        eigen1=float(a[5])
-        
-        # skip eigen == 0
-        
-        if eigen1 > 0:
-            posSum += (nGenes*abs(eigen1))
-            posCount += 1
-            
-        if eigen1 < 0:
-            negSum += (nGenes*abs(eigen1))
-            negCount += 1
-        
+    # skip eigen == nan/0, sums are accumulated in bin order
+    with np.errstate(invalid='ignore'):
+        pos=egv1 > 0
+        neg=egv1 < 0
     
+    posSum=sum((geneDensity[pos]*np.abs(egv1[pos])).tolist())
+    posCount=int(np.sum(pos))
+    negSum=sum((geneDensity[neg]*np.abs(egv1[neg])).tolist())
+    negCount=int(np.sum(neg))
     
     posAvg=1
     if posCount > 0:
@@ -280,7 +237,7 @@ def detectActiveCompartment(file):
     #print("\tnegAvg",negAvg)
     #print("\teigenMultiplier",eigenMultiplier)
     
-    return eigenMultiplier,geneDensity
+    return eigenMultiplier
     
 def calculate_eigen(A, numPCs = 3):
     """performs eigen vector analysis, and returns 3 best principal components
@@ -291,78 +248,6 @@ def calculate_eigen(A, numPCs = 3):
     [latent,coeff] =  scipy.sparse.linalg.eigsh(covM,numPCs)
     return (np.transpose(coeff[:,::-1]),latent[::-1])
 
-def observedOverExpected(matrix):
-    "Calculates observedOverExpected of any contact map"
-    data = np.asarray(matrix, dtype = float, order = "C")
-    N = data.shape[0]
-    bins = logbins(1,N,1.2)
-    bins = [(0,1)] + [(bins[i],bins[i+1]) for i in xrange(len(bins)-1)]
-    bins = np.array(bins,order = "C")
-    M = len(bins)
-    code = r"""
-    #line 50 "binary_search.py"
-    using namespace std;
-    for (int bin = 0; bin < M; bin++)
-    {
-        int start = bins[2 * bin];
-        int end = bins[2 * bin + 1];
-        
-        double ss = 0 ;
-        int count   = 0 ;  
-        for (int offset = start; offset < end; offset ++)
-        {
-            for (int j = 0; j < N - offset; j++)
-            {
-                ss += data[(offset + j) * N + j];
-                count += 1;                            
-            }
-        }
-        double meanss = ss / count;
-        //printf("%lf\n",meanss); 
-        for (int offset = start; offset < end; offset ++)
-        {
-            for (int j = 0; j < N - offset; j++)
-            {
-                if (meanss !=  0)
-                {
-                    data[(offset + j) * N + j] /= meanss;                                                             
-                    if (offset > 0) {data[(offset + j)  + j*N] /= meanss;}
-                }
-            }
-        }
-    }
-    
-    """
-    support = """
-    #include <math.h>  
-    """
-    weave.inline(code, ['data', 'bins' , 'N' ,'M'], extra_compile_args=['-march=native -malign-double -O3'],support_code =support )
-    return data
-
-def logbins(a, b, pace, N_in=0):
-    "create log-spaced bins"
-    a = int(a)
-    b = int(b) 
-    beg = log(a)
-    end = log(b - 1)
-    pace = log(pace)
-    N = int((end - beg) / pace)
-     
-    if N > 0.8 * (b-a): 
-        return np.arange(a,b+1)
-    
-    if N_in != 0: N = N_in  
-    pace = (end - beg) / N
-    mas = np.arange(beg, end + 0.000000001, pace)
-    ret = np.exp(mas)
-    ret = np.array([int(i) for i in ret])
-    ret[-1] = b 
-    for i in xrange(len(ret) - 1):
-        if ret[i + 1] <= ret[i]:
-            ret[i + 1: - 1] += 1
-    return [int(i) for i in ret]
-
-
 def check_options():
     ''' Checks the options to the program '''
 
@@ -372,6 +257,9 @@ def check_options():
 
     # Add arguments 
     parser.add_argument('-i' , metavar='--inputMatrix'  , help="*Input matrix file", dest="inputMatrix", type=str, default="")
+    parser.add_argument('--sparse' , help="hold the matrix in sparse (CSR) storage", dest="sparse", action='store_true')
+    parser.add_argument('--cache' , help="binary matrix cache directory (opt-in), parsed matrices and binned gene density tracks are re-used across runs", dest="cache_dir", type=str, default=None)
+    parser.add_argument('--cachesize' , help="max size of the matrix/gene density cache (MB)", dest="cache_size", type=int, default=DEFAULT_CACHE_SIZE)
     
     # Parse command line with parse_args and store it in an object
     args = parser.parse_args()
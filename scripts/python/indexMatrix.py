@@ -0,0 +1,88 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: indexMatrix.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path
+import sys
+import gzip
+import shutil
+
+# user defined modules
+from cworld.bgzf import is_bgzf,bgzf_open,DEFAULT_COMPRESSION_LEVEL
+from cworld.index import index_matrix,matrix_index_file
+
+def main():
+
+    parser=argparse.ArgumentParser(description='write a random-access row index (.idx) for a block gzipped my5C matrix (matrix.gz)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, required=True, help='interaction matrix (my5C, block gzipped) file')
+    parser.add_argument('--reblock', dest='reblock', action='store_true', help='re-compress a plain gzipped matrix as block gzip (in place) before indexing')
+    parser.add_argument('--threads', dest='threads', type=int, default=1, help='number of threads used to compress the re-blocked matrix')
+    parser.add_argument('--level', dest='compresslevel', type=int, default=DEFAULT_COMPRESSION_LEVEL, choices=range(1,10), metavar='[1-9]', help='gzip compression level of the re-blocked matrix')
+    parser.add_argument('-v', '--verbose', dest='verbose',  action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    reblock=args.reblock
+    threads=args.threads
+    compresslevel=args.compresslevel
+    verbose=args.verbose
+
+    log_level = logging.WARNING
+    if verbose == 1:
+        log_level = logging.INFO
+    elif verbose >= 2:
+        log_level = logging.DEBUG
+    logging.basicConfig(level=log_level)
+
+    if not os.path.isfile(inputMatrix):
+        sys.exit('invalid input file! (non-existant)')
+    if not inputMatrix.endswith('.gz'):
+        sys.exit('invalid input file! (must be a gzipped matrix - matrix.gz)')
+
+    print("inputMatrix",inputMatrix)
+
+    print("")
+
+    if not is_bgzf(inputMatrix):
+        if not reblock:
+            sys.exit('input matrix is not block gzipped! (re-write it with a cworld tool, or use --reblock)')
+
+        print("re-blocking matrix ... ",end="")
+        reblock_matrix(inputMatrix,compresslevel,threads)
+        print("done")
+
+    print("indexing matrix ... ",end="")
+    index_matrix(inputMatrix)
+    print("done")
+
+    print("index",matrix_index_file(inputMatrix))
+
+    print("")
+
+def reblock_matrix(matrixFile,compresslevel,threads):
+    """re-compress a plain gzipped file as block gzip, through a temporary file renamed into place
+    """
+
+    tmpFile=matrixFile+'.reblock.tmp'
+
+    in_fh=gzip.open(matrixFile,'rb')
+    out_fh=bgzf_open(tmpFile,'wb',compresslevel=compresslevel,threads=threads)
+    shutil.copyfileobj(in_fh,out_fh,4*1024*1024)
+    out_fh.close()
+    in_fh.close()
+
+    os.rename(tmpFile,matrixFile)
+
+if __name__=="__main__":
+      main()
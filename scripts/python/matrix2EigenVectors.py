@@ -20,6 +20,11 @@ import os
 import math
 import uuid
 import socket
+import multiprocessing
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
 from datetime import datetime
 
 import numpy as np
@@ -32,6 +37,17 @@ from math import cos,log,sin,sqrt
 from sklearn.decomposition import PCA
 from sklearn import decomposition
 
+# user defined modules
+from cworld.matrix import load_matrix,writeMatrix,matrix_name,cis_blocks
+from cworld.cache import DEFAULT_CACHE_SIZE
+from cworld.bgzf import bgzf_open,DEFAULT_COMPRESSION_LEVEL
+from cworld.header import HeaderTable
+from cworld.track import format_column,round_column,write_columns
+from cworld.sparse import sparse_corrcoef
+from cworld.eigen import truncated_pca,correlation_pca,CorrelationOperator,ExpandedMatrix
+from cworld.genedensity import gene_density
+from cworld.plot import plotting_available,plot_eigen,plot_evr
+
 # HAS BEEN COMMENTED LONG BEFORE 2017
 # For eigenvectors and eigenvalues
 #from scipy.stats.stats import nanmean
@@ -49,6 +65,21 @@ def main():
     parser.add_argument('-i', '--input', dest='inputMatrix', type=str, required=True, help='interaction matrix hdf5 file')
     parser.add_argument('-r', '--refseq', dest='refSeqFile', type=str, required=True, help='refseq file to calculate gene density per bin/PC')
     parser.add_argument('-v', '--verbose', dest='verbose', action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--cache', dest='cache_dir', type=str, default=None, help='binary matrix cache directory (opt-in), parsed matrices and binned gene density tracks are re-used across runs')
+    parser.add_argument('--cachesize', dest='cache_size', type=int, default=DEFAULT_CACHE_SIZE, help='max size of the matrix/gene density cache (MB)')
+    parser.add_argument('--sparse', dest='sparse', action='store_true', help='hold the matrix in sparse (CSR) storage - memory scales with the number of contacts')
+    parser.add_argument('--bin', dest='output_binary', action='store_true', help='write output matrices in the binary matrix format (.matrix.bin, see matrix2bin.py) instead of .matrix.gz')
+    parser.add_argument('--hdf5', dest='output_hdf5', action='store_true', help='write output matrices as chunked, compressed HDF5 (.hdf5, see matrix2hdf5.py) instead of .matrix.gz')
+    parser.add_argument('--threads', dest='threads', type=int, default=1, help='number of threads used to compress output matrices')
+    parser.add_argument('--level', dest='compresslevel', type=int, default=DEFAULT_COMPRESSION_LEVEL, choices=range(1,10), metavar='[1-9]', help='gzip compression level of output matrices')
+    parser.add_argument('--index', dest='write_index', action='store_true', help='write a random-access row index (.idx) next to each output matrix, see indexMatrix.py')
+    parser.add_argument('--noplot', dest='no_plot', action='store_true', help='do not draw the eigenvector and evr plots')
+    parser.add_argument('--eigen', dest='eigen_solver', type=str, default='pca', choices=['pca','topk','implicit'], help='pca = sklearn PCA (100 components), topk = only the leading --npc eigenvectors (ARPACK, see cworld.eigen), implicit = topk without forming the correlation matrix')
+    parser.add_argument('--npc', dest='num_pcs', type=int, default=3, help='number of principal components computed by --eigen topk/implicit (>= 3)')
+    parser.add_argument('--tol', dest='eigen_tol', type=float, default=0, help='relative tolerance of the --eigen topk/implicit eigenvectors (0 = machine precision)')
+    parser.add_argument('--seed', dest='eigen_seed', type=int, default=0, help='seed of the --eigen topk/implicit start vector')
+    parser.add_argument('--cis', dest='cis', action='store_true', help='call compartments per chromosome (cis blocks), oriented by the gene density of each chromosome, into one .compartments/.eigen1.bedGraph (and a .cis.evr.txt, one evr column per chromosome) - no correlation matrices or plots are written (--noplot is implied, --bin/--hdf5/--index/--threads/--level are rejected) and --cache only caches the gene density track, the cis blocks are read uncached')
+    parser.add_argument('--processes', dest='processes', type=int, default=1, help='number of chromosomes decomposed in parallel (worker processes) by --cis, memory is bounded by the cis blocks being decomposed')
     parser.add_argument('--version', action='version', version='%(prog)s 1.0')
     
     args=parser.parse_args()
@@ -56,6 +87,35 @@ def main():
     inputMatrix=args.inputMatrix
     refSeqFile=args.refSeqFile
     verbose=args.verbose
+    cache_dir=args.cache_dir
+    cache_size=args.cache_size
+    sparse=args.sparse
+    output_binary=args.output_binary
+    output_hdf5=args.output_hdf5
+    threads=args.threads
+    compresslevel=args.compresslevel
+    write_index=args.write_index
+    no_plot=args.no_plot
+    eigen_solver=args.eigen_solver
+    num_pcs=args.num_pcs
+    eigen_tol=args.eigen_tol
+    eigen_seed=args.eigen_seed
+    cis=args.cis
+    processes=args.processes
+
+    if output_binary and output_hdf5:
+        sys.exit('choose one of --bin or --hdf5!')
+    if num_pcs < 3:
+        sys.exit('--npc must be >= 3!')
+    if processes < 1:
+        sys.exit('--processes must be >= 1!')
+    if cis and sparse:
+        sys.exit('--cis cannot be combined with --sparse!')
+    if cis and (output_binary or output_hdf5 or write_index or threads != 1 or compresslevel != DEFAULT_COMPRESSION_LEVEL):
+        sys.exit('--cis writes no correlation matrices, it cannot be combined with --bin, --hdf5, --index, --threads or --level!')
+    matrix_ext='.matrix.bin' if output_binary else '.matrix.gz'
+    if output_hdf5:
+        matrix_ext='.hdf5'
     
     log_level = logging.WARNING
     if verbose == 1:
@@ -73,74 +133,40 @@ def main():
     scriptPath=os.path.realpath(__file__)
     scriptPath="/".join(scriptPath.split("/")[0:-2])
     
-    inputMatrix_name=os.path.basename(inputMatrix)
-    inputMatrix_name=re.sub(".gz", "", inputMatrix_name)    
-    inputMatrix_name=re.sub(".matrix", "", inputMatrix_name)
+    inputMatrix_name=matrix_name(inputMatrix)
+    
+    try:
+        with input_wrapper(refSeqFile) as rsfh:
+            pass
+    except IOError as e:
+        sys.exit("invalid refSeq file! ("+refSeqFile+")")
     
     verboseprint("",file=sys.stderr)
     
-    verboseprint("loading matrix ... ",end="",file=sys.stderr)
-    infh=input_wrapper(inputMatrix)
+    if cis:
+        cis_compartment_analysis(inputMatrix,inputMatrix_name,refSeqFile,processes=processes,cache_dir=cache_dir,cache_size=cache_size,eigen_options=(eigen_solver,num_pcs,eigen_tol,eigen_seed))
+        return
     
-    matrix,header_rows,header_cols = load_matrix((l for l in infh if not l.startswith('#')), hrows=1, hcols=1) # since this returns data, header_rows and header_cols
-    infh.close()
+    verboseprint("loading matrix ... ",end="",file=sys.stderr)
+    matrix,header_rows,header_cols = load_matrix(inputMatrix, hrows=1, hcols=1, cache_dir=cache_dir, cache_size=cache_size, sparse=sparse) # since this returns data, header_rows and header_cols
+    header_rows=np.asarray(header_rows)
+    header_cols=np.asarray(header_cols)
     verboseprint("done",file=sys.stderr)
     
     verboseprint("",file=sys.stderr)
     if(len(header_rows) != len(header_cols)):
         sys.exit('non-symmetrical matrix!')
     
-    assembly=None
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        if assembly==None:
-            assembly=genome
-        else:
-            if assembly!=genome:
-                sys.exit('assembly/genome is not constant!')
-            assembly=genome
-            
-    try:
-        with input_wrapper(refSeqFile) as rsfh:
-            pass
-    except IOError as e:
-        sys.exit("invalid refSeq file! ("+refSeqFile+")")
+    header_table=HeaderTable(header_rows)
+    assembly=header_table.assembly()
     
     # get number of rows/col (assuming symmetrical)
     nrows=matrix.shape[0]
     ncols=matrix.shape[1]
     
-    # find nan rows
-    verboseprint("finding nan rows ... ",end="",file=sys.stderr)
-    nan_rowcols = np.sum(np.isnan(matrix),0)==matrix.shape[0]
+    pca_score,pca_v,nan_rowcols,corrMatrix = calculate_compartment_eigen(matrix, sparse=sparse, eigen_solver=eigen_solver, num_pcs=num_pcs, tol=eigen_tol, seed=eigen_seed)
     valid_rowcols=np.invert(nan_rowcols)
     
-    # remove nan rows
-    # numpy negation with "~" more common, "-" deprecated
-    matrix=matrix[~nan_rowcols,:][:,~nan_rowcols]
-    verboseprint("done",file=sys.stderr)
-    
-    # convert all nan to 0
-    verboseprint("converting all 2D nan to 0 ... ",end="",file=sys.stderr)
-    matrix = np.nan_to_num(matrix)
-    verboseprint("done",file=sys.stderr)
-    
-    # calculate corrcoef matrix
-    verboseprint("calculating coorcoef ... ",end="",file=sys.stderr)
-    corrMatrix = np.corrcoef(matrix)
-    verboseprint("done",file=sys.stderr)
-    
-    verboseprint("")
-    
-    # do eigenvector analysis
-    verboseprint("running PCA ... ",end="",file=sys.stderr)
-    pca_score,pca_v = calculate_eigen(corrMatrix, 3)
-    verboseprint("done",file=sys.stderr)
-    
     verboseprint("\teigen1","{:.12%}".format(pca_score[0]))
     verboseprint("\teigen2","{:.12%}".format(pca_score[1]))
     verboseprint("\teigen3","{:.12%}".format(pca_score[2]))
@@ -160,20 +186,13 @@ def main():
     egv2[~nan_rowcols]=eig2
     egv3[~nan_rowcols]=eig3
 
-    geneDensity=np.nan*np.ones(nrows)
-    
     compartmentFile=inputMatrix_name+".compartments"    
-    writeCompartmentFile(egv1,egv2,egv3,pca_score[0:3],geneDensity,header_rows,compartmentFile)
-    
-    verboseprint("")
     
     verboseprint("intersecing compartments with ref seq ... ",end="",file=sys.stderr)
-    compartmentRefSeqFile=compartmentFile+".refSeq.txt"
-    os.system("bedtools intersect -a "+compartmentFile+" -b "+refSeqFile+" -c > "+compartmentRefSeqFile)
+    geneDensity=gene_density(header_table,refSeqFile,cache_dir=cache_dir,cache_size=cache_size)
     verboseprint("done",file=sys.stderr)
     
-    eigenMultiplier,geneDensity = detectActiveCompartment(compartmentRefSeqFile)
-    #os.system("rm "+compartmentRefSeqFile)
+    eigenMultiplier = detectActiveCompartment(egv1,geneDensity)
 
     verboseprint("\tflipping vectors by",eigenMultiplier," ... ",end="",file=sys.stderr)
     egv1 *= eigenMultiplier
@@ -183,41 +202,190 @@ def main():
     
     verboseprint("")
     
-    writeCompartmentFile(egv1,egv2,egv3,pca_score[0:3],geneDensity,header_rows,compartmentFile)
+    writeCompartmentFile(egv1,egv2,egv3,pca_score[0:3],geneDensity,header_rows,compartmentFile,header_table=header_table)
     
     eig1BedGraphFile=inputMatrix_name+".eigen1.bedGraph"    
-    writeBedGraphFile(egv1,pca_score[0],header_rows,inputMatrix_name,eig1BedGraphFile)
+    writeBedGraphFile(egv1,pca_score[0],header_rows,inputMatrix_name,eig1BedGraphFile,header_table=header_table)
     
-    verboseprint("drawing eigen plot (",inputMatrix_name,") ... ",end="",file=sys.stderr)
-    eigenPlot = scriptPath+"/R/plotEigen.R"
-    os.system("Rscript "+eigenPlot+" `pwd` "+compartmentFile+" "+inputMatrix_name+" > /dev/null")
-    verboseprint("done",file=sys.stderr)
+    if not no_plot:
+        verboseprint("drawing eigen plot (",inputMatrix_name,") ... ",end="",file=sys.stderr)
+        if plotting_available():
+            plot_eigen(compartmentFile,inputMatrix_name,np.arange(nrows),egv1,egv2,egv3,pca_score,geneDensity)
+        else:
+            eigenPlot = scriptPath+"/R/plotEigen.R"
+            os.system("Rscript "+eigenPlot+" `pwd` "+compartmentFile+" "+inputMatrix_name+" > /dev/null")
+        verboseprint("done",file=sys.stderr)
     
-    verboseprint("drawing evr plot (",inputMatrix_name,") ... ",end="",file=sys.stderr)
     evrFile=inputMatrix_name+".evr.txt"    
     writePCAevr(pca_score,evrFile)
-    evrPlot = scriptPath+"/R/plotEVR.R"
-    os.system("Rscript "+evrPlot+" `pwd` "+evrFile+" "+inputMatrix_name+" > /dev/null")
-    verboseprint("done",file=sys.stderr)
+    if not no_plot:
+        verboseprint("drawing evr plot (",inputMatrix_name,") ... ",end="",file=sys.stderr)
+        if plotting_available():
+            plot_evr(evrFile,pca_score)
+        else:
+            evrPlot = scriptPath+"/R/plotEVR.R"
+            os.system("Rscript "+evrPlot+" `pwd` "+evrFile+" "+inputMatrix_name+" > /dev/null")
+        verboseprint("done",file=sys.stderr)
     
-    collapsed_corrMatrixFile=inputMatrix_name+'.collapsed.correlation.matrix.gz'
+    collapsed_corrMatrixFile=inputMatrix_name+'.collapsed.correlation'+matrix_ext
     verboseprint("writing collapsed_corrcoef matrix ...",end="",file=sys.stderr)
-    writeMatrix(header_rows[np.where(valid_rowcols)],header_cols[np.where(valid_rowcols)],corrMatrix,collapsed_corrMatrixFile)
+    writeMatrix(header_rows[np.where(valid_rowcols)],header_cols[np.where(valid_rowcols)],corrMatrix,collapsed_corrMatrixFile,open_func=lambda f: output_wrapper(f,compresslevel=compresslevel,threads=threads),index=write_index)
     verboseprint("done",file=sys.stderr)
     
-    valid_rowcols=np.c_[valid_rowcols].T
-    expanded_corrMatrix=np.zeros([nrows,ncols])
-    expanded_corrMatrix.fill(np.nan)
-    expanded_corrMatrix[np.where(valid_rowcols&valid_rowcols.T)]=corrMatrix.flatten()
+    # nan rows/cols are re-inserted block by block, as the matrix is written
+    expanded_corrMatrix=ExpandedMatrix(corrMatrix,valid_rowcols,valid_rowcols)
     
-    corrMatrixFile=inputMatrix_name+'.correlation.matrix.gz'
+    corrMatrixFile=inputMatrix_name+'.correlation'+matrix_ext
     verboseprint("writing corrcoef matrix ...",end="",file=sys.stderr)
-    writeMatrix(header_rows,header_cols,expanded_corrMatrix,corrMatrixFile)
+    writeMatrix(header_rows,header_cols,expanded_corrMatrix,corrMatrixFile,open_func=lambda f: output_wrapper(f,compresslevel=compresslevel,threads=threads),index=write_index)
     verboseprint("done",file=sys.stderr)
     
     verboseprint("",file=sys.stderr)
 
 
+def cis_compartment_analysis(inputMatrix,inputMatrix_name,refSeqFile,processes=1,cache_dir=None,cache_size=DEFAULT_CACHE_SIZE,eigen_options=('pca',3,0,0)):
+    """compartments of every chromosome (cis block) of a genome-wide matrix, each oriented by its own gene density,
+    merged into one .compartments, .eigen1.bedGraph and .cis.evr.txt (one evr column per chromosome)
+    """
+    
+    verboseprint("decomposing cis blocks (",processes,"processes ) ... ",file=sys.stderr)
+    results=cis_compartment_eigen(inputMatrix,processes=processes,eigen_options=eigen_options)
+    verboseprint("done",file=sys.stderr)
+    
+    verboseprint("",file=sys.stderr)
+    
+    chrs=[]
+    header_rows=[]
+    chr_egvs=[]
+    chr_evrs=[]
+    chr_evr_rows=[]
+    for chr_id,headers,pca_score,pca_v,nan_rowcols in results:
+        nbins=len(headers)
+        egv=np.nan*np.ones((3,nbins))
+        evr=np.nan*np.ones(3)
+        if pca_v is None:
+            verboseprint("\t",chr_id,"skipped, too few valid bins",file=sys.stderr)
+        else:
+            egv[:,~nan_rowcols]=pca_v
+            evr=np.asarray(pca_score[0:3],dtype=np.float64)
+            verboseprint("\t",chr_id,"eigen1","{:.12%}".format(evr[0]),"eigen2","{:.12%}".format(evr[1]),"eigen3","{:.12%}".format(evr[2]),file=sys.stderr)
+        
+        chrs.append(chr_id)
+        header_rows += list(headers)
+        chr_egvs.append(egv)
+        chr_evrs.append(evr)
+        chr_evr_rows.append(np.repeat(evr[:,None],nbins,axis=1))
+    
+    header_table=HeaderTable(header_rows)
+    egv1,egv2,egv3=np.concatenate(chr_egvs,axis=1)
+    evr_rows=np.concatenate(chr_evr_rows,axis=1)
+    
+    verboseprint("",file=sys.stderr)
+    
+    verboseprint("intersecing compartments with ref seq ... ",end="",file=sys.stderr)
+    geneDensity=gene_density(header_table,refSeqFile,cache_dir=cache_dir,cache_size=cache_size)
+    verboseprint("done",file=sys.stderr)
+    
+    chr_offsets=np.r_[0,np.cumsum([egv.shape[1] for egv in chr_egvs])]
+    for chr_id,first,last in zip(chrs,chr_offsets[:-1],chr_offsets[1:]):
+        verboseprint("\t",chr_id,file=sys.stderr)
+        eigenMultiplier = detectActiveCompartment(egv1[first:last],geneDensity[first:last])
+        egv1[first:last] *= eigenMultiplier
+        egv2[first:last] *= eigenMultiplier
+        egv3[first:last] *= eigenMultiplier
+    
+    verboseprint("",file=sys.stderr)
+    
+    compartmentFile=inputMatrix_name+".compartments"
+    writeCompartmentFile(egv1,egv2,egv3,evr_rows,geneDensity,header_rows,compartmentFile,header_table=header_table)
+    
+    eig1BedGraphFile=inputMatrix_name+".eigen1.bedGraph"
+    writeBedGraphFile(egv1,None,header_rows,inputMatrix_name,eig1BedGraphFile,header_table=header_table)
+    
+    # one evr column per chromosome - not the .evr.txt (eigenvector, evr) layout
+    evrFile=inputMatrix_name+".cis.evr.txt"
+    writeCisPCAevr(chrs,chr_evrs,evrFile)
+    
+    verboseprint("",file=sys.stderr)
+
+def cis_compartment_eigen(inputMatrix,processes=1,eigen_options=('pca',3,0,0)):
+    """[(chr_id, headers, pca_score, pca_v, nan_rowcols)] of every cis block, in matrix order (see calculate_compartment_eigen)
+    blocks are read one at a time and each is decomposed by a forked worker process, at most processes at a time
+    pca_score/pca_v are None for chromosomes with too few valid bins
+    """
+    
+    global _cis_block
+    
+    result_queue=multiprocessing.Queue()
+    workers=[]
+    chrs=[]
+    chr_headers={}
+    chr_results={}
+    
+    def collect_result():
+        while True:
+            try:
+                chr_id,result=result_queue.get(timeout=CIS_POLL_SECONDS)
+                break
+            except Empty:
+                # a worker killed before it reported (OOM, signal) never posts a result
+                for worker_chr_id,worker in zip(chrs,workers):
+                    if worker_chr_id not in chr_results and worker.exitcode not in (None,0):
+                        sys.exit('error decomposing '+worker_chr_id+'! (worker exited with code '+str(worker.exitcode)+')')
+        if not isinstance(result,tuple):
+            sys.exit('error decomposing '+chr_id+'! ('+result+')')
+        chr_results[chr_id]=result
+        verboseprint("\t",chr_id,"done",file=sys.stderr)
+    
+    for chr_id,headers,block in cis_blocks(inputMatrix):
+        if len(workers)-len(chr_results) >= processes:
+            collect_result()
+        
+        verboseprint("\t",chr_id,"(",len(headers),"bins )",file=sys.stderr)
+        chrs.append(chr_id)
+        chr_headers[chr_id]=headers
+        
+        # the worker inherits the block through fork (it is not pickled), the parent drops it once the worker runs
+        _cis_block=(chr_id,block)
+        worker=multiprocessing.Process(target=_cis_eigen_worker,args=(result_queue,eigen_options))
+        worker.daemon=True
+        worker.start()
+        workers.append(worker)
+        _cis_block=None
+        del block
+    
+    while len(chr_results) < len(workers):
+        collect_result()
+    for worker in workers:
+        worker.join()
+    
+    return [(chr_id,chr_headers[chr_id])+chr_results[chr_id] for chr_id in chrs]
+
+# cis block (chr_id, block) handed to the next forked worker
+_cis_block=None
+# seconds between checks for dead workers while waiting for a cis result
+CIS_POLL_SECONDS = 1
+
+def _cis_eigen_worker(result_queue,eigen_options):
+    """decompose the inherited cis block, put (chr_id, (pca_score, pca_v, nan_rowcols)) or (chr_id, error message) on result_queue"""
+    
+    global verboseprint
+    verboseprint=lambda *a, **k: None
+    
+    chr_id,block=_cis_block
+    eigen_solver,num_pcs,tol,seed=eigen_options
+    
+    try:
+        nan_rowcols=np.sum(np.isnan(block),0)==block.shape[0]
+        if np.sum(~nan_rowcols) <= num_pcs:
+            result_queue.put((chr_id,(None,None,nan_rowcols)))
+            return
+        
+        pca_score,pca_v,nan_rowcols,corrMatrix=calculate_compartment_eigen(block, eigen_solver=eigen_solver, num_pcs=num_pcs, tol=tol, seed=seed)
+        result_queue.put((chr_id,(np.asarray(pca_score[0:3]),np.asarray(pca_v[0:3]),nan_rowcols)))
+    except (Exception,SystemExit) as e:
+        result_queue.put((chr_id,str(e) or repr(e)))
+
 def writePCAevr(pca_score,outfile):
     out_fh=output_wrapper(outfile)
     print("eigenvector","\t","evr",sep="",file=out_fh)
@@ -227,10 +395,24 @@ def writePCAevr(pca_score,outfile):
     
     out_fh.close()
     
+def writeCisPCAevr(chrs,chr_pca_scores,outfile):
+    "write the evr of every chromosome (column)"
+    
+    out_fh=output_wrapper(outfile)
+    print("eigenvector","\t","\t".join(chrs),sep="",file=out_fh)
+    
+    for i in range(len(chr_pca_scores[0]) if len(chr_pca_scores) else 0):
+        print(i+1,"\t".join([str(pca_score[i]) for pca_score in chr_pca_scores]),sep="\t",file=out_fh)
+    
+    out_fh.close()
+    
         
-def writeBedGraphFile(egv1,evr,header_rows,name,outfile):
+def writeBedGraphFile(egv1,evr,header_rows,name,outfile,header_table=None):
     "write the compartment file"
     
+    if header_table == None:
+        header_table=HeaderTable(header_rows)
+    
     verboseprint("writing bed graph file (",outfile,") ... ",end="",file=sys.stderr)
     
     # "nanmax" expects iterable as 1st argument, second is axis
@@ -239,27 +421,22 @@ def writeBedGraphFile(egv1,evr,header_rows,name,outfile):
     yBound *= 1.25
     yBound=round(yBound,5)
     
+    # per chromosome (--cis) tracks have no single evr
+    track_name=name+"-evr:"+str(evr)+"%" if evr != None else name+"-cis"
+    
     out_fh=output_wrapper(outfile,suppress_comments=True)
-    print("track type=bedGraph name='"+name+"-evr:"+str(evr)+"%' description='"+name+"-evr:"+str(evr)+"%' maxHeightPixels=128:64:32 visibility=full autoScale=off viewLimits="+str(-yBound)+":"+str(yBound)+" color=0,255,0 altColor=255,0,0",end="\n",file=out_fh)
+    print("track type=bedGraph name='"+track_name+"' description='"+track_name+"' maxHeightPixels=128:64:32 visibility=full autoScale=off viewLimits="+str(-yBound)+":"+str(yBound)+" color=0,255,0 altColor=255,0,0",end="\n",file=out_fh)
 
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        
-        chr_id=chr_id.split("-")[0]
-        
-        eigen1=round(egv1[i],5)
-        
-        print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(eigen1),end="\n",file=out_fh)
+    write_columns(out_fh,[format_column(header_table.chromosomes(degroup=True)),format_column(header_table['start']),format_column(header_table['end']),format_column(round_column(egv1,5))])
   
     out_fh.close()
     verboseprint("done",file=sys.stderr)
     
-def writeCompartmentFile(egv1,egv2,egv3,pca_score,geneDensity,header_rows,outfile):
+def writeCompartmentFile(egv1,egv2,egv3,pca_score,geneDensity,header_rows,outfile,header_table=None):
     "write the compartment file"
+    
+    if header_table == None:
+        header_table=HeaderTable(header_rows)
         
     nan_geneDensity=np.sum(np.isnan(geneDensity))
     
@@ -271,62 +448,38 @@ def writeCompartmentFile(egv1,egv2,egv3,pca_score,geneDensity,header_rows,outfil
     else:
         print("#chr\tstart\tend\tname\tindex\teigen1\teigen1evr\teigen2\teigen2evr\teigen3\teigen3evr\tgeneDensity",end="\n",file=out_fh)
         
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        
-        eigen1=egv1[i]
-        eigen2=egv2[i]
-        eigen3=egv3[i]
-        
-        if len(geneDensity)==nan_geneDensity:
-            print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(header)+"\t"+str(i)+"\t"+str(eigen1)+"\t"+str(pca_score[0])+"\t"+str(eigen2)+"\t"+str(pca_score[1])+"\t"+str(eigen3)+"\t"+str(pca_score[2]),end="\n",file=out_fh)
+    nrows=len(header_rows)
+    columns=[format_column(header_table.chromosomes()),format_column(header_table['start']),format_column(header_table['end']),format_column(header_rows),format_column(range(nrows))]
+    for egv,score in zip([egv1,egv2,egv3],pca_score):
+        # the evr of the pc, or (--cis) the evr of every row
+        if np.ndim(score):
+            columns += [format_column(egv),format_column(score)]
         else:
-            nGenes=geneDensity[i]
-            print(str(chr_id)+"\t"+str(bin_start)+"\t"+str(bin_end)+"\t"+str(header)+"\t"+str(i)+"\t"+str(eigen1)+"\t"+str(pca_score[0])+"\t"+str(eigen2)+"\t"+str(pca_score[1])+"\t"+str(eigen3)+"\t"+str(pca_score[2])+"\t"+str(nGenes),end="\n",file=out_fh)
+            columns += [format_column(egv),[str(score)]*nrows]
+    if len(geneDensity)!=nan_geneDensity:
+        columns.append(format_column(geneDensity))
+    
+    write_columns(out_fh,columns)
     
     out_fh.close()
     
     verboseprint("done",file=sys.stderr)
     
-def detectActiveCompartment(file):
+def detectActiveCompartment(egv1,geneDensity):
     "detect the active compartment - overlap +/- with gene density"
         
     eigenMultiplier=1
     
-    infh=input_wrapper(file)
-    #chr    start   end     name    eigen1  eigen2  eigen3 geneCount    
-    
-    geneDensity=[]
+    # skip eigen == nan/0, sums are accumulated in bin order
+    with np.errstate(invalid='ignore'):
+        pos=egv1 > 0
+        neg=egv1 < 0
     
-    posSum=0
-    posCount=0
-    negSum=0
-    negCount=0
+    posSum=sum((geneDensity[pos]*np.abs(egv1[pos])).tolist())
+    posCount=int(np.sum(pos))
+    negSum=sum((geneDensity[neg]*np.abs(egv1[neg])).tolist())
+    negCount=int(np.sum(neg))
     
-    for i,x in enumerate(infh):
-        a=x.rstrip("\n").split("\t")
-        
-        nGenes=float(a[11])
-        geneDensity.append(nGenes)
-        
-        if a[5] == 'nan':
-            continue
-        
-        eigen1=float(a[5])
-        
-        # skip eigen == 0
-        if eigen1 > 0:
-            posSum += (nGenes*abs(eigen1))
-            posCount += 1
-            
-        if eigen1 < 0:
-            negSum += (nGenes*abs(eigen1))
-            negCount += 1
-            
     posAvg=1
     if posCount > 0:
         posAvg=(posSum/posCount)
@@ -341,11 +494,70 @@ def detectActiveCompartment(file):
     verboseprint("\tnegSum",negSum,"negCount",negCount,"negAvg",negAvg,file=sys.stderr)
     verboseprint("\teigenMultiplier",eigenMultiplier,file=sys.stderr)
     
-    return eigenMultiplier,geneDensity
+    return eigenMultiplier
+    
+def calculate_compartment_eigen(matrix, sparse=False, eigen_solver='pca', num_pcs=3, tol=0, seed=0):
+    """(pca_score, pca_v, nan_rowcols, corrMatrix) of a symmetric matrix - nan rows/cols are removed and nan set to 0
+    before the correlation matrix and its principal components are calculated (pca_v are the valid rows/cols only)
+    """
+    
+    # find nan rows
+    verboseprint("finding nan rows ... ",end="",file=sys.stderr)
+    if sparse:
+        nan_rowcols = matrix.nan_cols
+    else:
+        nan_rowcols = np.sum(np.isnan(matrix),0)==matrix.shape[0]
+    
+    # remove nan rows
+    # numpy negation with "~" more common, "-" deprecated
+    if sparse:
+        matrix=matrix.submatrix(~nan_rowcols,~nan_rowcols)
+    else:
+        matrix=matrix[np.ix_(~nan_rowcols,~nan_rowcols)]
+    verboseprint("done",file=sys.stderr)
+    
+    # convert all nan to 0
+    verboseprint("converting all 2D nan to 0 ... ",end="",file=sys.stderr)
+    if sparse:
+        matrix = matrix.nan_to_num()
+    else:
+        matrix = np.nan_to_num(matrix, copy=False)
+    verboseprint("done",file=sys.stderr)
     
-def calculate_eigen(A, numPCs = 3):
+    if eigen_solver == 'implicit':
+        # the correlation matrix is applied as products with the matrix (see cworld.eigen.CorrelationOperator)
+        # its rows are only computed block by block, when written
+        corrMatrix = CorrelationOperator(matrix)
+        verboseprint("running PCA (implicit corrcoef) ... ",end="",file=sys.stderr)
+        pca_score,pca_v = correlation_pca(corrMatrix, num_pcs, tol=tol, seed=seed)
+        pca_v = pca_v[0:3]
+        verboseprint("done",file=sys.stderr)
+    else:
+        # calculate corrcoef matrix
+        verboseprint("calculating coorcoef ... ",end="",file=sys.stderr)
+        if sparse:
+            corrMatrix = sparse_corrcoef(matrix)
+        else:
+            corrMatrix = np.corrcoef(matrix)
+        verboseprint("done",file=sys.stderr)
+        
+        verboseprint("")
+        
+        # do eigenvector analysis
+        verboseprint("running PCA ... ",end="",file=sys.stderr)
+        pca_score,pca_v = calculate_eigen(corrMatrix, num_pcs, eigen_solver=eigen_solver, tol=tol, seed=seed)
+        verboseprint("done",file=sys.stderr)
+    
+    return pca_score,pca_v,nan_rowcols,corrMatrix
+    
+def calculate_eigen(A, numPCs = 3, eigen_solver='pca', tol=0, seed=0):
     """performs eigen vector analysis, and returns 3 best principal components
-    result[0] is the first PC, etc"""    
+    result[0] is the first PC, etc
+    eigen_solver topk computes only the numPCs leading components (see cworld.eigen)"""    
+    
+    if eigen_solver == 'topk':
+        pca_score,pca_v = truncated_pca(A, numPCs, tol=tol, seed=seed)
+        return(pca_score,pca_v[0:3])
     
     #A = np.array(A,float)
     #M = (A-np.mean(A.T,axis=1)).T 
@@ -378,133 +590,6 @@ def calculate_eigen(A, numPCs = 3):
     return(pca_score,pca_v)
     
 
-def load_matrix(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None):
-    """
-    From Noam Kaplan (noamlib)
-    load a np.array or a list of lists from a text file handle (but works with any iterator) or filename, more memory efficient than numpy.genfromtxt(), headers are returned as lists of strings
-    """
-    fh_from_filename=False
-    
-    if type(fh)==str:
-        if (fh=='-'):
-            fh=sys.stdin
-        else:
-            fh=input_wrapper(fh)
-            fh_from_filename=True
-
-    original_fh=fh
-        
-    # init
-
-    firstline=fh.next()
-    
-    fh=itertools.chain([firstline],fh)
-    
-    cols=len(firstline.rstrip("\n").split("\t"))
-    rows=row_block_size
-
-    if (max_rows!=None and max_rows<row_block_size):
-        rows=max_rows
-
-    if(hcols):
-        cols-=hcols
-
-   
-    if numpy_mode:
-        data=np.zeros((rows,cols),dtype=np_dtype)
-    else:
-        data=[]
-
-    header_rows=[[] for i in range(hrows)]
-
-    for i in range(hrows):
-        header_rows[i]=fh.next().rstrip("\n").split("\t")[hcols:]
- 
-    header_cols=[[] for i in range(hcols)]
-    
-    # fill one line at a time
-
-    prev_cols=-1
-
-    r=0
-
-    if (max_rows==None or r<max_rows):
-  
-        for i in fh:
-            line=i.rstrip("\n").split("\t")
-
-            cols=len(line)-hcols
-
-           # if(cols==0):
-           #     sys.exit('no valid columns in input line '+str(r))
-
-            if(prev_cols>-1 and cols!=prev_cols):
-                if(pad and cols<prev_cols):
-                    line=line+['']*(prev_cols-cols)
-                    cols=len(line)-hcols
-                else:
-                    sys.exit('inconsistent number of columns in input line '+str(r))
-
-            prev_cols=cols
-
-            if numpy_mode:
-                not_allowed = ['','NA']
-                try: # if np_dtype does not except ''or 'NA' as a value
-                    np.dtype(np_dtype).type(not_allowed)
-                except ValueError:
-                    try:
-                        np.dtype(np_dtype).type('nan')
-                        line=[('nan' if i in not_allowed else i) for i in line] # '' or 'NA' are replaced with 'nan'
-                    except ValueError:
-                        pass
-        
-                
-            for j in range(hcols):
-                header_cols[j].append(line[j])
-
-            if numpy_mode:
-                data[r,:]=line[hcols:]
-
-                # enlarge data if needed
-                if(r==(data.shape[0]-1)):
-                    data=np.resize(data,(data.shape[0]+row_block_size,cols))
-                    rows=data.shape[0]
-
-            else:
-                data.append(line[hcols:]) 
-
-            r+=1
-
-            if (max_rows!=None and r>=max_rows):
-                break
-
-    rows=r
-
-    if numpy_mode:
-        data=np.resize(data,(rows,cols))
-
-    if (fh_from_filename):
-        original_fh.close()
-
-    if (hcols==1):
-        header_cols=header_cols[0]
-        
-    if (hrows==1):
-        header_rows=header_rows[0]
-
-    if(verbose):
-        sys.stderr.write("loaded matrix with dimensions ("+str(len(data))+","+str(cols)+")\n")
-    
-    if (return_all or (hrows and hcols)):
-        return data,np.asarray(header_rows),np.asarray(header_cols)
-    if(hrows):
-        return data,np.asarray(header_rows)
-    if(hcols):
-        return data,np.asarray(header_cols)
-    
-    return data
-
-  
 def input_wrapper(infile):
     if infile.endswith('.gz'):
         fh=gzip.open(infile,'r')
@@ -513,13 +598,13 @@ def input_wrapper(infile):
         
     return fh
     
-def output_wrapper(outfile,append=False,suppress_comments=False):
+def output_wrapper(outfile,append=False,suppress_comments=False,compresslevel=DEFAULT_COMPRESSION_LEVEL,threads=1):
     
     if outfile.endswith('.gz'):
         if append:
-            fh=gzip.open(outfile,'a')
+            fh=bgzf_open(outfile,'a',compresslevel=compresslevel,threads=threads)
         else:
-            fh=gzip.open(outfile,'w')   
+            fh=bgzf_open(outfile,'w',compresslevel=compresslevel,threads=threads)
     else:
         if append:
             fh=open(outfile,'a')
@@ -572,29 +657,5 @@ def get_date():
 def get_compute_resource():
     return(socket.gethostname())
 
-def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4):
-    """
-    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
-    """
-    
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    
-    # interaction matrix output
-    out_fh=output_wrapper(matrixFile)
-    
-    # write matrix col headers
-    header=[str(i) for i in header_cols]
-    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
-
-    format_func=("{:0."+str(precision)+"f}").format
-    
-    k=0
-    
-    for i in xrange(nrows):
-        print(header_rows[i]+"\t"+"\t".join(map(format_func,matrix[i,:])),file=out_fh)
-    
-    out_fh.close()
-
 if __name__=="__main__":
       main()
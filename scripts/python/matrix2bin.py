@@ -0,0 +1,91 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: matrix2bin.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path
+import sys
+
+# user defined modules
+from cworld.matrix import load_matrix,writeMatrix,matrix_name,matrix_row_blocks
+from cworld.binary import is_binary_matrix,write_binary_matrix_blocks
+from cworld.hdf5 import is_hdf5_matrix
+
+def main():
+
+    parser=argparse.ArgumentParser(description='convert a my5C (txt/matrix.gz) or HDF5 matrix into the binary matrix format (matrix.bin), or back with --text',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, required=True, help='interaction matrix (my5C, HDF5 or binary) file')
+    parser.add_argument('-o', '--output', dest='outputMatrix', type=str, default=None, help='output matrix file, default is [input name].matrix.bin (.matrix.gz with --text)')
+    parser.add_argument('--text', dest='output_text', action='store_true', help='convert a binary (or HDF5) matrix to a my5C (matrix.gz) file')
+    parser.add_argument('-b', '--blocksize', dest='row_block_size', type=int, default=1000, help='number of rows converted at a time (bounds memory use)')
+    parser.add_argument('-v', '--verbose', dest='verbose',  action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    outputMatrix=args.outputMatrix
+    output_text=args.output_text
+    row_block_size=args.row_block_size
+    verbose=args.verbose
+
+    log_level = logging.WARNING
+    if verbose == 1:
+        log_level = logging.INFO
+    elif verbose >= 2:
+        log_level = logging.DEBUG
+    logging.basicConfig(level=log_level)
+
+    if not os.path.isfile(inputMatrix):
+        sys.exit('invalid input file! (non-existant)')
+
+    input_binary=is_binary_matrix(inputMatrix)
+    input_hdf5=is_hdf5_matrix(inputMatrix)
+    if output_text and not (input_binary or input_hdf5):
+        sys.exit('--text requires a binary or HDF5 matrix input!')
+    if not output_text and input_binary:
+        sys.exit('input is already a binary matrix! (use --text to convert back)')
+
+    print("inputMatrix",inputMatrix)
+    inputMatrixName=matrix_name(inputMatrix)
+    print("inputMatrixName",inputMatrixName)
+
+    if outputMatrix == None:
+        outputMatrix=inputMatrixName+('.matrix.gz' if output_text else '.matrix.bin')
+    print("outputMatrix",outputMatrix)
+
+    print("")
+
+    if output_text:
+        print("writing text matrix ... ",end="")
+        matrix,header_rows,header_cols=load_matrix(inputMatrix, hrows=1, hcols=1)
+        writeMatrix(header_cols,header_rows,matrix,outputMatrix)
+        print("done")
+    else:
+        print("writing binary matrix ... ",end="")
+        matrix2bin(inputMatrix,outputMatrix,row_block_size)
+        print("done")
+
+    print("")
+
+def matrix2bin(inputMatrix,outputMatrix,row_block_size):
+    """stream a my5C text (or HDF5) matrix into a binary matrix, a block of rows at a time
+    """
+
+    header_cols,row_blocks=matrix_row_blocks(inputMatrix,row_block_size)
+
+    try:
+        write_binary_matrix_blocks(header_cols,row_blocks,outputMatrix)
+    except ValueError as e:
+        sys.exit('error: '+str(e)+'!')
+
+if __name__=="__main__":
+      main()
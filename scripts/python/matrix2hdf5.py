@@ -0,0 +1,89 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: matrix2hdf5.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+"""
+
+from __future__ import print_function
+
+import argparse
+import logging
+import os.path
+import sys
+
+# user defined modules
+from cworld.matrix import matrix_name,matrix_row_blocks
+from cworld.hdf5 import is_hdf5_matrix,write_hdf5_matrix_blocks,HDF5_CODECS,DEFAULT_HDF5_CHUNK,DEFAULT_HDF5_LEVEL
+
+def main():
+
+    parser=argparse.ArgumentParser(description='convert a my5C (txt/matrix.gz) or binary (matrix.bin) matrix into a chunked, compressed HDF5 matrix (the layout sampleHDF5.py reads)',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputMatrix', type=str, required=True, help='interaction matrix (my5C or binary) file')
+    parser.add_argument('-o', '--output', dest='outputMatrix', type=str, default=None, help='output matrix file, default is [input name].hdf5')
+    parser.add_argument('--chunk', dest='chunk', type=int, default=DEFAULT_HDF5_CHUNK, help='HDF5 chunk size (chunks are chunk x chunk values)')
+    parser.add_argument('--codec', dest='codec', type=str, default='gzip', choices=HDF5_CODECS, help='HDF5 compression codec')
+    parser.add_argument('--level', dest='level', type=int, default=DEFAULT_HDF5_LEVEL, help='gzip compression level (0-9)')
+    parser.add_argument('-b', '--blocksize', dest='row_block_size', type=int, default=1000, help='number of rows converted at a time (bounds memory use)')
+    parser.add_argument('-v', '--verbose', dest='verbose',  action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--version', action='version', version='%(prog)s 1.0')
+
+    args=parser.parse_args()
+
+    inputMatrix=args.inputMatrix
+    outputMatrix=args.outputMatrix
+    chunk=args.chunk
+    codec=args.codec
+    level=args.level
+    row_block_size=args.row_block_size
+    verbose=args.verbose
+
+    log_level = logging.WARNING
+    if verbose == 1:
+        log_level = logging.INFO
+    elif verbose >= 2:
+        log_level = logging.DEBUG
+    logging.basicConfig(level=log_level)
+
+    if not os.path.isfile(inputMatrix):
+        sys.exit('invalid input file! (non-existant)')
+
+    if is_hdf5_matrix(inputMatrix):
+        sys.exit('input is already an HDF5 matrix!')
+
+    if chunk < 1:
+        sys.exit('invalid chunk size! (must be >= 1)')
+    if level < 0 or level > 9:
+        sys.exit('invalid compression level! (must be 0-9)')
+
+    print("inputMatrix",inputMatrix)
+    inputMatrixName=matrix_name(inputMatrix)
+    print("inputMatrixName",inputMatrixName)
+
+    if outputMatrix == None:
+        outputMatrix=inputMatrixName+'.hdf5'
+    print("outputMatrix",outputMatrix)
+
+    print("")
+
+    print("writing HDF5 matrix ... ",end="")
+    matrix2hdf5(inputMatrix,outputMatrix,row_block_size,chunk,codec,level)
+    print("done")
+
+    print("")
+
+def matrix2hdf5(inputMatrix,outputMatrix,row_block_size,chunk,codec,level):
+    """stream a my5C text (or binary) matrix into an HDF5 matrix, a block of rows at a time
+    """
+
+    header_cols,row_blocks=matrix_row_blocks(inputMatrix,row_block_size)
+
+    try:
+        write_hdf5_matrix_blocks(header_cols,row_blocks,outputMatrix,chunk=chunk,codec=codec,level=level)
+    except ValueError as e:
+        sys.exit('error: '+str(e)+'!')
+
+if __name__=="__main__":
+      main()
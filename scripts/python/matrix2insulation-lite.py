@@ -42,6 +42,16 @@ from math import cos,log,sin,sqrt
 # deprecated from scipy and unusde in the script:
 # from scipy import weave 
 
+# user defined modules
+from cworld.matrix import load_matrix,load_column_headers,matrix_name,cis_blocks,matrix_band_rows
+from cworld.cache import DEFAULT_CACHE_SIZE
+from cworld.index import region_tag
+from cworld.zoom import load_zoomed_matrix,zoom_tag
+from cworld.header import HeaderTable,round_half_away
+from cworld.track import format_column,write_columns
+from cworld.plot import plotting_available,plot_insulation,insulation_plot_size
+from cworld.insulation import InsulationBand,stream_insulation_scores,boundary_insulation_scores,normalize_insulation,insulation_delta,insulation_boundaries
+
 verboseprint=lambda *a, **k: None
 __version__ = "1.0"
 
@@ -51,18 +61,50 @@ def main():
     parser=argparse.ArgumentParser   (description='covert a matrix into a correlation matrix',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
 
     parser.add_argument('-i',dest='inputMatrix',type=str,required=True,help='interaction matrix hdf5 file')
-    parser.add_argument('--is',dest='insulation_square_size',type=int,required=True,help='insulation square size')
+    parser.add_argument('--is',dest='insulation_square_sizes',type=int,nargs='+',required=True,help='insulation square size(s), several sizes are insulated in one pass over the matrix')
+    parser.add_argument('--table',dest='write_table',action='store_true',help='also write one table with the insulation scores of every square size as columns')
+    parser.add_argument('--boundaries',dest='call_boundaries',action='store_true',help='also call TAD boundaries (valleys of the normalized insulation), written as .boundaries/.boundaries.bed for boundary2tad.py')
+    parser.add_argument('--ids',dest='insulation_delta_span',type=int,default=0,help='insulation delta span (bp), window of the insulation delta - 0 = half the insulation square size')
+    parser.add_argument('--nt',dest='noise_threshold',type=float,default=0.1,help='noise threshold, minimum depth of a boundary valley')
+    parser.add_argument('--bmoe',dest='boundary_margin_of_error',type=int,default=3,help='boundary margin of error (# of bins), added to each side of the boundary')
+    parser.add_argument('--noplot',dest='no_plot',action='store_true',help='do not draw the insulation plots')
     parser.add_argument('--yb',dest='y_bound',type=float,default=0.0,help='y axis bound for insulation plot')
-    parser.add_argument('--bg',dest='transparent_bg_flag',action='store_true',help='transparent insulation background')
+    parser.add_argument('--bg',dest='transparent_bg_flag',action='store_true',help='transparent insulation background')
     parser.add_argument('-v', '--verbose', dest='verbose',  action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--cache', dest='cache_dir', type=str, default=None, help='binary matrix cache directory (opt-in), parsed matrices are re-used across runs')
+    parser.add_argument('--cachesize', dest='cache_size', type=int, default=DEFAULT_CACHE_SIZE, help='max size of the matrix cache (MB)')
+    parser.add_argument('--packed', dest='packed', action='store_true', help='keep the (symmetric) matrix as its packed upper triangle - half the memory')
+    parser.add_argument('--banded', dest='banded', action='store_true', help='keep only the diagonals the insulation squares reach (2x the largest insulation square size) - O(n*k) memory, for whole-genome cis matrices')
+    parser.add_argument('--region', dest='region', type=str, default=None, help='only load this window (chr:start-end) or chromosome, fast for indexed matrices (see indexMatrix.py)')
+    parser.add_argument('-z', '--zoom', dest='zoom', type=str, action='append', default=None, help='only load the bins overlapping this UCSC coordinate (chr:start-end, both ends inclusive as --region), can be repeated - read lazily from HDF5, binary or indexed matrices')
+    parser.add_argument('--bed', dest='bed', type=str, action='append', default=None, help='only load the bins overlapping the elements of this BED file, can be repeated')
+    parser.add_argument('--ee', dest='element_exten', type=int, default=0, help='extend each BED element by this many bp on both sides')
+    parser.add_argument('--stream', dest='stream', action='store_true', help='insulate while the matrix is read, keeping only the band rows of the last insulation square in memory - scores are written as soon as their square is complete')
+    parser.add_argument('--bychr', dest='bychr', action='store_true', help='insulate a genome-wide matrix one chromosome (cis block) at a time, writing one set of outputs per chromosome - only one chromosome block in memory')
     
     args=parser.parse_args()
     
-    inputMatrix=args.inputMatrix
-    insulation_square_size=args.insulation_square_size
+    inputMatrix=args.inputMatrix
+    insulation_square_sizes=args.insulation_square_sizes
+    write_table=args.write_table
+    call_boundaries=args.call_boundaries
+    insulation_delta_span=args.insulation_delta_span
+    noise_threshold=args.noise_threshold
+    boundary_margin_of_error=args.boundary_margin_of_error
+    no_plot=args.no_plot
     y_bound=args.y_bound
     transparent_bg_flag=args.transparent_bg_flag
     verbose=args.verbose
+    cache_dir=args.cache_dir
+    cache_size=args.cache_size
+    packed=args.packed
+    banded=args.banded
+    region=args.region
+    bychr=args.bychr
+    stream=args.stream
+    zoom=args.zoom
+    bed=args.bed
+    element_exten=args.element_exten
 
     log_level = logging.WARNING
     if verbose == 1:
@@ -81,21 +123,48 @@ def main():
     scriptPath="/".join(scriptPath.split("/")[0:-2])
    
     verboseprint("inputMatrix",inputMatrix)
-    inputMatrix_name=os.path.basename(inputMatrix)
-    inputMatrix_name=re.sub(".gz", "", inputMatrix_name)    
-    inputMatrix_name=re.sub(".matrix", "", inputMatrix_name)
+    inputMatrix_name=matrix_name(inputMatrix)
+    if region != None:
+        inputMatrix_name=inputMatrix_name+'__'+region_tag(region)
+    if (zoom != None) or (bed != None):
+        if (region != None) or packed or banded or bychr:
+            sys.exit('--zoom/--bed cannot be combined with --region, --packed, --banded or --bychr!')
+        inputMatrix_name=inputMatrix_name+'---'+zoom_tag(zoom,bed)
     verboseprint("inputMatrix_name",inputMatrix_name)
     
     verboseprint("")
     
+    boundary_options=None
+    if call_boundaries:
+        boundary_options=dict(insulation_delta_span=insulation_delta_span,noise_threshold=noise_threshold,boundary_margin_of_error=boundary_margin_of_error)
+    
+    if stream:
+        if (region != None) or packed or banded or bychr or (zoom != None) or (bed != None) or (cache_dir != None):
+            sys.exit('--stream cannot be combined with --region, --packed, --banded, --bychr, --zoom/--bed or --cache!')
+        stream_insulation_analysis(inputMatrix,inputMatrix_name,insulation_square_sizes,y_bound,transparent_bg_flag,scriptPath,write_table,boundary_options,no_plot)
+        return
+    
+    if bychr:
+        if (region != None) or packed or banded:
+            sys.exit('--bychr cannot be combined with --region, --packed or --banded!')
+        for chr_id,headers,matrix in cis_blocks(inputMatrix):
+            verboseprint(chr_id,"(",len(headers),"bins )")
+            insulation_analysis(headers,matrix,inputMatrix_name+'__'+chr_id,insulation_square_sizes,y_bound,transparent_bg_flag,scriptPath,write_table,boundary_options,no_plot)
+        return
+    
+    band=None
+    if banded:
+        # the insulation squares reach at most 2 square sizes away from the diagonal
+        header_spacing,header_sizing=HeaderTable(load_column_headers(inputMatrix)).spacing()[2:]
+        insulation_square_size_binsize,insulation_square_size_bp=get_insulation_square_size(max(insulation_square_sizes),header_spacing,header_sizing)
+        band=insulation_square_size_binsize*2
+        verboseprint("band",band)
+    
     verboseprint("loading matrix ... ",end="")
-    if inputMatrix.endswith('.gz'):
-        infh=gzip.open(inputMatrix,'r')
+    if (zoom != None) or (bed != None):
+        matrix,header_rows,header_cols = load_zoomed_matrix(inputMatrix, zoom=zoom, bed=bed, element_exten=element_exten)
     else:
-        infh=open(inputMatrix,'r')
-    
-    matrix,header_rows,header_cols = load_matrix((l for l in infh if not l.startswith('#')), hrows=1, hcols=1) # since this returns data, header_rows and header_cols
-    infh.close()
+        matrix,header_rows,header_cols = load_matrix(inputMatrix, hrows=1, hcols=1, cache_dir=cache_dir, cache_size=cache_size, region=region, packed=packed, band=band) # since this returns data, header_rows and header_cols
     verboseprint("done")
     
     verboseprint("")
@@ -117,101 +186,217 @@ def main():
     if(ncols != nmatrix_cols):
         sys.exit('non-symmetrical matrix!')
     
-    assembly=getHeaderAssembly(header_rows)
-    equalSpacingFlag,equalSizingFlag,header_spacing,header_sizing=getHeaderSpacing(header_rows)
+    insulation_analysis(header_rows,matrix,inputMatrix_name,insulation_square_sizes,y_bound,transparent_bg_flag,scriptPath,write_table,boundary_options,no_plot)
+
+def insulation_analysis(header_rows,matrix,inputMatrix_name,insulation_square_sizes,y_bound,transparent_bg_flag,scriptPath,write_table=False,boundary_options=None,no_plot=False):
+    """insulation tracks, bedGraphs and plots of one symmetric matrix, one per insulation square size
+    the band (cumulative sums) is built once, for the largest square"""
+
+    header_table=HeaderTable(header_rows)
+    assembly=header_table.assembly()
+    equalSpacingFlag,equalSizingFlag,header_spacing,header_sizing=header_table.spacing()
     num_headers=len(header_rows)
-    
-    # insulation square size
-    insulation_square_size_binsize=int(math.ceil((insulation_square_size-(header_sizing-header_spacing))/header_spacing))
-    if(insulation_square_size_binsize <= 1):
-        insulation_square_size_binsize = 2 
-    insulation_square_size_bp=int((insulation_square_size_binsize * header_spacing)+(header_sizing-header_spacing))
-    print(insulation_square_size,insulation_square_size_binsize,insulation_square_size_bp)
     
-    print("")
-    
-    insulation,insulation_file,bedgraph_file=calculate_insulation(header_rows,matrix,insulation_square_size_binsize,header_spacing,inputMatrix_name)
+    insulation_square_binsizes=get_insulation_square_binsizes(insulation_square_sizes,header_spacing,header_sizing)
     
-    image_width=num_headers*2;
-    if(image_width < 900):
-        image_width=900
+    insulation_band=InsulationBand(matrix,max(insulation_square_binsizes))
+    insulation_columns=insulation_track_columns(header_table,header_spacing)
+    
+    insulation_scores=collections.OrderedDict()
+    for insulation_square_size_binsize,insulation_square_size_bp in insulation_square_binsizes.items():
+        insulation,insulation_file,bedgraph_file=calculate_insulation(header_rows,matrix,insulation_square_size_binsize,header_spacing,inputMatrix_name,header_table=header_table,insulation_band=insulation_band)
+        insulation_scores[insulation_square_size_binsize]=list(insulation.values())
+        if boundary_options != None:
+            boundary_scores=boundary_insulation_scores(insulation_scores[insulation_square_size_binsize],insulation_band.square_sums(insulation_square_size_binsize)[1],insulation_square_size_binsize)
+            call_insulation_boundaries(header_rows,boundary_scores,insulation_file,insulation_square_size_bp,header_table,header_spacing,header_sizing,**boundary_options)
+        if not no_plot:
+            draw_insulation_plot(insulation_file,inputMatrix_name,insulation_scores[insulation_square_size_binsize],insulation_columns,header_spacing,header_sizing,insulation_square_size_binsize,insulation_square_size_bp,y_bound,transparent_bg_flag,scriptPath)
+    
+    if write_table:
+        write_insulation_table(header_rows,insulation_scores,inputMatrix_name,header_table,header_spacing)
+
+def draw_insulation_plot(insulation_file,inputMatrix_name,scores,insulation_columns,header_spacing,header_sizing,insulation_square_size_binsize,insulation_square_size_bp,y_bound,transparent_bg_flag,scriptPath):
+    """draw the insulation plot of one insulation track, in-process (cworld.plot) or with R/matrix2insulation-lite.R if matplotlib is missing"""
     
-    transparent_bg_token=0
-    if(transparent_bg_flag):
-        transparent_bg_token=1
-        
     verboseprint("drawing insulation plot (",inputMatrix_name,") ... ",end="",file=sys.stderr)
-    insulationPlot = scriptPath+"/R/matrix2insulation-lite.R"
-    os.system("Rscript "+insulationPlot+" `pwd` "+insulation_file+" "+str(header_sizing)+" "+str(header_spacing)+" "+str(insulation_square_size_binsize)+" "+str(insulation_square_size_bp)+" "+str(image_width)+" "+str(y_bound)+" "+str(transparent_bg_token)+" > /dev/null")
-    #print("Rscript "+insulationPlot+" `pwd` "+insulation_file+" "+str(header_sizing)+" "+str(header_spacing)+" "+str(insulation_square_size_binsize)+" "+str(insulation_square_size_bp)+" "+str(image_width)+" "+str(y_bound)+" "+str(transparent_bg_token))
+    if plotting_available():
+        plot_insulation(insulation_file,insulation_columns['start'],insulation_columns['end'],insulation_columns['binStart'],insulation_columns['binEnd'],insulation_columns['binMidpoint'],scores,insulation_square_size_binsize,insulation_square_size_bp,y_bound,transparent_bg_flag)
+    else:
+        image_width=insulation_plot_size(len(scores))[0]
+        
+        transparent_bg_token=0
+        if(transparent_bg_flag):
+            transparent_bg_token=1
+        
+        insulationPlot = scriptPath+"/R/matrix2insulation-lite.R"
+        os.system("Rscript "+insulationPlot+" `pwd` "+insulation_file+" "+str(header_sizing)+" "+str(header_spacing)+" "+str(insulation_square_size_binsize)+" "+str(insulation_square_size_bp)+" "+str(image_width)+" "+str(y_bound)+" "+str(transparent_bg_token)+" > /dev/null")
     verboseprint("done",file=sys.stderr)
     
     verboseprint("")
+
+def stream_insulation_analysis(inputMatrix,inputMatrix_name,insulation_square_sizes,y_bound,transparent_bg_flag,scriptPath,write_table=False,boundary_options=None,no_plot=False):
+    """insulation tracks of a symmetric matrix, computed while its rows are read (see cworld.insulation.stream_insulation_scores)
+    only the band rows of the last (largest) square size are held in memory, tracks are written as bins are completed"""
     
+    header_rows=load_column_headers(inputMatrix)
+    header_table=HeaderTable(header_rows)
+    equalSpacingFlag,equalSizingFlag,header_spacing,header_sizing=header_table.spacing()
+    num_headers=len(header_rows)
+    
+    insulation_square_binsizes=get_insulation_square_binsizes(insulation_square_sizes,header_spacing,header_sizing)
+    insulation_columns=insulation_track_columns(header_table,header_spacing)
+    
+    insulation_files=collections.OrderedDict()
+    for insulation_square_size_binsize in insulation_square_binsizes:
+        insulation_files[insulation_square_size_binsize]=open_insulation_files(inputMatrix_name,insulation_square_size_binsize)
+    if write_table:
+        insulation_table_file,table_fh=open_insulation_table(inputMatrix_name,insulation_square_binsizes)
+    
+    # boundaries and plots need the whole score (and valid cell count) vectors - O(n), kept block by block
+    insulation_scores=collections.OrderedDict((b,[]) for b in insulation_square_binsizes)
+    insulation_counts=collections.OrderedDict((b,[]) for b in insulation_square_binsizes)
+    
+    band_rows=matrix_band_rows(inputMatrix,2*max(insulation_square_binsizes))
+    for first_bin,block_scores,block_counts in stream_insulation_scores(band_rows,num_headers,list(insulation_square_binsizes)):
+        verboseprint("\tbins",first_bin,"-",first_bin+len(block_scores[max(insulation_square_binsizes)])-1,file=sys.stderr)
+        for insulation_square_size_binsize,(insulation_file,out_fh,insulation_bedgraph_file,bedgraph_fh) in insulation_files.items():
+            write_insulation_rows(out_fh,bedgraph_fh,header_rows,block_scores[insulation_square_size_binsize],insulation_columns,first_bin)
+            if (boundary_options != None) or (not no_plot):
+                insulation_scores[insulation_square_size_binsize].append(block_scores[insulation_square_size_binsize])
+                insulation_counts[insulation_square_size_binsize].append(block_counts[insulation_square_size_binsize])
+        if write_table:
+            write_insulation_table_rows(table_fh,header_rows,collections.OrderedDict((b,block_scores[b]) for b in insulation_square_binsizes),insulation_columns,first_bin)
+    
+    if write_table:
+        table_fh.close()
+    for insulation_square_size_binsize,(insulation_file,out_fh,insulation_bedgraph_file,bedgraph_fh) in insulation_files.items():
+        out_fh.close()
+        bedgraph_fh.close()
+        if boundary_options != None:
+            boundary_scores=boundary_insulation_scores(np.concatenate(insulation_scores[insulation_square_size_binsize]),np.concatenate(insulation_counts[insulation_square_size_binsize]),insulation_square_size_binsize)
+            call_insulation_boundaries(header_rows,boundary_scores,insulation_file,insulation_square_binsizes[insulation_square_size_binsize],header_table,header_spacing,header_sizing,**boundary_options)
+        if not no_plot:
+            draw_insulation_plot(insulation_file,inputMatrix_name,np.concatenate(insulation_scores[insulation_square_size_binsize]),insulation_columns,header_spacing,header_sizing,insulation_square_size_binsize,insulation_square_binsizes[insulation_square_size_binsize],y_bound,transparent_bg_flag,scriptPath)
+
+def get_insulation_square_binsizes(insulation_square_sizes,header_spacing,header_sizing):
+    """insulation square sizes (bp) -> {size in bins: size in bp}, sizes giving the same number of bins are kept once"""
+    
+    insulation_square_binsizes=collections.OrderedDict()
+    for insulation_square_size in insulation_square_sizes:
+        insulation_square_size_binsize,insulation_square_size_bp=get_insulation_square_size(insulation_square_size,header_spacing,header_sizing)
+        print(insulation_square_size,insulation_square_size_binsize,insulation_square_size_bp)
+        if insulation_square_size_binsize not in insulation_square_binsizes:
+            insulation_square_binsizes[insulation_square_size_binsize]=insulation_square_size_bp
+    
+    print("")
+    
+    return(insulation_square_binsizes)
 
-
-def calculate_insulation(header_rows,matrix,insulation_square_size_binsize,header_spacing,inputMatrix_name,exclude_zero=0):
-
-    num_headers=len(header_rows)
-    insulation=collections.OrderedDict()
-    
-    box_rows=insulation_square_size_binsize
-    box_cols=insulation_square_size_binsize
-    box=np.zeros([box_rows,box_cols])
-    box.fill(np.nan)
-        
-    pcComplete=0
-    for y in xrange(0,num_headers,1):
-        
-        y_header=header_rows[y]
-        
-        startY=(y-insulation_square_size_binsize)
-        endY=y
-        
-        startX=y+1
-        endX=(y+insulation_square_size_binsize)+1
-        
-        if(endY <= 0) or (startX >= num_headers):
-            insulation[y_header]=np.nan
-            continue
-        
-        y2=endY-1
-        x2=endX-1
-        
-        startY=max(startY,0)
-        endY=min(endY,num_headers)
-        startX=max(startX,0)
-        endX=min(endX,num_headers)
-        
-        # adjust previous box
-        tmp_box=np.zeros([box_rows,box_cols])
-        tmp_box.fill(np.nan)
-        
-        row=np.zeros(box_rows)
-        row.fill(np.nan)
-        col=np.zeros(box_cols)
-        col.fill(np.nan)
-        
-        tmp_box[0:-1,0:-1]=box[1:,1:]
-        
-        row[0:endX-startX]=matrix[y2,startX:endX]
-        tmp_box[-1,:]=row
+def get_insulation_square_size(insulation_square_size,header_spacing,header_sizing):
+    """insulation square size (bp) -> (size in bins, size in bp)"""
+
+    insulation_square_size_binsize=int(math.ceil((insulation_square_size-(header_sizing-header_spacing))/header_spacing))
+    if(insulation_square_size_binsize <= 1):
+        insulation_square_size_binsize = 2 
+    insulation_square_size_bp=int((insulation_square_size_binsize * header_spacing)+(header_sizing-header_spacing))
+
+    return(insulation_square_size_binsize,insulation_square_size_bp)
+
+def calculate_insulation(header_rows,matrix,insulation_square_size_binsize,header_spacing,inputMatrix_name,exclude_zero=0,header_table=None,insulation_band=None):
+
+    if header_table == None:
+        header_table=HeaderTable(header_rows)
+
+    # every square sum / valid cell count from cumulative sums over the band (see cworld.insulation)
+    if insulation_band == None:
+        insulation_band=InsulationBand(matrix,insulation_square_size_binsize)
+    scores=insulation_band.scores(insulation_square_size_binsize)
+    
+    insulation=collections.OrderedDict(zip(header_rows,scores))
+    
+    insulation_columns=insulation_track_columns(header_table,header_spacing)
+    
+    insulation_file,out_fh,insulation_bedgraph_file,bedgraph_fh=open_insulation_files(inputMatrix_name,insulation_square_size_binsize)
+    write_insulation_rows(out_fh,bedgraph_fh,header_rows,scores,insulation_columns)
+    out_fh.close()
+    bedgraph_fh.close()
+    
+    return(insulation,insulation_file,insulation_bedgraph_file)
+
+def call_insulation_boundaries(header_rows,scores,insulation_file,insulation_square_size_bp,header_table,header_spacing,header_sizing,insulation_delta_span=0,noise_threshold=0.1,boundary_margin_of_error=3):
+    """call the boundaries of one insulation track (see matrix2insulation.pl), written to <insulation file>.boundaries(.bed)"""
+    
+    # insulation delta span, an even number of bins
+    if(insulation_delta_span <= 0):
+        insulation_delta_span=insulation_square_size_bp/2
+    insulation_delta_span_binsize=int(math.ceil(insulation_delta_span/header_spacing))
+    if(insulation_delta_span_binsize % 2):
+        insulation_delta_span_binsize += 1
+    insulation_delta_span_bp=int((insulation_delta_span_binsize * header_spacing)+(header_sizing-header_spacing))
+    verboseprint("insulationDeltaSpan",insulation_delta_span,insulation_delta_span_binsize,insulation_delta_span_bp)
+    if(insulation_delta_span_binsize > len(header_rows)):
+        sys.exit('insulation delta span cannot be larger than dataset ('+str(insulation_delta_span_binsize)+' > '+str(len(header_rows))+')!')
+    
+    normalized=normalize_insulation(scores)
+    delta=insulation_delta(normalized,insulation_delta_span_binsize)
+    boundary_bins,boundary_strengths,boundary_directionalities=insulation_boundaries(delta,noise_threshold)
+    verboseprint("boundaries",len(boundary_bins))
+    
+    assembly=header_table.assembly()
+    chromosomes=header_table.chromosomes()
+    boundary_starts=header_table['start'][boundary_bins]-(boundary_margin_of_error*header_spacing)
+    boundary_ends=header_table['end'][boundary_bins]+(boundary_margin_of_error*header_spacing)
+    
+    boundary_file=insulation_file+".boundaries"
+    out_fh=output_wrapper(boundary_file)
+    print("header\tstart\tend\tbinStart\tbinEnd\tbinMidpoint\tboundaryHeader\tboundaryStrength\tboundaryDirectionality\tboundaryInsulation",file=out_fh)
+    
+    boundary_bed_file=boundary_file+".bed"
+    bed_fh=output_wrapper(boundary_bed_file)
+    print("track name='"+boundary_file+"' description='called tad boundaries'",file=bed_fh)
+    
+    for boundary_num,y in enumerate(boundary_bins):
+        boundary_start=int(boundary_starts[boundary_num])
+        boundary_end=int(boundary_ends[boundary_num])
+        boundary_header="boundary."+str(boundary_num)+"|"+str(assembly)+"|"+chromosomes[y]+":"+str(boundary_start)+"-"+str(boundary_end)
         
-        if(x2 < num_headers):
-            col[box_rows-(endY-startY):box_rows]=matrix[startY:endY,x2]
-            tmp_box[:,-1]=col
-        
-        box=tmp_box
+        bin_start=int(round_half_away(boundary_start/header_spacing))
+        bin_end=int(round_half_away(boundary_end/header_spacing))
+        bin_midpoint=(bin_start+bin_end)/2
         
-        insulation_value=np.nan
-        num_nan=np.sum(np.isnan(box))
-        expected=box_rows*box_cols
-        num_zeros=expected-np.count_nonzero(box)
+        boundary_directionality=boundary_directionalities[boundary_num]
+        if(np.isnan(boundary_directionality)):
+            boundary_directionality="NA"
+        boundary_insulation=normalized[y]
         
-        #if( (num_nan < (expected/2)) and (num_zeros < (expected/2)) ):
-        if(num_nan != expected):
-            insulation_value=np.nanmean(box)
-        insulation[y_header]=insulation_value
+        print(boundary_header,boundary_start,boundary_end,bin_start,bin_end,bin_midpoint,header_rows[y],boundary_strengths[boundary_num],boundary_directionality,boundary_insulation,sep="\t",file=out_fh)
+        print(chromosomes[y].split('-')[0],boundary_start,boundary_end,header_rows[y],boundary_strengths[boundary_num],sep="\t",file=bed_fh)
+    
+    out_fh.close()
+    bed_fh.close()
+    
+    return(boundary_file)
+
+def insulation_track_columns(header_table,header_spacing):
+    """coordinate columns of the insulation track, from the header table"""
+    
+    insulation_columns=dict()
+    insulation_columns['start']=header_table['start'].tolist()
+    insulation_columns['end']=header_table['end'].tolist()
+    insulation_columns['midpoint']=round_half_away((header_table['start']+header_table['end'])/2).tolist()
+    bin_starts=round_half_away(header_table['start']/header_spacing)
+    bin_ends=round_half_away(header_table['end']/header_spacing)
+    insulation_columns['binMidpoint']=((bin_starts+bin_ends)/2).tolist()
+    insulation_columns['binStart']=bin_starts.tolist()
+    insulation_columns['binEnd']=bin_ends.tolist()
+    
+    # strip off chr group if exists for proper UCSC usage
+    insulation_columns['chr']=header_table.chromosomes(degroup=True)
+    
+    return(insulation_columns)
+
+def open_insulation_files(inputMatrix_name,insulation_square_size_binsize):
+    """open the .insulation and .insulation.bedGraph files of one square size and write their headers"""
     
     insulation_name=inputMatrix_name+".is"+str(insulation_square_size_binsize)
     insulation_file=insulation_name+".insulation"
@@ -223,99 +408,49 @@ def calculate_insulation(header_rows,matrix,insulation_square_size_binsize,heade
     print("header\tstart\tend\tmidpoint\tbinStart\tbinEnd\tbinMidpoint\trawInsulationScore\tsmoothedInsulaton\tinsulationScore",file=out_fh)
     print("track type=bedGraph name='"+inputMatrix_name+"' description='"+inputMatrix_name+" - insutation score' maxHeightPixels=128:64:32 visibility=full autoScale=on color=0,0,0 altColor=100,100,100\n",file=bedgraph_fh)
     
-    for i in insulation:
-        insulation_value=insulation[i]
-        
-        if(np.isnan(insulation_value)):
-            insulation_value="NA"
-            
-        header_object=getHeaderObject(i)
-        header_chromosome=header_object["chromosome"]
-        header_start=header_object["start"]
-        header_end=header_object["end"]
-        header_midpoint=round((header_start+header_end)/2);
-        
-        bin_start = round(header_start/header_spacing);
-        bin_end = round(header_end/header_spacing);
-        bin_midpoint=((bin_start+bin_end)/2);
-       
-        print(i,header_start,header_end,header_midpoint,bin_start,bin_end,bin_midpoint,insulation_value,insulation_value,insulation_value,sep="\t",file=out_fh)
-        
-        # strip off chr group if exists for proper UCSC usage
-        header_chromosome=deGroupChr(header_chromosome)
-        
-        if(insulation_value == np.nan):
-            insulation_value=0
-            
-        print(header_chromosome,header_start,header_end,insulation_value,sep="\t",file=bedgraph_fh)
+    return(insulation_file,out_fh,insulation_bedgraph_file,bedgraph_fh)
+
+def write_insulation_rows(out_fh,bedgraph_fh,header_rows,scores,insulation_columns,first_bin=0):
+    """write the insulation/bedGraph lines of the bins first_bin..first_bin+len(scores)-1"""
+    
+    rows=slice(first_bin,first_bin+len(scores))
+    
+    header_starts=format_column(insulation_columns['start'][rows])
+    header_ends=format_column(insulation_columns['end'][rows])
+    insulation_values=format_column(np.asarray(scores,dtype=np.float64),na="NA")
     
+    write_columns(out_fh,[format_column(header_rows[rows]),header_starts,header_ends,format_column(insulation_columns['midpoint'][rows]),format_column(insulation_columns['binStart'][rows]),format_column(insulation_columns['binEnd'][rows]),format_column(insulation_columns['binMidpoint'][rows]),insulation_values,insulation_values,insulation_values])
+    write_columns(bedgraph_fh,[format_column(insulation_columns['chr'][rows]),header_starts,header_ends,insulation_values])
+
+def write_insulation_table(header_rows,insulation_scores,inputMatrix_name,header_table,header_spacing):
+    """one table of the insulation scores of every square size (columns isN, N = square size in bins)"""
+    
+    insulation_columns=insulation_track_columns(header_table,header_spacing)
+    
+    insulation_table_file,out_fh=open_insulation_table(inputMatrix_name,insulation_scores)
+    write_insulation_table_rows(out_fh,header_rows,insulation_scores,insulation_columns)
     out_fh.close()
-    bedgraph_fh.close()
     
-    return(insulation,insulation_file,insulation_bedgraph_file)
-        
-def getHeaderAssembly(header_rows):
-    
-    assembly=None
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        if assembly==None:
-            assembly=genome
-        else:
-            if assembly!=genome:
-                sys.exit('assembly/genome is not constant!')
-            assembly=genome
-    
-    return(assembly)
-    
-def getHeaderSpacing(header_rows):
-    
-    globalHeaderSpacingArr=[]
-    globalHeaderSizingArr=[]
-    equalSpacingFlag=1
-    equalSizingFlag=1
-    
-    bin_size=None
-    bin_step=None
-    globalHeaderSpacing=globalHeaderSizing=-1
-    for i in xrange(len(header_rows)-1):
-        
-        header=header_rows[i]
-        headerObject=getHeaderObject(header)
-        headerRegion=headerObject["region"]
-        headerStart=headerObject["start"]
-        headerEnd=headerObject["end"]
-        headerSize=headerObject["size"]
-        
-        nextHeader=header_rows[i+1]
-        nextHeaderObject=getHeaderObject(nextHeader)
-        nextHeaderRegion=nextHeaderObject["region"]
-        nextHeaderStart=nextHeaderObject["start"]
-        nextHeaderEnd=nextHeaderObject["end"]
-        nextHeaderSize=nextHeaderObject["size"]
-        
-        if((nextHeaderRegion != headerRegion) or (headerEnd == nextHeaderEnd) or (headerStart == nextHeaderStart)):
-            continue
-        
-        if((globalHeaderSpacing != ((nextHeaderStart-headerStart))) and (globalHeaderSpacing != -1)):
-            equalSpacingFlag=0 
-        if((globalHeaderSizing != (headerSize)) and (globalHeaderSizing != -1)):
-            equalSizingFlag=0 
-        
-        globalHeaderSpacing=(nextHeaderStart-headerStart)
-        globalHeaderSizing=headerSize
-                
-        globalHeaderSpacingArr.append(globalHeaderSpacing)
-        globalHeaderSizingArr.append(globalHeaderSizing)
-    
-    meanGlobalHeaderSpacing=int(np.mean(globalHeaderSpacingArr))
-    meanGlobalHeaderSizing=int(np.mean(globalHeaderSizingArr))
-    
-    return(equalSpacingFlag,equalSizingFlag,meanGlobalHeaderSpacing,meanGlobalHeaderSizing)
+    return(insulation_table_file)
+
+def open_insulation_table(inputMatrix_name,insulation_square_binsizes):
+    """open the multi square size insulation table and write its header"""
+    
+    insulation_table_file=inputMatrix_name+".is"+"-".join(str(b) for b in insulation_square_binsizes)+".insulation.table"
+    out_fh=output_wrapper(insulation_table_file)
+    
+    print("header\tstart\tend\tmidpoint\t"+"\t".join("is"+str(b) for b in insulation_square_binsizes),file=out_fh)
+    
+    return(insulation_table_file,out_fh)
+
+def write_insulation_table_rows(out_fh,header_rows,insulation_scores,insulation_columns,first_bin=0):
+    """write the table lines of the bins from first_bin on ({binsize: scores}, in column order)"""
+    
+    num_scores=len(list(insulation_scores.values())[0])
+    rows=slice(first_bin,first_bin+num_scores)
+    
+    insulation_values=[format_column(np.asarray(scores,dtype=np.float64),na="NA") for scores in insulation_scores.values()]
+    write_columns(out_fh,[format_column(header_rows[rows]),format_column(insulation_columns['start'][rows]),format_column(insulation_columns['end'][rows]),format_column(insulation_columns['midpoint'][rows])]+insulation_values)
         
 def input_wrapper(infile):
     if infile.endswith('.gz'):
@@ -384,212 +519,5 @@ def get_date():
 def get_compute_resource():
     return(socket.gethostname())
 
-def deGroupChr(chr_id):
-    return(chr_id.split('-')[0])
-    
-def getHeaderObject(header,enforceValidHeaders=0):
-    
-    subName=assembly=coords=None
-    tmp=header.split('|')
-    if enforceValidHeaders and len(tmp) != 3:
-        sys.exit('error: incorrect input format!')  
-    subName,assembly,coords=tmp
-    
-    chromosome=pos=None
-    tmp=coords.split(':')
-    if enforceValidHeaders and len(tmp) != 2:
-        sys.exit('error: incorrect input format!')  
-    chromosome,pos=tmp
-    
-    region=chromosome
-    primerType=fragmentNumber=None
-    if("__" in subName):
-        tmp=subName.split("__")
-        region=tmp
-    else:
-        tmp=subName.split("_")
-        if(len(tmp) == 5 and tmp[0] == "5C"):
-            region=str(tmp[1])+"_"+str(tmp[2])
-            primerType=int(tmp[3])
-            fragmentNumber=int(tmp[4])
-    
-    start=end=None
-    tmp=pos.split("-")
-    if enforceValidHeaders and len(tmp) != 2:
-        sys.exit('error: incorrect input format!')  
-    start=int(tmp[0])
-    end=int(tmp[1])
-    
-    size=((end-start)+1) # add to for 1-based positioning
-    midpoint=((end+start)/2)
-        
-    headerObject=dict()
-    
-    headerObject["subName"]=subName
-    headerObject["fragmentNumber"]=fragmentNumber
-    headerObject["primerType"]=primerType
-    headerObject["assembly"]=assembly
-    headerObject["chromosome"]=chromosome
-    headerObject["coords"]=coords
-    headerObject["region"]=region
-    headerObject["start"]=start
-    headerObject["end"]=end
-    headerObject["midpoint"]=midpoint
-    headerObject["size"]=size
-        
-    return(headerObject)
-
-def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4):
-    """
-    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
-    """
-    
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    
-    # interaction matrix output
-    out_fh=gzip.open(matrixFile,"wb")
-    
-    # write matrix col headers
-    header=[str(i) for i in header_cols]
-    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
-
-    format_func=("{:0."+str(precision)+"f}").format
-    
-    k=0
-    
-    for i in xrange(nrows):
-        print(header_rows[i]+"\t"+"\t".join(map(format_func,matrix[i,:])),file=out_fh)
-    
-    out_fh.close()
-
-    
-def load_matrix(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None):
-    """
-    load a np.array or a list of lists from a text file handle (but works with any iterator) or filename, more memory efficient than numpy.genfromtxt(), headers are returned as lists of strings
-    """
-    fh_from_filename=False
-    
-    
-    if type(fh)==str:
-        if (fh=='-'):
-            fh=sys.stdin
-        else:
-            fh=open(fh,'r')
-            fh_from_filename=True
-
-    original_fh=fh
-        
-    # init
-
-    firstline=fh.next()
-    
-    fh=itertools.chain([firstline],fh)
-    
-    cols=len(firstline.rstrip("\n").split("\t"))
-    rows=row_block_size
-
-    if (max_rows!=None and max_rows<row_block_size):
-        rows=max_rows
-
-    if(hcols):
-        cols-=hcols
-
-   
-    if numpy_mode:
-        data=np.zeros((rows,cols),dtype=np_dtype)
-    else:
-        data=[]
-
-    header_rows=[[] for i in range(hrows)]
-
-    for i in range(hrows):
-        header_rows[i]=fh.next().rstrip("\n").split("\t")[hcols:]
- 
-    header_cols=[[] for i in range(hcols)]
-    
-    # fill one line at a time
-
-    prev_cols=-1
-
-    r=0
-
-    if (max_rows==None or r<max_rows):
-  
-        for i in fh:
-            line=i.rstrip("\n").split("\t")
-
-            cols=len(line)-hcols
-
-           # if(cols==0):
-           #     sys.exit('no valid columns in input line '+str(r))
-
-            if(prev_cols>-1 and cols!=prev_cols):
-                if(pad and cols<prev_cols):
-                    line=line+['']*(prev_cols-cols)
-                    cols=len(line)-hcols
-                else:
-                    sys.exit('inconsistent number of columns in input line '+str(r))
-
-            prev_cols=cols
-
-            if numpy_mode:
-                not_allowed = ['','NA']
-                try: # if np_dtype does not except ''or 'NA' as a value
-                    np.dtype(np_dtype).type(not_allowed)
-                except ValueError:
-                    try:
-                        np.dtype(np_dtype).type('nan')
-                        line=[('nan' if i in not_allowed else i) for i in line] # '' or 'NA' are replaced with 'nan'
-                    except ValueError:
-                        pass
-        
-                
-            for j in range(hcols):
-                header_cols[j].append(line[j])
-
-            if numpy_mode:
-                data[r,:]=line[hcols:]
-
-                # enlarge data if needed
-                if(r==(data.shape[0]-1)):
-                    data=np.resize(data,(data.shape[0]+row_block_size,cols))
-                    rows=data.shape[0]
-
-            else:
-                data.append(line[hcols:]) 
-
-            r+=1
-
-            if (max_rows!=None and r>=max_rows):
-                break
-
-    rows=r
-
-    if numpy_mode:
-        data=np.resize(data,(rows,cols))
-
-    if (fh_from_filename):
-        original_fh.close()
-
-    if (hcols==1):
-        header_cols=header_cols[0]
-        
-    if (hrows==1):
-        header_rows=header_rows[0]
-
-    if(verbose):
-        sys.stderr.write("loaded matrix with dimensions ("+str(len(data))+","+str(cols)+")\n")
-    
-    if (return_all or (hrows and hcols)):
-        return data,header_rows,header_cols
-    if(hrows):
-        return data,header_rows
-    if(hcols):
-        return data,header_cols
-
-    
-    return data
-
 if __name__=="__main__":
       main()
@@ -0,0 +1,142 @@
+#!/usr/local/bin/python
+"""
+***********************************************
+- PROGRAM: renderPlots.py
+- CONTACT: Bryan lajoie (bryan.lajoie@umassmed.edu)
+***********************************************
+
+draw the insulation (.insulation), eigenvector (.compartments) and explained variance
+(.evr.txt) plots of many output files in one process (see cworld.plot).
+plots are written next to their input files.
+"""
+
+from __future__ import print_function
+from __future__ import division
+
+import sys
+import argparse
+import logging
+import re
+import os
+
+import numpy as np
+
+# user defined modules
+from cworld.header import HeaderTable
+from cworld.plot import plotting_available,plot_insulation,plot_eigen,plot_evr
+
+verboseprint=lambda *a, **k: None
+__version__ = "1.0"
+debug = None
+
+def main():
+
+    parser=argparse.ArgumentParser(description='Draw insulation/eigenvector/evr plots of many output files in one process',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('-i', '--input', dest='inputFiles', type=str, required=True, nargs='+', help='.insulation, .compartments and/or .evr.txt (.cis.evr.txt) files')
+    parser.add_argument('--yb', dest='y_bound', type=float, default=0, help='insulation plot y-axis bound (0 = auto)')
+    parser.add_argument('--bg', dest='transparent_bg_flag', action='store_true', help='use transparent background on the insulation plots')
+    parser.add_argument('-v', '--verbose', dest='verbose', action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--version', action='version', version='%(prog)s '+__version__)
+
+    args=parser.parse_args()
+
+    inputFiles=args.inputFiles
+    y_bound=args.y_bound
+    transparent_bg_flag=args.transparent_bg_flag
+    verbose=args.verbose
+
+    log_level = logging.WARNING
+    if verbose == 1:
+        log_level = logging.INFO
+    elif verbose >= 2:
+        log_level = logging.DEBUG
+    logging.basicConfig(level=log_level)
+
+    global verboseprint
+    verboseprint = print if verbose else lambda *a, **k: None
+
+    if not plotting_available():
+        sys.exit('matplotlib is required to render plots!')
+
+    for inputFile in inputFiles:
+        if not os.path.isfile(inputFile):
+            sys.exit('invalid input file! (non-existant)')
+        if not (inputFile.endswith(".insulation") or inputFile.endswith(".compartments") or inputFile.endswith(".evr.txt")):
+            sys.exit('unknown plot type! ('+inputFile+')')
+
+    for inputFile in inputFiles:
+        verboseprint("drawing plot (",inputFile,") ... ",end="",file=sys.stderr)
+        if inputFile.endswith(".insulation"):
+            render_insulation(inputFile,y_bound,transparent_bg_flag)
+        elif inputFile.endswith(".compartments"):
+            render_eigen(inputFile)
+        else:
+            render_evr(inputFile)
+        verboseprint("done",file=sys.stderr)
+
+def load_track(inputFile):
+    """(column names, {column: values}) of a tab delimited track, ## lines are skipped and NA is nan"""
+
+    column_names=None
+    rows=[]
+    with open(inputFile) as fh:
+        for line in fh:
+            if line.startswith("##") or line.strip() == "":
+                continue
+            fields=line.rstrip("\n").split("\t")
+            if column_names == None:
+                column_names=[f.lstrip("#") for f in fields]
+                continue
+            rows.append(fields)
+
+    if column_names == None:
+        sys.exit('invalid input file! (no header line)')
+
+    columns={}
+    for i,name in enumerate(column_names):
+        values=[r[i] for r in rows]
+        try:
+            columns[name]=np.array([np.nan if v in ("NA","nan") else float(v) for v in values])
+        except ValueError:
+            columns[name]=values
+
+    return column_names,columns
+
+def render_insulation(insulation_file,y_bound,transparent_bg_flag):
+
+    column_names,columns=load_track(insulation_file)
+
+    m=re.search(r'\.is(\d+)\.',os.path.basename(insulation_file))
+    if m == None:
+        sys.exit('insulation square size not found in file name! ('+insulation_file+')')
+    insulation_square_size_binsize=int(m.group(1))
+
+    header_spacing,header_sizing=HeaderTable(columns['header']).spacing()[2:]
+    insulation_square_size_bp=int((insulation_square_size_binsize * header_spacing)+(header_sizing-header_spacing))
+
+    plot_insulation(insulation_file,columns['start'],columns['end'],columns['binStart'],columns['binEnd'],columns['binMidpoint'],columns['insulationScore'],insulation_square_size_binsize,insulation_square_size_bp,y_bound,transparent_bg_flag)
+
+def render_eigen(compartment_file):
+
+    column_names,columns=load_track(compartment_file)
+
+    job_name=os.path.basename(compartment_file)[:-len(".compartments")]
+    evr=[np.nanmean(columns['eigen'+str(i)+'evr']) for i in range(1,4)]
+
+    plot_eigen(compartment_file,job_name,columns['index'],columns['eigen1'],columns['eigen2'],columns['eigen3'],evr,columns.get('geneDensity'))
+
+def render_evr(evr_file):
+
+    column_names,columns=load_track(evr_file)
+
+    if 'evr' in columns:
+        plot_evr(evr_file,columns['evr'])
+        return
+
+    # matrix2EigenVectors.py --cis .cis.evr.txt - one evr column per chromosome, one plot per chromosome
+    for chr_id in column_names[1:]:
+        plot_evr(evr_file+"."+chr_id,columns[chr_id])
+
+if __name__=="__main__":
+    main()
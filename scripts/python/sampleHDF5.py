@@ -22,6 +22,10 @@ import copy
 from collections import defaultdict
 from datetime import datetime
 
+# user defined modules
+from cworld.hdf5 import get_blocksize
+from cworld.zoom import build_bin_mask,subset_by_coords,subset_by_bed,split_coord,is_overlap
+
 verboseprint=lambda *a, **k: None
 __version__ = "1.0"
 
@@ -85,6 +89,9 @@ def main():
     # calculate optimal block size
     hdf_blocksize=inhdf['interactions'].chunks[0]
     blocksize=get_blocksize(hdf_blocksize,blocksize)
+    verboseprint("hdf_blocksize",hdf_blocksize)
+    verboseprint("blocksize",blocksize)
+    verboseprint("")
     
     # get _optional_ y axis headers
     headers = np.empty(ncol)
@@ -248,32 +255,6 @@ def write_bins(out_file,x_bin_mask,y_bin_mask,chrs,bin_positions):
         print(str(i)+"\t"+chrs[bin_positions[i,0]]+"\t"+str(bin_positions[i,1])+"\t"+str(bin_positions[i,2]),file=out_fh)
     out_fh.close()    
             
-def build_bin_mask(n,chrs,zoom_dict,chr_dict,chr_bin_range,bin_positions,axis=None):
-    """build a 1D mask (x or y axis) based upon user chr/coor selection
-    """
-    
-    bin_mask=np.zeros(n,dtype=bool)
-   
-    # build bin mask based on user chr/zoom selection
-    for c in chrs:
-        c_ind=chr_dict[c]
-        r=chr_bin_range[chr_dict[c]]
-        if c in zoom_dict:
-            zoom_coord_arr=zoom_dict[c]
-            for zoom_coord in zoom_coord_arr:
-                tmp_bin_positions=bin_positions[r[0]:r[1]+1]
-                for i,b in enumerate(tmp_bin_positions):
-                    if b[2] < zoom_coord[1]: continue
-                    if b[1] > zoom_coord[2]: break
-                    overlap=is_overlap([zoom_coord[1],zoom_coord[2]], [b[1],b[2]])
-                    if(overlap > 0):
-                        bin_mask[r[0]+i]=True
-        else:
-            bin_mask[r[0]:r[1]+1]=True
-    verboseprint("\t",axis," bin_mask\t",np.sum(bin_mask),sep="")
-    
-    return(bin_mask)
-    
 def dump_hdf_info(in_file,in_file_name,nrow,ncol,genome,hdf_blocksize,blocksize,chrs,chr_dict,chr_bin_range,bin_positions):
     """dump hdf info
     """
@@ -297,22 +278,6 @@ def dump_hdf_info(in_file,in_file_name,nrow,ncol,genome,hdf_blocksize,blocksize,
     quit()
     
     
-def get_blocksize(hdf_blocksize,blocksize):
-    """adjust blocksize to be evenly divisible by hdf_blocksize
-    """
-    
-    if blocksize == None:
-        blocksize = hdf_blocksize
-    else:
-        if blocksize%hdf_blocksize != 0:
-            blocksize=int(math.ceil(blocksize/hdf_blocksize)*hdf_blocksize)
-            
-    verboseprint("hdf_blocksize",hdf_blocksize)
-    verboseprint("blocksize",blocksize)
-    verboseprint("")
-    
-    return(blocksize)
-    
 def ensure_symmetrical(dim):
     """ensure nrow=ncol [symmetrical]
     """
@@ -321,58 +286,6 @@ def ensure_symmetrical(dim):
     if nrow!=ncol:
         sys.exit('error: non-symmetrical matrix found!')
         
-def subset_by_coords(zoom_chrs,zoom_dict,coord):
-    """read UCSC coordinates, extract chr, coordinates 
-    """
-    
-    # process zoom coordinates
-    if(coord!=None):
-        for z in coord:
-            coord=split_coord(z)
-            
-            if coord==None:
-                verboseprint("invalid coord",z)
-                continue
-                
-            coord_chr,coord_start,coord_end=coord
-            if coord_chr not in zoom_chrs:
-                zoom_chrs += [coord_chr]
-            zoom_dict[coord_chr].append(coord)
-            
-    return zoom_chrs,zoom_dict
-        
-def subset_by_bed(bed_chrs,bed_dict,bed_file,element_exten):
-    """read bed file, extract chr, coordinates 
-    """
-    
-    num_elements=0
-    for b in bed_file:
-        e_fh=input_wrapper(b)
-        for i,li in enumerate(e_fh):
-            li=li.rstrip("\n")
-            if li.startswith("#") or li.startswith("track"):
-                continue
-            
-            lineList=li.split("\t")
-            lineList[1]=max(1,(int(lineList[1])-element_exten))
-            lineList[2]=(int(lineList[2])+element_exten)
-            z=lineList[0]+':'+str(lineList[1])+'-'+str(lineList[2])
-            
-            bed_coord=split_coord(z)
-            
-            if bed_coord==None:
-                verboseprint("invalid coord",z)
-                continue
-                
-            bed_chr,bed_start,bed_end=bed_coord
-            if bed_chr not in bed_chrs:
-                bed_chrs += [bed_chr]
-            bed_dict[bed_chr].append(bed_coord)
-            num_elements += 1
-        e_fh.close()
-        
-    return bed_chrs,bed_dict
-        
 def is_float(s):
     try:
         float(s)
@@ -405,27 +318,6 @@ def deGroupHeader(header,extractBy="liteChr",index=getSmallUniqueString()):
     
     return(header)
     
-def split_coord(z):
-    """validate and split zoom coordinate.
-    coordinates must be UCSC formatted.
-    e.g. chr1:500-1000
-    chr(colon)start(hyphen)end where start <= end
-    """
-    z=z.replace(',','')
-    zoom_coord=re.search(r'(\S+):(\d+)-(\d+)',z)
-    
-    if zoom_coord==None:
-        return None
-        
-    zoom_chr,zoom_start,zoom_end=zoom_coord.groups()
-    zoom_start=int(zoom_start)
-    zoom_end=int(zoom_end)
-    
-    if(zoom_start > zoom_end):
-        return None
-        
-    return [zoom_chr,zoom_start,zoom_end]
-        
 def de_dupe_list(input):
     """de-dupe a list, preserving order.
     """
@@ -444,32 +336,6 @@ def byte_to_megabyte(byte):
     # return float(((byte / 1024) / 1024),4) # mebibyte
 
     
-def flip_intervals(a,b):
-    """flip intervals, to ensure a < b
-    """
-    
-    return(b,a)
-    
-def is_overlap(a, b):
-    """test to for overlap between two intervals.
-    """
-    
-    if(a[0] > a[1]):
-        sys.exit('\nerror: incorrectly formated interval! start '+str(a[0])+' > end '+str(a[1])+'!\n\t'+str(a)+' '+str(b)+'\n')
-    if(b[0] > b[1]):
-        sys.exit('\nerror: incorrectly formated interval! start '+str(b[0])+' > end '+str(b[1])+'!\n\t'+str(a)+' '+str(b)+'\n')
-    
-    if a[0] < b[0] and a[1] > b[1]:
-        return((b[1]-b[0])+1)
-    
-    if b[0] < a[0] and b[1] > a[1]:   
-        return((a[1]-a[0])+1)
-        
-    if b[0] < a[0]:
-        a,b=flip_intervals(a,b)
-           
-    return max(0, ( min(a[1],b[1]) - max(a[0],b[0]) ) ) 
-    
 if __name__=="__main__":
     main()
 
@@ -21,6 +21,16 @@ import numpy as np
 import scipy as sp
 from scipy import signal
 
+# user defined modules
+from cworld.matrix import load_matrix,writeMatrix,matrix_name
+from cworld.cache import DEFAULT_CACHE_SIZE
+from cworld.bgzf import DEFAULT_COMPRESSION_LEVEL
+from cworld.header import HeaderTable
+from cworld.packed import PackedSymmetricMatrix,nan_rowcols
+from cworld.banded import BandedMatrix
+from cworld.index import region_tag
+from cworld.zoom import load_zoomed_matrix,zoom_tag
+
 
 def main():
 
@@ -30,6 +40,19 @@ def main():
     parser.add_argument('-s', '--smoothsize', dest='smoothsize', type=int, help='smooth size (# of bins)',default=3)
     parser.add_argument('-id', '--ignorediagonal', dest='ignorediagonal', type=int, help='number of diagonals to remove',default=0)
     parser.add_argument('-v', '--verbose', dest='verbose',  action='count', help='Increase verbosity (specify multiple times for more)')
+    parser.add_argument('--cache', dest='cache_dir', type=str, default=None, help='binary matrix cache directory (opt-in), parsed matrices are re-used across runs')
+    parser.add_argument('--cachesize', dest='cache_size', type=int, default=DEFAULT_CACHE_SIZE, help='max size of the matrix cache (MB)')
+    parser.add_argument('--packed', dest='packed', action='store_true', help='keep the (symmetric) matrix as its packed upper triangle - half the memory, smoothed in row bands')
+    parser.add_argument('--band', dest='band', type=int, default=None, help='only smooth the diagonals 0..band (bins), further out is written as nan - O(n*band) memory, for whole-genome cis matrices')
+    parser.add_argument('--region', dest='region', type=str, default=None, help='only load this window (chr:start-end) or chromosome, fast for indexed matrices (see indexMatrix.py)')
+    parser.add_argument('-z', '--zoom', dest='zoom', type=str, action='append', default=None, help='only load the bins overlapping this UCSC coordinate (chr:start-end, both ends inclusive as --region), can be repeated - read lazily from HDF5, binary or indexed matrices')
+    parser.add_argument('--bed', dest='bed', type=str, action='append', default=None, help='only load the bins overlapping the elements of this BED file, can be repeated')
+    parser.add_argument('--ee', dest='element_exten', type=int, default=0, help='extend each BED element by this many bp on both sides')
+    parser.add_argument('--bin', dest='output_binary', action='store_true', help='write output matrices in the binary matrix format (.matrix.bin, see matrix2bin.py) instead of .matrix.gz')
+    parser.add_argument('--hdf5', dest='output_hdf5', action='store_true', help='write output matrices as chunked, compressed HDF5 (.hdf5, see matrix2hdf5.py) instead of .matrix.gz')
+    parser.add_argument('--threads', dest='threads', type=int, default=1, help='number of threads used to compress output matrices')
+    parser.add_argument('--level', dest='compresslevel', type=int, default=DEFAULT_COMPRESSION_LEVEL, choices=range(1,10), metavar='[1-9]', help='gzip compression level of output matrices')
+    parser.add_argument('--index', dest='write_index', action='store_true', help='write a random-access row index (.idx) next to each output matrix, see indexMatrix.py')
     parser.add_argument('--version', action='version', version='%(prog)s 1.0')
     
     args=parser.parse_args()
@@ -38,6 +61,25 @@ def main():
     smoothsize=args.smoothsize
     ignorediagonal=args.ignorediagonal
     verbose=args.verbose
+    cache_dir=args.cache_dir
+    cache_size=args.cache_size
+    region=args.region
+    zoom=args.zoom
+    bed=args.bed
+    element_exten=args.element_exten
+    packed=args.packed
+    band=args.band
+    output_binary=args.output_binary
+    output_hdf5=args.output_hdf5
+    threads=args.threads
+    compresslevel=args.compresslevel
+    write_index=args.write_index
+
+    if output_binary and output_hdf5:
+        sys.exit('choose one of --bin or --hdf5!')
+    matrix_ext='.matrix.bin' if output_binary else '.matrix.gz'
+    if output_hdf5:
+        matrix_ext='.hdf5'
     
     log_level = logging.WARNING
     if verbose == 1:
@@ -54,21 +96,27 @@ def main():
         sys.exit('invalid input file! (non-existant)')
     
     print("inputMatrix",inputMatrix)
-    inputMatrixName=os.path.basename(inputMatrix)
-    inputMatrixName=re.sub(".gz", "", inputMatrixName)    
-    inputMatrixName=re.sub(".matrix", "", inputMatrixName)
+    inputMatrixName=matrix_name(inputMatrix)
+    if region != None:
+        inputMatrixName=inputMatrixName+'__'+region_tag(region)
+    if (zoom != None) or (bed != None):
+        if (region != None) or packed or (band != None):
+            sys.exit('--zoom/--bed cannot be combined with --region, --packed or --band!')
+        inputMatrixName=inputMatrixName+'---'+zoom_tag(zoom,bed)
     print("inputMatrixName",inputMatrixName)
     
     print("")
     
+    # smoothing diagonal k reads diagonals up to k+2*smoothsize
+    load_band=None
+    if band != None:
+        load_band=band+(2*smoothsize)
+    
     print("loading matrix ... ",end="")
-    if inputMatrix.endswith('.gz'):
-        infh=gzip.open(inputMatrix,'r')
+    if (zoom != None) or (bed != None):
+        matrix,header_rows,header_cols = load_zoomed_matrix(inputMatrix, zoom=zoom, bed=bed, element_exten=element_exten)
     else:
-        infh=open(inputMatrix,'r')
-    
-    matrix,header_rows,header_cols = load_matrix((l for l in infh if not l.startswith('#')), hrows=1, hcols=1) # since this returns data, header_rows and header_cols
-    infh.close()
+        matrix,header_rows,header_cols = load_matrix(inputMatrix, hrows=1, hcols=1, cache_dir=cache_dir, cache_size=cache_size, region=region, packed=packed, band=load_band) # since this returns data, header_rows and header_cols
     print("done")
     
     print("")
@@ -90,19 +138,8 @@ def main():
     if(ncols != nmatrix_cols):
         sys.exit('non-symmetrical matrix!')
     
-    assembly=None
-    for i,header in enumerate(header_rows):
-        m=re.search(r'(\S+)\|(\S+)\|(\S+):(\d+)-(\d+)',header)
-        if m==None:
-            sys.exit('error: incorrect input format!')  
-
-        bin_id,genome,chr_id,bin_start,bin_end=m.groups()
-        if assembly==None:
-            assembly=genome
-        else:
-            if assembly!=genome:
-                sys.exit('assembly/genome is not constant!')
-            assembly=genome
+    header_table=HeaderTable(header_rows)
+    assembly=header_table.assembly()
 
     print("matrix assembly:",assembly)
    
@@ -110,17 +147,27 @@ def main():
     
     # find nan rows
     print("finding nan rows ... ",end="\n")
-    nan_rows=np.sum(np.isnan(matrix),axis=0)==matrix.shape[0]
-    nan_cols=np.sum(np.isnan(matrix),axis=1)==matrix.shape[1]
-    nan_rowcols=nan_rows | nan_cols
+    if packed:
+        nan_rows=nan_cols=nan_rowcols(matrix)
+    elif band != None:
+        nan_rows=nan_cols=matrix.nan_rowcols()
+    else:
+        nan_rows=np.sum(np.isnan(matrix),axis=0)==matrix.shape[0]
+        nan_cols=np.sum(np.isnan(matrix),axis=1)==matrix.shape[1]
     
     # convert all nan to 0
     print("converting all nans to 0 ... ",end="")
-    matrix = np.nan_to_num(matrix)
+    if packed or (band != None):
+        matrix.data[np.isnan(matrix.data)]=0
+    else:
+        matrix = np.nan_to_num(matrix)
     print("done")
     
     # remove diagonal(s)
     for d in np.arange(ignorediagonal):
+        if packed or (band != None):
+            matrix.set_diagonal(d,np.nan)
+            continue
         diag_row,diag_col=kth_diag_indices(matrix, d)
         matrix[diag_row,diag_col]=np.nan
         if d != 0:
@@ -130,26 +177,23 @@ def main():
     # calculate corrcoef matrix
     print("calculating smoothed matrix [",smoothsize,"] ... ",end="")
     print(matrix.shape)
-    smoothedMatrix=blur_image(matrix, smoothsize)
+    if packed:
+        expanded_smoothedMatrix=blur_image_packed(matrix, smoothsize)
+        expanded_smoothedMatrix.mask_rowcols(nan_rows | nan_cols)
+    elif band != None:
+        expanded_smoothedMatrix=blur_image_banded(matrix, smoothsize, band)
+        expanded_smoothedMatrix.mask_rowcols(nan_rows | nan_cols)
+    else:
+        expanded_smoothedMatrix=expand_smoothed_matrix(blur_image(matrix, smoothsize),nrows,ncols,smoothsize)
+        expanded_smoothedMatrix[nan_rows,:]=np.nan
+        expanded_smoothedMatrix[:,nan_cols]=np.nan
     print("done")
-   
-    good_rows=np.zeros(nrows,dtype='bool')
-    good_cols=np.zeros(ncols,dtype='bool')
-    good_rows[smoothsize:nrows-smoothsize]=True
-    good_cols[smoothsize:ncols-smoothsize]=True
-    good_rows=np.c_[good_rows].T
-    good_cols=np.c_[good_cols]
-    
-    expanded_smoothedMatrix=np.zeros([nrows,ncols])
-    expanded_smoothedMatrix.fill(np.nan)
-    expanded_smoothedMatrix[np.where(good_rows&good_cols)]=smoothedMatrix.flatten()
     
-    expanded_smoothedMatrix[nan_rows,:]=np.nan
-    expanded_smoothedMatrix[:,nan_cols]=np.nan
-    
-    expanded_smoothedMatrixFile=inputMatrixName+'_s'+str(smoothsize)+'.smoothed.matrix.gz'
+    expanded_smoothedMatrixFile=inputMatrixName+'_s'+str(smoothsize)+'.smoothed'+matrix_ext
+    if band != None:
+        expanded_smoothedMatrixFile=inputMatrixName+'_s'+str(smoothsize)+'_b'+str(band)+'.smoothed'+matrix_ext
     print("writing smoothed matrix ...",end="")
-    writeMatrix(header_rows,header_cols,expanded_smoothedMatrix,expanded_smoothedMatrixFile)
+    writeMatrix(header_rows,header_cols,expanded_smoothedMatrix,expanded_smoothedMatrixFile,compresslevel=compresslevel,threads=threads,index=write_index)
     print("done")
     
     print("")
@@ -176,166 +220,83 @@ def blur_image(im, n, ny=None):
     
     return(improc)
 
-def kth_diag_indices(a, k):
-    rows, cols = np.diag_indices_from(a)
-    if k < 0:
-        return rows[:k], cols[-k:]
-    elif k > 0:
-        return rows[k:], cols[:-k]
-    else:
-        return rows, cols
-        
-def writeMatrix(header_rows,header_cols,matrix,matrixFile,precision=4):
-    """
-    write a np matrix with row/col headers - my5C file format - txt formatted gzipped file
+def blur_image_packed(im, n, row_block_size=1000):
+    """ blur_image for a packed symmetric matrix, a band of rows at a time.
+    returns the nan padded (full size) smoothed matrix, packed
     """
+    g = gauss_kern(n)
     
-    nrows=len(header_rows)
-    ncols=len(header_cols)
-    
-    # interaction matrix output
-    out_fh=gzip.open(matrixFile,"wb")
-    
-    # write matrix col headers
-    header=[str(i) for i in header_cols]
-    print(str(nrows)+"x"+str(ncols)+"\t"+"\t".join(header),file=out_fh)
-
-    format_func=("{:0."+str(precision)+"f}").format
-    
-    k=0
+    nrows=im.shape[0]
+    improc=PackedSymmetricMatrix(nrows,dtype='float64',fill=np.nan)
     
-    for i in xrange(nrows):
-        print(header_rows[i]+"\t"+"\t".join(map(format_func,matrix[i,:])),file=out_fh)
+    cols=np.arange(n,nrows-n)
+    for start in range(n,nrows-n,row_block_size):
+        end=min(start+row_block_size,nrows-n)
+        rows=np.arange(start,end)
+        
+        # output rows start..end need input rows start-n..end+n
+        band=sp.signal.convolve(im[start-n:end+n,:],g, mode='valid')
+        
+        upper=cols[None,:] >= rows[:,None]
+        improc.data[improc._index(rows,cols)[upper]]=band[upper]
     
-    out_fh.close()
+    return(improc)
 
-    
-def load_matrix(fh,hrows=0,hcols=0,np_dtype='float32',row_block_size=1000,numpy_mode=True,max_rows=None,verbose=False,return_all=False,pad=None):
-    """
-    load a np.array or a list of lists from a text file handle (but works with any iterator) or filename, more memory efficient than numpy.genfromtxt(), headers are returned as lists of strings
+def blur_image_banded(im, n, band, row_block_size=1000):
+    """ blur_image for a banded matrix (diagonals 0..band+2n), a band of rows at a time.
+    returns the nan padded smoothed diagonals 0..band, banded
     """
-    fh_from_filename=False
+    g = gauss_kern(n)
     
+    nrows=im.shape[0]
+    improc=BandedMatrix(nrows,band,dtype='float64')
     
-    if type(fh)==str:
-        if (fh=='-'):
-            fh=sys.stdin
-        else:
-            fh=open(fh,'r')
-            fh_from_filename=True
-
-    original_fh=fh
+    for start in range(n,nrows-n,row_block_size):
+        end=min(start+row_block_size,nrows-n)
         
-    # init
-
-    firstline=fh.next()
-    
-    fh=itertools.chain([firstline],fh)
-    
-    cols=len(firstline.rstrip("\n").split("\t"))
-    rows=row_block_size
-
-    if (max_rows!=None and max_rows<row_block_size):
-        rows=max_rows
-
-    if(hcols):
-        cols-=hcols
-
-   
-    if numpy_mode:
-        data=np.zeros((rows,cols),dtype=np_dtype)
-    else:
-        data=[]
-
-    header_rows=[[] for i in range(hrows)]
-
-    for i in range(hrows):
-        header_rows[i]=fh.next().rstrip("\n").split("\t")[hcols:]
- 
-    header_cols=[[] for i in range(hcols)]
-    
-    # fill one line at a time
-
-    prev_cols=-1
-
-    r=0
-
-    if (max_rows==None or r<max_rows):
-  
-        for i in fh:
-            line=i.rstrip("\n").split("\t")
-
-            cols=len(line)-hcols
-
-           # if(cols==0):
-           #     sys.exit('no valid columns in input line '+str(r))
-
-            if(prev_cols>-1 and cols!=prev_cols):
-                if(pad and cols<prev_cols):
-                    line=line+['']*(prev_cols-cols)
-                    cols=len(line)-hcols
-                else:
-                    sys.exit('inconsistent number of columns in input line '+str(r))
-
-            prev_cols=cols
-
-            if numpy_mode:
-                not_allowed = ['','NA']
-                try: # if np_dtype does not except ''or 'NA' as a value
-                    np.dtype(np_dtype).type(not_allowed)
-                except ValueError:
-                    try:
-                        np.dtype(np_dtype).type('nan')
-                        line=[('nan' if i in not_allowed else i) for i in line] # '' or 'NA' are replaced with 'nan'
-                    except ValueError:
-                        pass
+        # output rows start..end, diagonals 0..band need input rows start-n..end+n, cols start-n..end+band+n
+        col_start=start-n
+        col_end=min(nrows,end+band+n)
+        block=im[start-n:end+n,col_start:col_end]
         
-                
-            for j in range(hcols):
-                header_cols[j].append(line[j])
-
-            if numpy_mode:
-                data[r,:]=line[hcols:]
-
-                # enlarge data if needed
-                if(r==(data.shape[0]-1)):
-                    data=np.resize(data,(data.shape[0]+row_block_size,cols))
-                    rows=data.shape[0]
-
-            else:
-                data.append(line[hcols:]) 
-
-            r+=1
-
-            if (max_rows!=None and r>=max_rows):
-                break
-
-    rows=r
-
-    if numpy_mode:
-        data=np.resize(data,(rows,cols))
-
-    if (fh_from_filename):
-        original_fh.close()
-
-    if (hcols==1):
-        header_cols=header_cols[0]
+        # cells outside of the stored band only reach outputs below the diagonal, zero them so they do not spread
+        in_rows=np.arange(start-n,end+n)[:,None]
+        in_cols=np.arange(col_start,col_end)[None,:]
+        block[np.abs(in_cols-in_rows) > im.k]=0
         
-    if (hrows==1):
-        header_rows=header_rows[0]
-
-    if(verbose):
-        sys.stderr.write("loaded matrix with dimensions ("+str(len(data))+","+str(cols)+")\n")
+        smoothed=sp.signal.convolve(block,g, mode='valid')
+        
+        rows=np.arange(start,end)[:,None]
+        cols=np.arange(start,start+smoothed.shape[1])[None,:]
+        d=cols-rows
+        keep=(d >= 0) & (d <= band) & (cols < nrows-n)
+        improc.data[np.broadcast_to(rows,d.shape)[keep],d[keep]]=smoothed[keep]
     
-    if (return_all or (hrows and hcols)):
-        return data,header_rows,header_cols
-    if(hrows):
-        return data,header_rows
-    if(hcols):
-        return data,header_cols
+    return(improc)
 
+def expand_smoothed_matrix(smoothedMatrix,nrows,ncols,smoothsize):
+    """ place the (valid) smoothed matrix back into a nan padded nrows x ncols matrix """
+    good_rows=np.zeros(nrows,dtype='bool')
+    good_cols=np.zeros(ncols,dtype='bool')
+    good_rows[smoothsize:nrows-smoothsize]=True
+    good_cols[smoothsize:ncols-smoothsize]=True
+    good_rows=np.c_[good_rows].T
+    good_cols=np.c_[good_cols]
+    
+    expanded_smoothedMatrix=np.zeros([nrows,ncols])
+    expanded_smoothedMatrix.fill(np.nan)
+    expanded_smoothedMatrix[np.where(good_rows&good_cols)]=smoothedMatrix.flatten()
     
-    return data
+    return(expanded_smoothedMatrix)
 
+def kth_diag_indices(a, k):
+    rows, cols = np.diag_indices_from(a)
+    if k < 0:
+        return rows[:k], cols[-k:]
+    elif k > 0:
+        return rows[k:], cols[:-k]
+    else:
+        return rows, cols
+        
 if __name__=="__main__":
       main()